@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ctrack.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,54 @@
+"""
+Gunicorn config for ctrack, used by both processes of the Procfile.
+
+Every setting can be overridden on the command line, e.g. the ASGI
+process swaps the worker class for uvicorn's.
+
+For more information on this file, see
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import multiprocessing
+import os
+
+# Threaded workers overlap the database round trips of a request with
+# other requests. Each thread keeps its own persistent connection.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "2"))
+
+# Loads Django once in the master, so workers fork with the apps
+# imported and the templates compiled.
+preload_app = True
+
+# Recycles workers so a slow leak can't grow without bound. The jitter
+# keeps them from all restarting at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = max_requests // 10
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Warm-up can be turned off to measure a cold start
+WARM_UP = os.environ.get("WARM_UP", "1").lower() in ("1", "true", "yes")
+
+
+def _warm_up(log):
+    from ctrack.warmup import warm_up
+
+    report = warm_up()
+    log.info("Warmed up in %sms: %s", report["ms"], report)
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked
+    if WARM_UP and server.cfg.preload_app:
+        _warm_up(server.log)
+
+
+def post_worker_init(worker):
+    # Without preloading every worker loads the app and warms up itself
+    if WARM_UP and not worker.cfg.preload_app:
+        _warm_up(worker.log)
@@ -0,0 +1,230 @@
+import contextvars
+import functools
+import heapq
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger("ctrack.profiling")
+
+# Profile of the request being handled, None when it isn't sampled
+_active = contextvars.ContextVar("request_profile", default=None)
+# Middleware instances that installed the Template.render wrapper
+_template_profiling = {"installs": 0, "original": None}
+_template_profiling_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    Collects the timings of a single request. Used as a database
+    execute wrapper, it counts and times every query and keeps the
+    ``slow_queries`` slowest statements.
+    """
+
+    def __init__(self, slow_queries=5):
+        self.started = time.perf_counter()
+        self.slow_queries = slow_queries
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest = []
+        self.view_started = None
+        self.view_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.total_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.sql_seconds += elapsed
+            # The counter breaks ties so statements are never compared
+            entry = (elapsed, self.queries, sql)
+            if len(self.slowest) < self.slow_queries:
+                heapq.heappush(self.slowest, entry)
+            elif self.slow_queries:
+                heapq.heappushpop(self.slowest, entry)
+
+    def finish(self):
+        now = time.perf_counter()
+        self.total_seconds = now - self.started
+        if self.view_started is not None:
+            self.view_seconds = now - self.view_started
+
+    def server_timing(self):
+        """
+        Returns the timings as a ``Server-Timing`` header value.
+        """
+        return ", ".join([
+            f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f"view;dur={self.view_seconds * 1000:.2f}",
+            f"tpl;dur={self.template_seconds * 1000:.2f}",
+            f"total;dur={self.total_seconds * 1000:.2f}",
+        ])
+
+    def as_dict(self):
+        return {
+            "total_ms": round(self.total_seconds * 1000, 2),
+            "view_ms": round(self.view_seconds * 1000, 2),
+            "template_ms": round(self.template_seconds * 1000, 2),
+            "queries": self.queries,
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "slow_queries": [
+                {"ms": round(elapsed * 1000, 2), "sql": sql}
+                for elapsed, _, sql in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+def install_template_profiling():
+    """
+    Wraps ``Template.render`` so the outermost render of a sampled
+    request adds its time to the request's profile. Included templates
+    render inside their parent and aren't counted twice.
+
+    Returns a function undoing the install. ``Template.render`` is
+    restored once every install has been undone.
+    """
+    with _template_profiling_lock:
+        if not _template_profiling["installs"]:
+            _template_profiling["original"] = original = Template.render
+
+            @functools.wraps(original)
+            def render(self, context):
+                profile = _active.get()
+                if profile is None or profile.template_depth:
+                    return original(self, context)
+                profile.template_depth += 1
+                start = time.perf_counter()
+                try:
+                    return original(self, context)
+                finally:
+                    profile.template_seconds += time.perf_counter() - start
+                    profile.template_depth -= 1
+
+            render.profiled = True
+            Template.render = render
+        _template_profiling["installs"] += 1
+
+    undone = False
+
+    def uninstall():
+        nonlocal undone
+        with _template_profiling_lock:
+            if undone:
+                return
+            undone = True
+            _template_profiling["installs"] -= 1
+            if not _template_profiling["installs"]:
+                Template.render = _template_profiling["original"]
+                _template_profiling["original"] = None
+
+    return uninstall
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling, switched on by ``PROFILING_ENABLED``.
+
+    A ``PROFILING_SAMPLE_RATE`` share of requests is profiled: their
+    query count, SQL time, view time and template render time are sent
+    back in a ``Server-Timing`` header, and requests taking at least
+    ``PROFILING_SLOW_REQUEST_MS`` are logged to ``ctrack.profiling`` as
+    one JSON line with their ``PROFILING_SLOW_QUERIES`` slowest
+    statements. Requests that aren't sampled only pay for a random draw.
+
+    Queries run while a streaming response is consumed happen after the
+    response leaves the middleware and aren't counted. Template rendering
+    is only wrapped while an enabled middleware exists, see
+    :func:`install_template_profiling`.
+
+    Async capable, so unsampled requests add no switch between threads
+    when the rest of the chain runs async under ASGI. Sampled ones
+    switch once to the thread of the async ORM to wrap its connections,
+    which are per thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+        self.slow_request_ms = getattr(settings, "PROFILING_SLOW_REQUEST_MS", 250)
+        self.slow_queries = getattr(settings, "PROFILING_SLOW_QUERIES", 5)
+        # Undone when the middleware is dropped, e.g. by a test client
+        self.uninstall = weakref.finalize(self, install_template_profiling())
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _wrap_queries(self, profile, stack):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        profile = RequestProfile(self.slow_queries)
+        token = _active.set(profile)
+        try:
+            with ExitStack() as stack:
+                self._wrap_queries(profile, stack)
+                response = self.get_response(request)
+        finally:
+            _active.reset(token)
+        return self._report(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        profile = RequestProfile(self.slow_queries)
+        token = _active.set(profile)
+        try:
+            with ExitStack() as stack:
+                await sync_to_async(self._wrap_queries)(profile, stack)
+                response = await self.get_response(request)
+        finally:
+            _active.reset(token)
+        return self._report(request, response, profile)
+
+    def _report(self, request, response, profile):
+        profile.finish()
+        timing = profile.server_timing()
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+        if profile.total_seconds * 1000 >= self.slow_request_ms:
+            record = {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                **profile.as_dict(),
+            }
+            logger.info(json.dumps(record), extra={"profile": record})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _active.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
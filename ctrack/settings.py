@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     "job_tracker",
     "about",
     "week_history",
+    "team",
 ]
 
 SITE_ID = 1
@@ -62,9 +63,18 @@ LOGOUT_REDIRECT_URL = "/"
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# WhiteNoise and allauth's AccountMiddleware only handle sync requests,
+# so under ASGI Django still runs the chain in a worker thread and the
+# async views go back to the event loop from it. The other middleware
+# are async capable and add no switches of their own.
 MIDDLEWARE = [
+    "ctrack.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    # Below WhiteNoise, so static files are served precompressed instead.
+    # Compressed responses get weak W/ ETags, which the conditional
+    # metrics APIs still answer with 304 Not Modified.
+    "django.middleware.gzip.GZipMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -105,7 +115,83 @@ WSGI_APPLICATION = "ctrack.wsgi.application"
 #     }
 # }
 
-DATABASES = {"default": dj_database_url.parse(os.environ.get("DATABASE_URL"))}
+# Falls back to a local SQLite database, which the tests also run on.
+# Connections are kept open for CONN_MAX_AGE seconds and checked before
+# a request reuses them. ctrack.asgi sets it to 0, as ASGI requests
+# don't run on long lived threads.
+DATABASES = {
+    "default": dj_database_url.parse(
+        os.environ.get("DATABASE_URL", f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+        conn_max_age=int(os.environ.get("CONN_MAX_AGE", "600")),
+    )
+}
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The "metrics" cache holds computed metrics and rendered week cards.
+# Their keys carry versions read from the database, so a process local
+# cache never serves metrics older than the latest write made by any
+# other process. METRICS_CACHE_DIR shares the entries between the
+# processes through a directory instead of computing them in each one.
+
+METRICS_CACHE_DIR = os.environ.get("METRICS_CACHE_DIR")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "metrics": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": METRICS_CACHE_DIR,
+    }
+    if METRICS_CACHE_DIR
+    else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "metrics",
+    },
+}
+
+METRICS_CACHE_ALIAS = "metrics"
+METRICS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Async views
+# Routes the async tracker and week history views instead of the sync
+# ones. ctrack.asgi turns this on, as ASGI runs sync views one at a time.
+
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
+# Request profiling
+# ProfilingMiddleware is inactive unless PROFILING is set. It then adds
+# Server-Timing headers to a sample of requests and logs the slow ones.
+
+PROFILING_ENABLED = os.environ.get("PROFILING", "").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "1.0"))
+PROFILING_SLOW_REQUEST_MS = float(os.environ.get("PROFILING_SLOW_REQUEST_MS", "250"))
+PROFILING_SLOW_QUERIES = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "ctrack.profiling": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+# Authentication
+# ProfileTargetBackend loads each request's user with its ProfileTarget.
+# It replaces ModelBackend, so a failed login checks the password once.
+
+AUTHENTICATION_BACKENDS = [
+    "job_tracker.backends.ProfileTargetBackend",
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -153,6 +239,24 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# collectstatic adds a content hash to every file name and writes gzip
+# and brotli copies next to them. WhiteNoise serves the hashed names
+# with far future immutable headers and picks the smallest copy the
+# browser accepts. Files missing from the manifest, e.g. added since the
+# last collectstatic, fall back to their plain name.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+WHITENOISE_MANIFEST_STRICT = False
+
+# Exports written by the background worker
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -25,4 +25,5 @@ urlpatterns = [
     path("tracker/", include("job_tracker.urls"), name="tracker-urls"),
     path("", include("about.urls"), name="index"),
     path("week-history/", include("week_history.urls"), name="week_history-urls"),
+    path("team/", include("team.urls"), name="team-urls"),
 ]
@@ -0,0 +1,62 @@
+import logging
+import time
+from pathlib import Path
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+logger = logging.getLogger("ctrack.warmup")
+
+
+def _template_names(engine):
+    for directory in engine.template_dirs:
+        directory = Path(directory)
+        for path in directory.rglob("*.html"):
+            yield path.relative_to(directory).as_posix()
+
+
+def compile_templates():
+    """
+    Compiles every template of every template engine into the cached
+    loader, so no request pays for parsing them. Returns the number of
+    templates compiled.
+    """
+    compiled = 0
+    for engine in engines.all():
+        for name in set(_template_names(engine)):
+            try:
+                engine.get_template(name)
+            except (TemplateDoesNotExist, TemplateSyntaxError):
+                # e.g. templates of optional features whose tags aren't installed
+                logger.debug("Skipped template %s", name, exc_info=True)
+                continue
+            compiled += 1
+    return compiled
+
+
+def warm_up():
+    """
+    Does the work the first requests of a fresh process would otherwise
+    pay for: importing every view through the URLconf, compiling the
+    templates and priming the job type names. The names are cached under
+    a version read from the database on every lookup, so a copy made in
+    a master before forking is dropped once another process changes a
+    job type. Database connections are closed afterwards, so a server
+    forking workers after warming up doesn't share them.
+
+    Returns what was warmed up and how long it took.
+    """
+    # Imported here, as the apps must be loaded first
+    from job_tracker.job_types import job_type_names
+
+    start = time.perf_counter()
+    get_resolver().url_patterns
+    templates = compile_templates()
+    job_types = len(job_type_names())
+    connections.close_all()
+    report = {
+        "templates": templates,
+        "job_types": job_types,
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    return report
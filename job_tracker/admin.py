@@ -1,9 +1,181 @@
-from django.contrib import admin
+from datetime import date, timedelta
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import F, Max, Min, QuerySet
+from .bulk import reassign_job_type
 from .models import JobType, CompletedJob, Absence, ProfileTarget
+from .pagination import EstimatedCountPaginator
+from .rollups import month_end_of
+from . import tasks
 
 # Register your models here.
 
-admin.site.register(JobType)
-admin.site.register(CompletedJob)
-admin.site.register(Absence)
-admin.site.register(ProfileTarget)
+
+class JobTypeActionForm(ActionForm):
+    """
+    Admin action form with the job type to move the selected jobs to.
+    """
+    job_type = forms.ModelChoiceField(
+        JobType.objects.order_by("name"), required=False, label="Job type:")
+
+
+def _period_of(day, kind):
+    if kind == "year":
+        return date(day.year, 1, 1)
+    if kind == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(period, kind):
+    if kind == "year":
+        return date(period.year + 1, 1, 1)
+    if kind == "month":
+        return month_end_of(period) + timedelta(days=1)
+    return period + timedelta(days=1)
+
+
+def _first(queryset, ordering):
+    # An ORDER BY ... LIMIT 1 stops at the first index entry, where
+    # SQLite's MIN() reads every row in the range
+    field_name = ordering.lstrip("-")
+    return queryset.order_by(ordering).values_list(field_name, flat=True).first()
+
+
+def _ordering(aggregate):
+    # The ordering whose first row answers a MIN() or MAX() of a field
+    if isinstance(aggregate, (Min, Max)) and aggregate.filter is None:
+        source = aggregate.get_source_expressions()[0]
+        if isinstance(source, F):
+            return ("-" if isinstance(aggregate, Max) else "") + source.name
+    return None
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """
+    QuerySet behind the date hierarchy of a large changelist over a
+    date field. ``dates()`` hops along the date index, reading one row
+    per year or month found, instead of truncating the date of every
+    row. The ``MIN()``/``MAX()`` range of the hierarchy is read the
+    same way.
+    """
+
+    def dates(self, field_name, kind, order="ASC"):
+        if kind == "day":
+            # Days of a date field need no truncating, and the few of a
+            # drilled down month are read straight from the index
+            days = self.order_by(field_name).values_list(field_name, flat=True)
+            periods = list(days.distinct())
+            return periods if order == "ASC" else periods[::-1]
+        periods = []
+        first = _first(self, field_name)
+        while first is not None:
+            period = _period_of(first, kind)
+            periods.append(period)
+            # The new bound goes first, as SQLite seeks to the first of
+            # two lower bounds, e.g. the start of a drilled down year
+            later = self.model._base_manager.filter(
+                **{f"{field_name}__gte": _next_period(period, kind)})
+            first = _first(later & self, field_name)
+        return periods if order == "ASC" else periods[::-1]
+
+    def aggregate(self, *args, **kwargs):
+        orderings = {alias: _ordering(value) for alias, value in kwargs.items()}
+        if args or None in orderings.values():
+            return super().aggregate(*args, **kwargs)
+        return {
+            alias: _first(self, ordering) for alias, ordering in orderings.items()}
+
+
+class HistoryAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables holding every user's history. The
+    unfiltered count is estimated, the full count is never shown, the
+    date hierarchy reads the date index and only the indexed date
+    column is sortable. Users are picked with an autocomplete instead
+    of a dropdown of every user.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ("user",)
+    search_fields = ("user__username",)
+    search_help_text = "Exact username."
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(queryset.model, queryset.query, queryset.db)
+
+    def get_search_results(self, request, queryset, search_term):
+        # The user is found through the unique username index first, so
+        # their rows are read through the (user, date) index
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        users = User.objects.filter(username=search_term).values("pk")
+        return queryset.filter(user__in=users), False
+
+
+@admin.register(JobType)
+class JobTypeAdmin(admin.ModelAdmin):
+    list_display = ("name", "credits")
+    ordering = ("name",)
+    search_fields = ("name",)
+
+
+@admin.register(CompletedJob)
+class CompletedJobAdmin(HistoryAdmin):
+    list_display = ("completed_on", "user", "job_type", "credits")
+    list_select_related = ("user", "job_type")
+    list_filter = ("job_type",)
+    sortable_by = ("completed_on",)
+    date_hierarchy = "completed_on"
+    autocomplete_fields = ("user", "job_type")
+    readonly_fields = ("credits", "updated_at")
+    action_form = JobTypeActionForm
+    actions = ["reassign_job_type"]
+
+    @admin.action(description="Move selected jobs to the chosen job type")
+    def reassign_job_type(self, request, queryset):
+        try:
+            job_type = JobTypeActionForm.base_fields["job_type"].clean(
+                request.POST.get("job_type"))
+        except ValidationError:
+            job_type = None
+        if job_type is None:
+            self.message_user(
+                request, "Choose the job type to move the jobs to.", messages.ERROR)
+            return
+        moved = reassign_job_type(queryset, job_type)
+        self.message_user(
+            request, f"Moved {moved} jobs to {job_type}.", messages.SUCCESS)
+
+
+@admin.register(Absence)
+class AbsenceAdmin(HistoryAdmin):
+    list_display = ("date", "user", "duration")
+    list_select_related = ("user",)
+    sortable_by = ("date",)
+    date_hierarchy = "date"
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(ProfileTarget)
+class ProfileTargetAdmin(admin.ModelAdmin):
+    list_display = (
+        "user", "daily_target", "daily_hours", "balance", "last_write_at")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    autocomplete_fields = ("user",)
+    readonly_fields = ("balance", "last_write_at")
+    actions = ["rebuild_rollups"]
+
+    @admin.action(description="Rebuild rollups of the selected users")
+    def rebuild_rollups(self, request, queryset):
+        user_ids = sorted(queryset.values_list("user_id", flat=True))
+        task = tasks.enqueue("rebuild_rollups", user_ids=user_ids)
+        self.message_user(
+            request, f"Queued task {task.pk} to rebuild {len(user_ids)} users.",
+            messages.SUCCESS)
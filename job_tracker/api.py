@@ -0,0 +1,35 @@
+import hashlib
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+
+def _last_write(request):
+    """
+    Returns when the user's metrics last changed: their latest write,
+    including changes to job types, or the start of today, as "the
+    current week" moves on without any write.
+    """
+    profile_write = request.user.profiletarget.last_write_at
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(profile_write, today)
+
+
+def metrics_etag(request, *args, **kwargs):
+    """
+    ETag of a metrics response. It changes with every write of the user
+    and with the requested URL, and is built from the already loaded
+    :model:`ProfileTarget` without touching the metrics tables.
+    GZipMiddleware sends it as a weak ``W/`` ETag when it compresses the
+    response. If-None-Match is compared weakly, so those get a 304 too.
+    """
+    parts = (request.user.id, _last_write(request).isoformat(), request.get_full_path())
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def metrics_last_modified(request, *args, **kwargs):
+    return _last_write(request)
+
+
+# Answers conditional GETs with 304 Not Modified before the view runs
+metrics_conditional = condition(
+    etag_func=metrics_etag, last_modified_func=metrics_last_modified)
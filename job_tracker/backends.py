@@ -0,0 +1,52 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from .models import ProfileTarget
+
+UserModel = get_user_model()
+
+
+def ensure_profile_target(user):
+    """
+    Returns the :model:`ProfileTarget` of a user, creating it for users
+    that predate the signal creating one with every new user.
+    """
+    try:
+        return user.profiletarget
+    except ProfileTarget.DoesNotExist:
+        profile, _ = ProfileTarget.objects.get_or_create(user=user)
+        user.profiletarget = profile
+        return profile
+
+
+async def arequest_user(request):
+    """
+    Resolves the lazy ``request.user``, with its profile, off the event
+    loop so async views can read it.
+    """
+    def load():
+        user = request.user
+        if user.is_authenticated:
+            ensure_profile_target(user)
+        return user
+
+    return await sync_to_async(load)()
+
+
+class ProfileTargetBackend(ModelBackend):
+    """
+    Authenticates like ``ModelBackend`` but loads the session's user
+    together with its :model:`ProfileTarget` in a single query, so
+    views reading ``request.user.profiletarget`` don't query again.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related(
+                "profiletarget").get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        if not self.user_can_authenticate(user):
+            return None
+        ensure_profile_target(user)
+        return user
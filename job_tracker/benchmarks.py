@@ -0,0 +1,305 @@
+import gzip
+import math
+import re
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import date
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.urls import (
+    URLPattern, URLResolver, Resolver404, get_resolver, resolve, reverse)
+from django.urls.resolvers import RoutePattern
+from .models import JobType
+
+# Characters that mean a regex based route can't be requested as is
+REGEX_CHARACTERS = set("()[]{}?*+|\\")
+# Requesting these would end the benchmark user's session, or they only
+# take file uploads from the editor
+SKIPPED_ROUTES = ("logout", "upload_attachment")
+# URL names of the pages only staff can see, besides the admin
+STAFF_URL_NAMES = ("team-dashboard", "team-heatmap")
+# What a current browser accepts
+BROWSER_ACCEPT_ENCODING = "gzip, deflate, br"
+# Write endpoints that are only posted to, as a GET does nothing useful
+POST_ONLY = ("job-post", "absence-post", "api-sync")
+
+
+def _literal_route(pattern):
+    """
+    Returns the route of a pattern that takes no arguments, else None.
+    """
+    if isinstance(pattern, RoutePattern):
+        return None if pattern.converters else str(pattern)
+    route = pattern.regex.pattern.lstrip("^").rstrip("$").replace("\\Z", "")
+    if pattern.regex.groups or REGEX_CHARACTERS & set(route):
+        return None
+    return route
+
+
+def benchmark_urls(urlconf=None):
+    """
+    Returns ``(path, name)`` for every URL of the project that can be
+    requested without arguments.
+    """
+    found = []
+
+    def walk(patterns, prefix):
+        for entry in patterns:
+            route = _literal_route(entry.pattern)
+            if route is None:
+                continue
+            if isinstance(entry, URLResolver):
+                walk(entry.url_patterns, prefix + route)
+            elif isinstance(entry, URLPattern) and not any(
+                skipped in route for skipped in SKIPPED_ROUTES
+            ):
+                found.append(("/" + prefix + route, entry.name))
+
+    walk(get_resolver(urlconf).url_patterns, "")
+    return found
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting the queries of a request and
+    timing them with a high resolution clock.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def _content(response):
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+def write_requests():
+    """
+    Returns the form data each write endpoint is posted, by URL name,
+    as functions building the keyword arguments of a fresh
+    ``Client.post``. Every post records a job or an absence today.
+    """
+    job_type = JobType.objects.order_by("pk").first()
+    if job_type is None:
+        return {}
+    today = date.today().isoformat()
+    job = {"job_type": job_type.pk, "completed_on": today}
+    return {
+        "job-post": lambda: {"data": job},
+        "absence-post": lambda: {"data": {"duration": "1.00", "date": today}},
+        "job-bulk-post": lambda: {
+            "data": {"jobs": [job] * 10}, "content_type": "application/json"},
+        "import": lambda: {"data": {
+            "kind": "jobs", "file_format": "csv",
+            "file": SimpleUploadedFile(
+                "jobs.csv", f"job_type,completed_on\n{job_type.name},{today}".encode()),
+        }},
+        "api-sync": lambda: {
+            "data": {"operations": [
+                {"op": "create", "type": "job", "key": str(uuid.uuid4()), **job}]},
+            "content_type": "application/json",
+        },
+    }
+
+
+def measure(client, path, iterations=20, warmup=2, headers=None, post=None):
+    """
+    Requests ``path`` with the test client and returns its latency
+    percentiles, queries and SQL time per request, response size and
+    the peak Python memory allocated by a single request.
+
+    With ``post``, a function returning the keyword arguments of
+    ``Client.post``, the path is posted to instead.
+    """
+    headers = headers or {}
+
+    def request():
+        if post:
+            return client.post(path, headers=headers, **post())
+        return client.get(path, headers=headers)
+
+    for _ in range(warmup):
+        _content(request())
+
+    latencies = []
+    query_counts = []
+    sql_times = []
+    for _ in range(iterations):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            response = request()
+            body = _content(response)
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_counts.append(timer.count)
+        sql_times.append(timer.seconds * 1000)
+
+    # Memory is traced in a separate request so tracing doesn't skew latency
+    tracemalloc.start()
+    try:
+        _content(request())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "path": path,
+        "method": "POST" if post else "GET",
+        "status": response.status_code,
+        "bytes": len(body),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries": max(query_counts),
+        "sql_ms": round(statistics.fmean(sql_times), 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def _url_name(path):
+    try:
+        return resolve(path.split("?")[0]).url_name
+    except Resolver404:
+        return None
+
+
+def _client(user):
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    return client
+
+
+def run(user, paths=None, iterations=20, warmup=2, headers=None, staff=None,
+        writes=True):
+    """
+    Benchmarks ``paths``, or every argument free URL of the project,
+    logged in as ``user``. Returns one result per URL and method.
+
+    Admin and team URLs are requested as the ``staff`` user, and
+    skipped without one. With ``writes`` the write endpoints are also posted the data
+    of :func:`write_requests`, which adds to ``user``'s history.
+    """
+    client = _client(user)
+    staff_client = _client(staff) if staff else None
+    admin_prefix = reverse("admin:index")
+    posts = write_requests() if writes else {}
+    if paths is None:
+        paths = benchmark_urls()
+    else:
+        paths = [(path, _url_name(path)) for path in paths]
+    results = []
+    for path, name in paths:
+        requester = client
+        if path.startswith(admin_prefix) or name in STAFF_URL_NAMES:
+            if staff_client is None:
+                continue
+            requester = staff_client
+        requests = [] if name in POST_ONLY else [None]
+        if name in posts:
+            requests.append(posts[name])
+        for post in requests:
+            result = measure(requester, path, iterations, warmup, headers, post)
+            result["name"] = name
+            results.append(result)
+    return results
+
+
+def _decoded(response, body):
+    encoding = response.get("Content-Encoding")
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        import brotli
+
+        return brotli.decompress(body)
+    return body
+
+
+def static_urls(html):
+    """
+    Returns the local static files a page links to, in order.
+    """
+    static_url = "/" + settings.STATIC_URL.lstrip("/")
+    pattern = rf'(?:href|src)="({re.escape(static_url)}[^"]+)"'
+    return list(dict.fromkeys(re.findall(pattern, html)))
+
+
+def page_weight(client, path, accept_encoding=BROWSER_ACCEPT_ENCODING):
+    """
+    Loads ``path`` and the static files it links to like a browser
+    would, and returns the bytes transferred on a first visit and on a
+    repeat visit with a warm HTTP cache.
+
+    On the repeat visit files served as ``immutable`` aren't requested
+    again, and the rest are revalidated with their ``Last-Modified``.
+    Files on other hosts, e.g. CDNs, aren't counted.
+    """
+    headers = {"Accept-Encoding": accept_encoding}
+    response = client.get(path, headers=headers)
+    page = _content(response)
+    html = _decoded(response, page).decode()
+
+    assets = []
+    for url in static_urls(html):
+        asset = client.get(url, headers=headers)
+        assets.append({
+            "url": url,
+            "status": asset.status_code,
+            "bytes": len(_content(asset)),
+            "encoding": asset.get("Content-Encoding", "identity"),
+            "cache_control": asset.get("Cache-Control", ""),
+            "last_modified": asset.get("Last-Modified"),
+        })
+
+    repeat_bytes = len(_content(client.get(path, headers=headers)))
+    revalidated = 0
+    for asset in assets:
+        if "immutable" in asset["cache_control"]:
+            continue
+        revalidated += 1
+        conditional = dict(headers)
+        if asset["last_modified"]:
+            conditional["If-Modified-Since"] = asset["last_modified"]
+        repeat_bytes += len(_content(client.get(asset["url"], headers=conditional)))
+
+    asset_bytes = sum(asset["bytes"] for asset in assets)
+    return {
+        "path": path,
+        "status": response.status_code,
+        "html_bytes": len(page),
+        "html_uncompressed_bytes": len(html.encode()),
+        "html_encoding": response.get("Content-Encoding", "identity"),
+        "static_files": len(assets),
+        "static_bytes": asset_bytes,
+        "first_visit_bytes": len(page) + asset_bytes,
+        "first_visit_requests": 1 + len(assets),
+        "repeat_visit_bytes": repeat_bytes,
+        "repeat_visit_requests": 1 + revalidated,
+        "missing_static_files": [
+            asset["url"] for asset in assets if asset["status"] != 200],
+    }
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .models import CompletedJob, JobType
+from . import rollups
+
+
+def snapshot_credits(jobs):
+    """
+    Copies the credits of their job types onto unsaved
+    :model:`CompletedJob` objects, read from the database in one query.
+    """
+    credits = dict(
+        JobType.objects.filter(pk__in={job.job_type_id for job in jobs})
+        .values_list("pk", "credits"))
+    for job in jobs:
+        job.credits = credits.get(job.job_type_id)
+
+
+def bulk_insert(model, objects, batch_size=1000):
+    """
+    Inserts :model:`CompletedJob` or :model:`Absence` objects with
+    ``bulk_create`` in one transaction, then refreshes the rollups and
+    cached metrics of every user and day they touch. ``bulk_create``
+    skips the model signals that would otherwise do this, and the
+    credit snapshot of ``CompletedJob.save`` is taken here instead.
+    """
+    objects = list(objects)
+    if not objects:
+        return []
+    if model is CompletedJob:
+        snapshot_credits([job for job in objects if job.credits is None])
+    with transaction.atomic():
+        created = model.objects.bulk_create(objects, batch_size=batch_size)
+        refresh_touched(rollups.touched_days(model, created))
+    return created
+
+
+def refresh_touched(days_by_user):
+    """
+    Refreshes the rollups, and with them the cached metrics, of a
+    ``{user id: days}`` dict of touched days.
+    """
+    rollups.refresh_many(days_by_user)
+
+
+def reassign_job_type(jobs, job_type, chunk_size=1000):
+    """
+    Moves a queryset of :model:`CompletedJob` entries to ``job_type``
+    and re-credits them with its credits, one ``UPDATE`` per chunk,
+    then refreshes the rollups and cached metrics of the days they fall
+    on. Jobs already of that type keep their credits, as they would when
+    saved. Returns the number of jobs moved.
+    """
+    moved = list(
+        jobs.exclude(job_type=job_type).order_by()
+        .values_list("pk", "user_id", "completed_on"))
+    days_by_user = defaultdict(set)
+    with transaction.atomic():
+        for start in range(0, len(moved), chunk_size):
+            chunk = moved[start:start + chunk_size]
+            # update() skips auto_now, synced devices need the change
+            CompletedJob.objects.filter(pk__in=[pk for pk, _, _ in chunk]).update(
+                job_type=job_type, credits=job_type.credits,
+                updated_at=timezone.now())
+            for _, user_id, day in chunk:
+                days_by_user[user_id].add(day)
+        refresh_touched(days_by_user)
+    return len(moved)
@@ -0,0 +1,140 @@
+import csv
+import json
+import tempfile
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from .forms import ExportForm
+from .models import CompletedJob, Absence
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+JOB_FIELDS = ("completed_on", "job_type", "credits")
+ABSENCE_FIELDS = ("date", "duration")
+
+
+class Echo:
+    """
+    File-like object handing each written CSV line straight back,
+    so rows can be streamed without an in-memory buffer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _date_range(queryset, field, start=None, end=None):
+    if start:
+        queryset = queryset.filter(**{f"{field}__gte": start})
+    if end:
+        queryset = queryset.filter(**{f"{field}__lte": end})
+    return queryset
+
+
+def _jobs(user, start=None, end=None):
+    return _date_range(
+        CompletedJob.objects.filter(user=user), "completed_on", start, end)
+
+
+def _absences(user, start=None, end=None):
+    return _date_range(Absence.objects.filter(user=user), "date", start, end)
+
+
+def job_rows(user, start=None, end=None):
+    """
+    Yields the users completed jobs oldest first, reading them from the
+    database ``CHUNK_SIZE`` rows at a time.
+    """
+    jobs = _jobs(user, start, end)
+    jobs = jobs.select_related("job_type").order_by("completed_on", "id")
+    for job in jobs.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            "completed_on": job.completed_on,
+            "job_type": job.job_type.name,
+            "credits": job.credits,
+        }
+
+
+def absence_rows(user, start=None, end=None):
+    """
+    Yields the users absences oldest first, reading them from the
+    database ``CHUNK_SIZE`` rows at a time.
+    """
+    absences = _absences(user, start, end)
+    for absence in absences.order_by("date", "id").iterator(chunk_size=CHUNK_SIZE):
+        yield {"date": absence.date, "duration": absence.duration}
+
+
+# Records, rows, columns and file name of each kind of export
+EXPORTS = {
+    "job": (_jobs, job_rows, JOB_FIELDS, "completed-jobs"),
+    "absence": (_absences, absence_rows, ABSENCE_FIELDS, "absences"),
+}
+
+
+def _csv_lines(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def _jsonl_lines(rows, fields):
+    for row in rows:
+        yield json.dumps({field: row[field] for field in fields}, default=str) + "\n"
+
+
+def stream_export(rows, fields, file_format, filename):
+    """
+    Returns a :class:`StreamingHttpResponse` writing ``rows`` out one
+    line at a time as CSV or JSON Lines, so memory stays flat no matter
+    how many rows there are.
+    """
+    lines = _csv_lines if file_format == "csv" else _jsonl_lines
+    response = StreamingHttpResponse(
+        lines(rows, fields), content_type=CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{file_format}"')
+    return response
+
+
+def _counted(rows, total, progress):
+    for done, row in enumerate(rows, 1):
+        yield row
+        if done % CHUNK_SIZE == 0:
+            progress(done, total)
+
+
+def save_export(kind, user, file_format, start=None, end=None, progress=None):
+    """
+    Writes a ``job`` or ``absence`` export of the user to the default
+    storage through a temporary file, so memory stays flat, and returns
+    the name it was stored under. ``progress(rows written, total rows)``
+    is called every ``CHUNK_SIZE`` rows.
+    """
+    records, build_rows, fields, filename = EXPORTS[kind]
+    rows = build_rows(user, start, end)
+    if progress:
+        rows = _counted(rows, records(user, start, end).count(), progress)
+    lines = _csv_lines if file_format == "csv" else _jsonl_lines
+    with tempfile.TemporaryFile() as export_file:
+        for line in lines(rows, fields):
+            export_file.write(line.encode())
+        return default_storage.save(
+            f"exports/{user.pk}/{filename}.{file_format}", File(export_file))
+
+
+def export_response(request, build_rows, fields, filename):
+    """
+    Streams ``build_rows(user, start, end)`` for the request's user,
+    filtered by the ``start``, ``end`` and ``format`` query parameters.
+    """
+    export_form = ExportForm(request.GET)
+    if not export_form.is_valid():
+        return HttpResponseBadRequest(export_form.errors.as_text())
+    data = export_form.cleaned_data
+    rows = build_rows(request.user, data["start"], data["end"])
+    return stream_export(rows, fields, data["format"], filename)
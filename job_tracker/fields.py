@@ -0,0 +1,36 @@
+import json
+from django.contrib.postgres.fields import ArrayField
+
+
+class PortableArrayField(ArrayField):
+    """
+    ``ArrayField`` stored as JSON text on databases other than PostgreSQL.
+
+    Only the migrations from before ``ProfileTarget.days_off`` became a
+    bitmask use it, so the migration history applies to SQLite too.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == "postgresql":
+            return super().db_type(connection)
+        return "text"
+
+    def cast_db_type(self, connection):
+        if connection.vendor == "postgresql":
+            return super().cast_db_type(connection)
+        return "text"
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor == "postgresql":
+            return super().get_placeholder(value, compiler, connection)
+        return "%s"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if connection.vendor == "postgresql" or value is None:
+            return super().get_db_prep_value(value, connection, prepared)
+        return json.dumps(list(value))
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
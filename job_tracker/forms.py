@@ -1,5 +1,6 @@
 from django import forms
 from .models import CompletedJob, Absence, ProfileTarget
+from .job_types import job_type_lookup
 
 
 class CompletedJobForm(forms.ModelForm):
@@ -12,6 +13,79 @@ class CompletedJobForm(forms.ModelForm):
         widgets = {'completed_on': forms.DateInput(attrs={'type': 'date'}), }
 
 
+class JobTypeChoiceField(forms.ModelChoiceField):
+    """
+    Job type field that can resolve choices from a preloaded
+    ``{pk: JobType}`` lookup instead of querying for each form.
+    """
+    lookup = None
+
+    def to_python(self, value):
+        if self.lookup is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.lookup[int(value)]
+        except (KeyError, ValueError, TypeError):
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+
+class BulkCompletedJobForm(CompletedJobForm):
+    """
+    Form class for a single entry of :form:`CompletedJobFormSet`.
+    """
+    def __init__(self, *args, job_types=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["job_type"].lookup = job_types
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # The job type was already found in the preloaded lookup
+        if self.fields["job_type"].lookup is not None:
+            exclude.add("job_type")
+        return exclude
+
+    class Meta(CompletedJobForm.Meta):
+        field_classes = {'job_type': JobTypeChoiceField}
+
+
+class BaseCompletedJobFormSet(forms.BaseFormSet):
+    """
+    Looks the job types up once for the whole formset.
+    """
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        if self.is_bound:
+            if not hasattr(self, "_job_types"):
+                self._job_types = job_type_lookup()
+            kwargs["job_types"] = self._job_types
+        return kwargs
+
+
+# Formset for users to submit several completed jobs at once.
+CompletedJobFormSet = forms.formset_factory(
+    BulkCompletedJobForm, formset=BaseCompletedJobFormSet, extra=4,
+    min_num=1, validate_min=True, max_num=50, validate_max=True)
+
+
+def formset_data(entries, prefix, fields):
+    """
+    Converts a list of dicts, e.g. a JSON body, into the form data
+    a formset with the given prefix expects.
+    """
+    data = {
+        f"{prefix}-TOTAL_FORMS": str(len(entries)),
+        f"{prefix}-INITIAL_FORMS": "0",
+    }
+    for index, entry in enumerate(entries):
+        for field in fields:
+            data[f"{prefix}-{index}-{field}"] = entry.get(field, "")
+    return data
+
+
 class AbsenceForm(forms.ModelForm):
     """
     Form class for users to record absences.
@@ -33,3 +107,65 @@ class ProfileForm(forms.ModelForm):
     class Meta:
         model = ProfileTarget
         fields = ('daily_target', 'daily_hours', 'days_off')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['days_off'] = self.instance.days_off_list
+
+    def clean_days_off(self):
+        # Stored as a bitmask, see ProfileTarget.days_off
+        return ProfileTarget.days_off_mask(self.cleaned_data['days_off'])
+
+
+class ImportForm(forms.Form):
+    """
+    Form class for users to upload a file of their own history.
+    """
+    KINDS = [("jobs", "Completed jobs"), ("absences", "Absences")]
+    FORMATS = [("csv", "CSV"), ("jsonl", "JSON Lines")]
+
+    kind = forms.ChoiceField(choices=KINDS)
+    file_format = forms.ChoiceField(choices=FORMATS, label="Format")
+    file = forms.FileField()
+    dry_run = forms.BooleanField(
+        required=False, label="Only check the file, don't import it")
+
+
+class ExportForm(forms.Form):
+    """
+    Form class for the optional date range and format of an export.
+    """
+    FORMATS = [("csv", "CSV"), ("jsonl", "JSON Lines")]
+
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    format = forms.ChoiceField(choices=FORMATS, required=False)
+
+    def clean_format(self):
+        return self.cleaned_data["format"] or "csv"
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError("start must not be after end")
+        return cleaned_data
+
+
+class ReportForm(forms.Form):
+    """
+    Form class for the date range and granularity of a performance report.
+    """
+    GRANULARITIES = [("month", "Month"), ("quarter", "Quarter"), ("year", "Year")]
+
+    start = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    granularity = forms.ChoiceField(choices=GRANULARITIES)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError("start must not be after end")
+        return cleaned_data
@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth.models import User
+from .models import CompletedJob, Absence
+from .job_types import job_type_names
+from .bulk import refresh_touched, snapshot_credits
+from . import rollups
+
+BATCH_SIZE = 5000
+# Number of rejected rows kept on the report, the rest are only counted
+MAX_REPORTED_REJECTS = 1000
+
+
+class RowError(ValueError):
+    """
+    Raised when a single import row can't be turned into a record.
+    """
+
+
+class ImportReport:
+    """
+    Counts the rows of an import and keeps the first rejects.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.rejects = []
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append((line, str(error)))
+
+    def as_dict(self):
+        return {
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "rejects": self.rejects,
+        }
+
+
+def read_rows(stream, file_format):
+    """
+    Yields ``(line number, row dict)`` from a CSV or JSON Lines text
+    stream, one row at a time.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, RowError(f"Invalid JSON: {error}")
+                continue
+            if not isinstance(row, dict):
+                row = RowError("Expected a JSON object")
+            yield line_number, row
+    else:
+        raise ValueError(f"Unknown import format {file_format!r}")
+
+
+def text_stream(uploaded_file, encoding="utf-8"):
+    """
+    Wraps a binary uploaded file as a text stream without reading it
+    into memory.
+    """
+    return io.TextIOWrapper(uploaded_file, encoding=encoding, newline="")
+
+
+def _required(row, field):
+    value = row.get(field)
+    if value is None or str(value).strip() == "":
+        raise RowError(f"Missing {field}")
+    return str(value).strip()
+
+
+def _parse_date(row, field):
+    try:
+        return date.fromisoformat(_required(row, field))
+    except ValueError:
+        raise RowError(f"{field} must be a YYYY-MM-DD date")
+
+
+class Importer:
+    """
+    Streams rows into :model:`CompletedJob` or :model:`Absence` records,
+    inserting them in batches with ``bulk_create``.
+
+    Job types are resolved by name from an in-memory map loaded once,
+    their credits are read for each batch as it is inserted.
+    Rows may name their user in a ``username`` column; rows without
+    one belong to ``user``.
+    """
+
+    def __init__(self, kind, user=None, dry_run=False, batch_size=BATCH_SIZE):
+        if kind not in ("jobs", "absences"):
+            raise ValueError(f"Unknown import kind {kind!r}")
+        self.kind = kind
+        self.model = CompletedJob if kind == "jobs" else Absence
+        self.user = user
+        self.batch_size = batch_size
+        self.report = ImportReport(dry_run)
+        self.job_types = {}
+        if kind == "jobs":
+            self.job_types = {
+                name.casefold(): pk for pk, name in job_type_names().items()}
+        self.user_ids = {}
+        self.days_by_user = defaultdict(set)
+
+    def _user_id(self, row):
+        username = str(row.get("username") or "").strip()
+        if not username:
+            if self.user is None:
+                raise RowError("Missing username")
+            return self.user.id
+        if self.user is not None and username != self.user.username:
+            raise RowError(f"Rows must belong to {self.user.username}")
+        if username not in self.user_ids:
+            self.user_ids[username] = (
+                User.objects.filter(username=username)
+                .values_list("id", flat=True)
+                .first()
+            )
+        if self.user_ids[username] is None:
+            raise RowError(f"Unknown user {username!r}")
+        return self.user_ids[username]
+
+    def build(self, row):
+        """
+        Turns a row into an unsaved record or raises :class:`RowError`.
+        """
+        user_id = self._user_id(row)
+        if self.kind == "jobs":
+            name = _required(row, "job_type")
+            job_type_id = self.job_types.get(name.casefold())
+            if job_type_id is None:
+                raise RowError(f"Unknown job type {name!r}")
+            return CompletedJob(
+                user_id=user_id,
+                job_type_id=job_type_id,
+                completed_on=_parse_date(row, "completed_on"),
+            )
+        try:
+            duration = Decimal(_required(row, "duration"))
+        except InvalidOperation:
+            raise RowError("duration must be a number of hours")
+        if not Decimal("0") < duration < Decimal("100") or (
+            duration.as_tuple().exponent < -2
+        ):
+            raise RowError("duration must be between 0 and 99.99 hours")
+        return Absence(
+            user_id=user_id,
+            date=_parse_date(row, "date"),
+            duration=duration,
+        )
+
+    def _flush(self, batch):
+        if batch and not self.report.dry_run:
+            if self.model is CompletedJob:
+                snapshot_credits(batch)
+            self.model.objects.bulk_create(batch)
+            rollups.touched_days(self.model, batch, self.days_by_user)
+        self.report.imported += len(batch)
+
+    def run(self, rows):
+        """
+        Imports ``(line number, row)`` pairs as produced by
+        :func:`read_rows` and returns the :class:`ImportReport`.
+        Only one batch of records is held in memory at a time, and the
+        rollups of the touched days are refreshed once at the end.
+        """
+        batch = []
+        try:
+            for line, row in rows:
+                self.report.rows += 1
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    batch.append(self.build(row))
+                except RowError as error:
+                    self.report.reject(line, error)
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            self._flush(batch)
+        finally:
+            # Committed batches are refreshed even if a later one failed
+            refresh_touched(self.days_by_user)
+        return self.report
@@ -0,0 +1,36 @@
+from . import metrics_cache
+from .models import JobType
+
+
+def job_type_names():
+    """
+    Returns the name of every :model:`job_tracker.JobType` as
+    ``{pk: name}``.
+
+    Only the names are kept in the metrics cache, once for every user,
+    under :func:`~job_tracker.metrics_cache.job_type_version`. Credits are
+    read from the database whenever jobs are credited, so a process
+    holding an outdated copy can't credit jobs with old values.
+    """
+    return metrics_cache.get_or_compute_job_types(
+        "names",
+        lambda: dict(JobType.objects.order_by("pk").values_list("pk", "name")))
+
+
+def job_type_lookup():
+    """
+    Returns every :model:`job_tracker.JobType` as ``{pk: JobType}``,
+    built from :func:`job_type_names`. Their ``credits`` are deferred,
+    so reading them queries the database.
+    """
+    return {
+        pk: JobType.from_db("default", ["id", "name"], [pk, name])
+        for pk, name in job_type_names().items()
+    }
+
+
+def job_type_choices():
+    """
+    Returns the choices of a job type select, from :func:`job_type_names`.
+    """
+    return [("", "---------")] + list(job_type_names().items())
@@ -0,0 +1,99 @@
+import json
+import tempfile
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.runner import DiscoverRunner
+from job_tracker import benchmarks, seeding
+
+DEFAULT_PATHS = [
+    "/tracker/", "/tracker/history", "/tracker/absences", "/week-history/"]
+# Static pipeline and middleware before hashed, precompressed files
+# and compressed HTML
+BASELINE_SETTINGS = {
+    "STORAGES": {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    },
+    "MIDDLEWARE": [
+        middleware for middleware in settings.MIDDLEWARE
+        if middleware != "django.middleware.gzip.GZipMiddleware"
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Collects the static files into a scratch directory with the plain "
+        "and the configured static pipeline, then loads pages and their "
+        "static files like a browser with each and reports the bytes "
+        "transferred on first and repeat visits as JSON. A throwaway test "
+        "database is created and seeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Page to load. Can be repeated.",
+        )
+        parser.add_argument(
+            "--accept-encoding", default=benchmarks.BROWSER_ACCEPT_ENCODING)
+        parser.add_argument(
+            "--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            seeding.seed(users=1, job_types=12, years=1, jobs_per_day=3)
+            user = User.objects.order_by("pk").first()
+            report = {
+                "meta": {
+                    "django": django.get_version(),
+                    "accept_encoding": options["accept_encoding"],
+                },
+                "before": self.measure(user, options, BASELINE_SETTINGS),
+                "after": self.measure(user, options, {}),
+            }
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        for name, before in report["before"].items():
+            after = report["after"][name]
+            after["saved_first_visit_pct"] = _saved(
+                before["first_visit_bytes"], after["first_visit_bytes"])
+            after["saved_repeat_visit_pct"] = _saved(
+                before["repeat_visit_bytes"], after["repeat_visit_bytes"])
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output)
+        self.stdout.write(output)
+
+    def measure(self, user, options, overrides):
+        with tempfile.TemporaryDirectory() as static_root:
+            with override_settings(STATIC_ROOT=static_root, **overrides):
+                call_command("collectstatic", interactive=False, verbosity=0)
+                # A new client, so WhiteNoise indexes the new static root
+                client = Client()
+                client.force_login(user)
+                results = {}
+                for path in options["paths"] or DEFAULT_PATHS:
+                    result = benchmarks.page_weight(
+                        client, path, options["accept_encoding"])
+                    if result["status"] != 200:
+                        raise CommandError(f"{path} returned {result['status']}.")
+                    results[path] = result
+                return results
+
+
+def _saved(before, after):
+    return round(100 * (before - after) / before, 1) if before else 0.0
@@ -0,0 +1,202 @@
+import http.client
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from job_tracker.benchmarks import percentile
+
+HOST = "127.0.0.1"
+DEFAULT_PATHS = ["/tracker/", "/week-history/"]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def procfile_processes(procfile):
+    """
+    Returns the ``{name: command}`` processes of a Procfile.
+    """
+    processes = {}
+    for line in Path(procfile).read_text().splitlines():
+        name, _, command = line.partition(":")
+        if command.strip() and not name.startswith("#"):
+            processes[name.strip()] = command.strip()
+    return processes
+
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with code {process.returncode}.")
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"Server did not listen on port {port} in {timeout}s.")
+
+
+def _get(port, path, cookie):
+    conn = http.client.HTTPConnection(HOST, port, timeout=30)
+    try:
+        start = time.perf_counter()
+        conn.request("GET", path, headers={"Cookie": cookie})
+        response = conn.getresponse()
+        response.read()
+        return response.status, (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+
+def load(port, path, cookie, requests, concurrency):
+    """
+    Sends ``requests`` GETs of ``path`` from ``concurrency`` threads and
+    returns the latency percentiles and throughput.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(
+            lambda _: _get(port, path, cookie), range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for _, latency in results]
+    return {
+        "path": path,
+        "errors": sum(1 for status, _ in results if status != 200),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "requests_per_second": round(requests / elapsed, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts the WSGI and ASGI servers of the Procfile against the "
+        "configured database and reports, for each as JSON, the cold start "
+        "timings and the latency percentiles and throughput under load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--process", action="append", dest="processes",
+            help="Procfile process to benchmark. Defaults to web and asgi.",
+        )
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Path to request. Can be repeated.",
+        )
+        parser.add_argument("--username", default="engineer1")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--warmup", type=int, default=10,
+            help="Requests per path before the load, after the cold start.",
+        )
+        parser.add_argument(
+            "--no-warm-up", action="store_true",
+            help="Start the servers without their warm-up hook, to compare "
+                 "cold starts.",
+        )
+        parser.add_argument(
+            "--procfile", default=str(Path(settings.BASE_DIR) / "Procfile"))
+        parser.add_argument(
+            "--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        processes = procfile_processes(options["procfile"])
+        names = options["processes"] or ["web", "asgi"]
+        missing = [name for name in names if name not in processes]
+        if missing:
+            raise CommandError(f"Not in the Procfile: {', '.join(missing)}")
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+
+        # Sessions live in the database, so both servers accept the cookie
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.session.session_key}"
+
+        results = {}
+        for name in names:
+            results[name] = self.benchmark(processes[name], cookie, options)
+
+        report = {
+            "meta": {
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "warm_up": not options["no_warm_up"],
+                "processes": {name: processes[name] for name in names},
+            },
+            "results": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output)
+        self.stdout.write(output)
+
+    def benchmark(self, command, cookie, options):
+        """
+        Starts a server and returns its cold start timings, i.e. how
+        long it takes to listen and the latency of the first request of
+        each path, and its steady state latencies under load.
+        """
+        port = _free_port()
+        command = shlex.split(command) + ["--bind", f"{HOST}:{port}"]
+        env = {**os.environ, "PORT": str(port)}
+        if options["no_warm_up"]:
+            env["WARM_UP"] = "0"
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for_port(port, process)
+            listening = time.perf_counter()
+            paths = options["paths"] or DEFAULT_PATHS
+            first_requests = {}
+            for path in paths:
+                status, latency = _get(port, path, cookie)
+                if status != 200:
+                    raise CommandError(f"{path} returned {status}.")
+                first_requests[path] = round(latency, 3)
+            cold_start = {
+                "listen_ms": round((listening - started) * 1000, 3),
+                # The master warms up after binding, so the first
+                # response also waits for the warm-up and the workers
+                "first_response_ms": round(
+                    (listening - started) * 1000 + first_requests[paths[0]], 3),
+                "first_request_ms": first_requests,
+            }
+
+            steady_state = []
+            for path in paths:
+                for _ in range(options["warmup"]):
+                    _get(port, path, cookie)
+                steady_state.append(load(
+                    port, path, cookie, options["requests"], options["concurrency"]))
+            return {"cold_start": cold_start, "steady_state": steady_state}
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
@@ -0,0 +1,118 @@
+import json
+import platform
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from job_tracker import benchmarks, metrics_cache, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every URL of ctrack.urls through the Django test client and "
+        "reports latency percentiles, queries, SQL time and peak memory as "
+        "JSON. Write endpoints are posted form data and admin URLs are "
+        "requested as a staff user. By default a throwaway test database is "
+        "created and seeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Only benchmark this path. Can be repeated.",
+        )
+        parser.add_argument(
+            "--existing-db", action="store_true",
+            help="Benchmark the configured database instead of seeding a "
+                 "test database.",
+        )
+        parser.add_argument(
+            "--username",
+            help="User to log in as. Defaults to the first seeded user.",
+        )
+        parser.add_argument(
+            "--staff-username",
+            help="Staff user to request the admin URLs as. A seeded test "
+                 "database gets one, otherwise admin URLs are skipped "
+                 "without it.",
+        )
+        parser.add_argument(
+            "--writes", action="store_true",
+            help="Also post to the write endpoints of an existing database, "
+                 "adding jobs and absences to the user's history.",
+        )
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--job-types", type=int, default=12)
+        parser.add_argument("--years", type=float, default=5)
+        parser.add_argument("--jobs-per-day", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if options["existing_db"]:
+            report = self.benchmark(options, dataset=None)
+        else:
+            runner = DiscoverRunner(verbosity=0, interactive=False)
+            runner.setup_test_environment()
+            old_config = runner.setup_databases()
+            try:
+                dataset = seeding.seed(
+                    users=options["users"],
+                    job_types=options["job_types"],
+                    years=options["years"],
+                    jobs_per_day=options["jobs_per_day"],
+                    random_seed=options["seed"],
+                )
+                report = self.benchmark(options, dataset)
+            finally:
+                runner.teardown_databases(old_config)
+                runner.teardown_test_environment()
+
+        output = json.dumps(report, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output)
+        self.stdout.write(output)
+
+    def benchmark(self, options, dataset):
+        username = options["username"] or "engineer1"
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"User {username!r} does not exist.")
+
+        staff = None
+        if options["staff_username"]:
+            staff = User.objects.filter(
+                username=options["staff_username"], is_staff=True).first()
+            if staff is None:
+                raise CommandError(
+                    f"Staff user {options['staff_username']!r} does not exist.")
+        elif dataset is not None:
+            staff = User.objects.create_superuser("benchmark-admin")
+
+        metrics_cache.reset_cache_stats()
+        results = benchmarks.run(
+            user,
+            paths=options["paths"],
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            staff=staff,
+            writes=dataset is not None or options["writes"],
+        )
+        return {
+            "meta": {
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "iterations": options["iterations"],
+                "warmup": options["warmup"],
+                "dataset": dataset,
+                "metrics_cache": metrics_cache.cache_stats(),
+            },
+            "results": results,
+        }
@@ -0,0 +1,62 @@
+import json
+import sys
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from job_tracker.importers import BATCH_SIZE, Importer, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams CompletedJob or Absence records from a CSV or JSON Lines "
+        "file. Jobs need job_type (name) and completed_on columns, absences "
+        "need date and duration. A username column assigns each row to a "
+        "user, otherwise --user is required."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, - for stdin.")
+        parser.add_argument(
+            "--kind", choices=["jobs", "absences"], required=True)
+        parser.add_argument(
+            "--format", choices=["csv", "jsonl"], dest="file_format",
+            help="Defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--user", help="Username the rows belong to.")
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Validate every row without inserting anything.",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["file_format"]
+        if file_format is None:
+            file_format = "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist.")
+
+        importer = Importer(
+            options["kind"],
+            user=user,
+            dry_run=options["dry_run"],
+            batch_size=options["batch_size"],
+        )
+        if path == "-":
+            report = importer.run(read_rows(sys.stdin, file_format))
+        else:
+            with open(path, newline="", encoding="utf-8") as stream:
+                report = importer.run(read_rows(stream, file_format))
+
+        for line, error in report.rejects:
+            self.stderr.write(f"line {line}: {error}")
+        summary = report.as_dict()
+        del summary["rejects"]
+        self.stdout.write(json.dumps(summary))
+
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from job_tracker import rollups, tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the daily, weekly and monthly rollups from CompletedJob and "
+        "Absence, or checks the stored rollups for drift with --check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only rebuild or check this user id. Can be repeated.",
+        )
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Report drift without writing anything.",
+        )
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Queue the rebuild for the run_tasks worker instead.",
+        )
+
+    def handle(self, *args, user_ids=None, check=False, background=False,
+               **options):
+        if check:
+            drift = rollups.find_drift(user_ids)
+            for model_name, user_id, key, expected, stored in drift:
+                self.stdout.write(
+                    f"{model_name} user={user_id} {key}: "
+                    f"expected {expected}, stored {stored}"
+                )
+            if drift:
+                raise CommandError(f"{len(drift)} rollup rows have drifted.")
+            self.stdout.write(self.style.SUCCESS("Rollups are up to date."))
+            return
+
+        if background:
+            task = tasks.enqueue("rebuild_rollups", user_ids=user_ids)
+            self.stdout.write(self.style.SUCCESS(f"Queued task {task.pk}."))
+            return
+
+        count = rollups.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {count} users."))
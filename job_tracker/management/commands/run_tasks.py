@@ -0,0 +1,54 @@
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from job_tracker import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the queued background tasks on a pool of worker threads, "
+        "polling the database for new ones until stopped with SIGTERM or "
+        "Ctrl-C. Stale tasks are retried and expired exports and sync "
+        "tombstones deleted every few minutes. With --once the workers exit when the queue is empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int,
+            default=int(os.environ.get("TASK_WORKERS", "2")),
+            help="Worker threads, each with its own database connection.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="Seconds an idle worker waits before checking the queue.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Run the due tasks, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+        workers = max(options["workers"], 1)
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="task-worker"
+        ) as executor:
+            # One thread recovers stale tasks and deletes expired exports
+            # and tombstones
+            futures = [
+                executor.submit(
+                    tasks.work, stop, options["once"], options["poll_interval"],
+                    housekeeper=index == 0)
+                for index in range(workers)
+            ]
+            try:
+                ran = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                # Running tasks finish before the pool shuts down
+                stop.set()
+                ran = sum(future.result() for future in futures)
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} tasks."))
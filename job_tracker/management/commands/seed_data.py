@@ -0,0 +1,40 @@
+import json
+from django.core.management.base import BaseCommand
+from job_tracker import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset of users, job types and years of "
+        "CompletedJob and Absence history for benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--job-types", type=int, default=12)
+        parser.add_argument("--years", type=float, default=5)
+        parser.add_argument(
+            "--jobs-per-day", type=int, default=3,
+            help="Average number of jobs logged per working day.",
+        )
+        parser.add_argument(
+            "--absence-rate", type=float, default=0.05,
+            help="Chance of an absence on each working day.",
+        )
+        parser.add_argument(
+            "--prefix", default="engineer",
+            help="Username prefix, also used as every seeded password.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        counts = seeding.seed(
+            users=options["users"],
+            job_types=options["job_types"],
+            years=options["years"],
+            jobs_per_day=options["jobs_per_day"],
+            absence_rate=options["absence_rate"],
+            prefix=options["prefix"],
+            random_seed=options["seed"],
+        )
+        self.stdout.write(json.dumps(counts))
@@ -0,0 +1,169 @@
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from .models import JobType, ProfileTarget
+
+# Cached metrics are keyed by versions read from the database, never
+# from the cache itself, so a write in one process reaches every other
+# process sharing the database, whatever cache backend each of them
+# uses. A user's metrics are versioned by ``ProfileTarget.last_write_at``,
+# which moves with every change to their targets, jobs or absences and
+# with every change to a job type. Values shared by every user, like
+# the job type names, are versioned by the job types themselves.
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def metrics_cache():
+    """
+    Returns the cache backend configured for computed metrics.
+    """
+    return caches[getattr(settings, "METRICS_CACHE_ALIAS", "default")]
+
+
+def stamp(moment):
+    """
+    Returns a datetime as whole microseconds, for a cache key.
+    """
+    return int(moment.timestamp() * 1_000_000) if moment else 0
+
+
+def user_version(user):
+    """
+    Returns the current metrics version of a user, read from their
+    already loaded :model:`job_tracker.ProfileTarget`.
+    """
+    return stamp(user.profiletarget.last_write_at)
+
+
+def team_version():
+    """
+    Returns the current version of the cross-user metrics, which
+    changes with any user's write and when a profile is added or
+    removed. Costs one aggregate query over the profiles.
+    """
+    team = ProfileTarget.objects.aggregate(
+        latest=Max("last_write_at"), profiles=Count("pk"))
+    return f"{stamp(team['latest'])}.{team['profiles']}"
+
+
+def job_type_version():
+    """
+    Returns the current version of the job types, which changes when
+    one is saved, added or deleted. Costs one aggregate query over the
+    job types.
+    """
+    job_types = JobType.objects.aggregate(
+        latest=Max("updated_at"), job_types=Count("pk"))
+    return f"{stamp(job_types['latest'])}.{job_types['job_types']}"
+
+
+def get_or_compute(user, name, compute, *parts, timeout=None):
+    """
+    Returns the cached value of metric ``name`` for a user, calling
+    ``compute`` to build and store it on a miss. ``parts`` further
+    identify the value, e.g. the week or page it belongs to.
+    """
+    cache = metrics_cache()
+    key = _user_key(user, name, parts)
+    return _get_or_set(cache, key, compute, timeout)
+
+
+async def aget_or_compute(user, name, compute, *parts, timeout=None):
+    """
+    Async version of :func:`get_or_compute` sharing its entries, where
+    ``compute`` returns an awaitable.
+    """
+    cache = metrics_cache()
+    key = _user_key(user, name, parts)
+    value = await cache.aget(key)
+    if value is not None:
+        _count("hits")
+        return value
+    _count("misses")
+    value = await compute()
+    await cache.aset(key, value, _timeout(timeout))
+    return value
+
+
+def _user_key(user, name, parts):
+    return ":".join(
+        str(part) for part in
+        ("metrics", name, user.id, user_version(user), *parts)
+    )
+
+
+def get_or_compute_team(name, compute, *parts, timeout=None):
+    """
+    Returns the cached value of cross-user metric ``name``, calling
+    ``compute`` on a miss. The value is rebuilt once any user writes,
+    see :func:`team_version`.
+    """
+    cache = metrics_cache()
+    key = ":".join(
+        str(part) for part in ("metrics", "team", name, team_version(), *parts))
+    return _get_or_set(cache, key, compute, timeout)
+
+
+def get_or_compute_job_types(name, compute, *parts, timeout=None):
+    """
+    Returns the cached value of job type metric ``name``, shared by
+    every user, calling ``compute`` on a miss. The value is rebuilt
+    once a job type changes, see :func:`job_type_version`.
+    """
+    cache = metrics_cache()
+    key = ":".join(
+        str(part) for part in
+        ("metrics", "job_types", name, job_type_version(), *parts)
+    )
+    return _get_or_set(cache, key, compute, timeout)
+
+
+def _get_or_set(cache, key, compute, timeout):
+    value = cache.get(key)
+    if value is not None:
+        _count("hits")
+        return value
+    _count("misses")
+    value = compute()
+    cache.set(key, value, _timeout(timeout))
+    return value
+
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def count_lookups(hits, misses):
+    """
+    Adds lookups made straight on :func:`metrics_cache`, e.g. for many
+    keys at once, to the counters of :func:`cache_stats`.
+    """
+    _count("hits", hits)
+    _count("misses", misses)
+
+
+def cache_stats():
+    """
+    Returns the hit and miss counters of this process.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats["hits"] = 0
+        _stats["misses"] = 0
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return getattr(settings, "METRICS_CACHE_TIMEOUT", 60 * 60 * 24)
+    return timeout
@@ -1,7 +1,7 @@
 # Generated by Django 4.2.23 on 2025-08-17 14:26
 
-import django.contrib.postgres.fields
 from django.db import migrations, models
+import job_tracker.fields
 
 
 class Migration(migrations.Migration):
@@ -27,6 +27,6 @@ class Migration(migrations.Migration):
         migrations.AddField(
             model_name='profiletarget',
             name='days_off',
-            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(choices=[('Mon', 'Monday'), ('Tue', 'Tuesday'), ('Wed', 'Wednesday'), ('Thu', 'Thursday'), ('Fri', 'Friday'), ('Sat', 'Saturday'), ('Sun', 'Sunday')], max_length=3), default=['Sat', 'Sun'], size=None),
+            field=job_tracker.fields.PortableArrayField(base_field=models.CharField(choices=[('Mon', 'Monday'), ('Tue', 'Tuesday'), ('Wed', 'Wednesday'), ('Thu', 'Thursday'), ('Fri', 'Friday'), ('Sat', 'Saturday'), ('Sun', 'Sunday')], max_length=3), default=['Sat', 'Sun'], size=None),
         ),
     ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.23 on 2026-10-18 17:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('job_tracker', '0007_alter_profiletarget_days_off'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('credits', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('job_count', models.PositiveIntegerField(default=0)),
+                ('absence_hours', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-week_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('credits', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('job_count', models.PositiveIntegerField(default=0)),
+                ('absence_hours', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'week_start'), name='unique_weekly_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='unique_daily_rollup'),
+        ),
+    ]
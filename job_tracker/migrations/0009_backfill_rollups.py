@@ -0,0 +1,77 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    CompletedJob = apps.get_model("job_tracker", "CompletedJob")
+    Absence = apps.get_model("job_tracker", "Absence")
+    user_ids = set(
+        CompletedJob.objects.order_by().values_list("user_id", flat=True).distinct()
+    ) | set(
+        Absence.objects.order_by().values_list("user_id", flat=True).distinct()
+    )
+    # One user at a time, so only their days are held in memory
+    for user_id in sorted(user_ids):
+        backfill_user(apps, user_id)
+
+
+def backfill_user(apps, user_id):
+    CompletedJob = apps.get_model("job_tracker", "CompletedJob")
+    Absence = apps.get_model("job_tracker", "Absence")
+    DailyRollup = apps.get_model("job_tracker", "DailyRollup")
+    WeeklyRollup = apps.get_model("job_tracker", "WeeklyRollup")
+
+    def empty():
+        return {"credits": Decimal("0"), "job_count": 0, "absence_hours": Decimal("0")}
+
+    daily = defaultdict(empty)
+    job_rows = (
+        CompletedJob.objects.filter(user_id=user_id).values("completed_on")
+        .annotate(credits=Sum("job_type__credits"), job_count=Count("id"))
+        .order_by()
+    )
+    for row in job_rows:
+        totals = daily[row["completed_on"]]
+        totals["credits"] = row["credits"]
+        totals["job_count"] = row["job_count"]
+    absence_rows = (
+        Absence.objects.filter(user_id=user_id).values("date")
+        .annotate(absence_hours=Sum("duration"))
+        .order_by()
+    )
+    for row in absence_rows:
+        daily[row["date"]]["absence_hours"] = row["absence_hours"]
+
+    weekly = defaultdict(empty)
+    for day, totals in daily.items():
+        week = weekly[day - timedelta(days=day.weekday())]
+        for field, value in totals.items():
+            week[field] += value
+
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(user_id=user_id, day=d, **t) for d, t in daily.items()],
+        batch_size=1000,
+    )
+    WeeklyRollup.objects.bulk_create(
+        [WeeklyRollup(user_id=user_id, week_start=w, **t) for w, t in weekly.items()],
+        batch_size=1000,
+    )
+
+
+def clear_rollups(apps, schema_editor):
+    apps.get_model("job_tracker", "DailyRollup").objects.all().delete()
+    apps.get_model("job_tracker", "WeeklyRollup").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0008_dailyrollup_weeklyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, clear_rollups),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0009_backfill_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['user', 'date', 'duration'], name='absence_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='completedjob',
+            index=models.Index(fields=['user', 'completed_on', 'job_type'], name='completedjob_user_date_idx'),
+        ),
+    ]
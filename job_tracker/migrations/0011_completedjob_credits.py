@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0010_completedjob_absence_user_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='completedjob',
+            name='credits',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=4),
+            preserve_default=False,
+        ),
+        migrations.RemoveIndex(
+            model_name='completedjob',
+            name='completedjob_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='completedjob',
+            index=models.Index(fields=['user', 'completed_on', 'credits'], name='completedjob_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_credits(apps, schema_editor):
+    CompletedJob = apps.get_model("job_tracker", "CompletedJob")
+    JobType = apps.get_model("job_tracker", "JobType")
+    # One UPDATE copying each job type's current credits onto its jobs
+    CompletedJob.objects.update(
+        credits=Subquery(
+            JobType.objects.filter(pk=OuterRef("job_type_id")).values("credits")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0011_completedjob_credits'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_credits, migrations.RunPython.noop),
+    ]
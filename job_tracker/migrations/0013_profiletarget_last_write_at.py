@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0012_backfill_completedjob_credits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profiletarget',
+            name='last_write_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
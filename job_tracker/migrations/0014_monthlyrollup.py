@@ -0,0 +1,60 @@
+# Generated by Django 4.2.23 on 2026-10-18 21:12
+
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_monthly_rollups(apps, schema_editor):
+    DailyRollup = apps.get_model("job_tracker", "DailyRollup")
+    MonthlyRollup = apps.get_model("job_tracker", "MonthlyRollup")
+
+    def empty():
+        return {"credits": Decimal("0"), "job_count": 0, "absence_hours": Decimal("0")}
+
+    monthly = defaultdict(empty)
+    daily = DailyRollup.objects.values_list(
+        "user_id", "day", "credits", "job_count", "absence_hours"
+    ).order_by()
+    for user_id, day, credits, job_count, absence_hours in daily.iterator():
+        month = monthly[(user_id, day.replace(day=1))]
+        month["credits"] += credits
+        month["job_count"] += job_count
+        month["absence_hours"] += absence_hours
+
+    MonthlyRollup.objects.bulk_create(
+        [MonthlyRollup(user_id=u, month_start=m, **t) for (u, m), t in monthly.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('job_tracker', '0013_profiletarget_last_write_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_start', models.DateField()),
+                ('credits', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('job_count', models.PositiveIntegerField(default=0)),
+                ('absence_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'month_start'), name='unique_monthly_rollup'),
+        ),
+        migrations.RunPython(backfill_monthly_rollups, migrations.RunPython.noop),
+    ]
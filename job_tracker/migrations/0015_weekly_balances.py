@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:05
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Sum, Window
+
+
+def backfill_balances(apps, schema_editor):
+    ProfileTarget = apps.get_model("job_tracker", "ProfileTarget")
+    WeeklyRollup = apps.get_model("job_tracker", "WeeklyRollup")
+
+    for profile in ProfileTarget.objects.all().iterator():
+        daily_target = float(profile.daily_hours) * float(profile.daily_target) / 8
+        working_days = 7 - len(set(profile.days_off))
+        target = Decimal(str(round(daily_target * working_days, 2)))
+        weeks = WeeklyRollup.objects.filter(user_id=profile.user_id)
+        weeks.filter(job_count__gt=0).update(
+            surplus=F("credits") + F("absence_hours") - target)
+        running = weeks.annotate(
+            running=Window(Sum("surplus"), order_by=F("week_start").asc())
+        ).values_list("id", "running")
+        WeeklyRollup.objects.bulk_update(
+            [WeeklyRollup(id=pk, balance=balance) for pk, balance in running],
+            ["balance"], batch_size=500,
+        )
+        latest = weeks.order_by("-week_start").values_list("balance", flat=True).first()
+        ProfileTarget.objects.filter(pk=profile.pk).update(
+            balance=latest or Decimal("0"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0014_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profiletarget',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=11),
+        ),
+        migrations.AddField(
+            model_name='weeklyrollup',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=11),
+        ),
+        migrations.AddField(
+            model_name='weeklyrollup',
+            name='surplus',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:48
+
+import django.core.validators
+from django.db import migrations, models
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def days_off_to_mask(apps, schema_editor):
+    ProfileTarget = apps.get_model("job_tracker", "ProfileTarget")
+    profiles = []
+    for profile in ProfileTarget.objects.only("days_off").iterator():
+        profile.days_off_mask = sum(
+            1 << DAYS.index(day) for day in set(profile.days_off or []))
+        profiles.append(profile)
+    ProfileTarget.objects.bulk_update(profiles, ["days_off_mask"], batch_size=500)
+
+
+def mask_to_days_off(apps, schema_editor):
+    ProfileTarget = apps.get_model("job_tracker", "ProfileTarget")
+    profiles = []
+    for profile in ProfileTarget.objects.only("days_off_mask").iterator():
+        profile.days_off = [
+            day for bit, day in enumerate(DAYS) if profile.days_off_mask >> bit & 1]
+        profiles.append(profile)
+    ProfileTarget.objects.bulk_update(profiles, ["days_off"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0015_weekly_balances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profiletarget',
+            name='days_off_mask',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(127)]),
+        ),
+        migrations.RunPython(days_off_to_mask, mask_to_days_off),
+        migrations.RemoveField(
+            model_name='profiletarget',
+            name='days_off',
+        ),
+        migrations.RenameField(
+            model_name='profiletarget',
+            old_name='days_off_mask',
+            new_name='days_off',
+        ),
+    ]
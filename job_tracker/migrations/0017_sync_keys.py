@@ -0,0 +1,74 @@
+# Generated by Django 4.2.23 on 2026-10-18 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('job_tracker', '0016_profiletarget_days_off_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('job', 'Completed job'), ('absence', 'Absence')], max_length=10)),
+                ('record_id', models.BigIntegerField()),
+                ('client_key', models.UUIDField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='absence',
+            name='client_key',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='absence',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='completedjob',
+            name='client_key',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='completedjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['user', 'updated_at'], name='absence_user_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='completedjob',
+            index=models.Index(fields=['user', 'updated_at'], name='completedjob_user_sync_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='absence',
+            constraint=models.UniqueConstraint(fields=('user', 'client_key'), name='unique_absence_client_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='completedjob',
+            constraint=models.UniqueConstraint(fields=('user', 'client_key'), name='unique_completedjob_client_key'),
+        ),
+        migrations.AddField(
+            model_name='synctombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='synctombstone_user_idx'),
+        ),
+    ]
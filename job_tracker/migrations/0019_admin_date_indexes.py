@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0018_tasks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='completedjob',
+            name='job_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='job_tracker.jobtype'),
+        ),
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['date', 'id'], name='absence_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='completedjob',
+            index=models.Index(fields=['completed_on', 'id'], name='completedjob_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='completedjob',
+            index=models.Index(fields=['job_type', 'completed_on', 'id'], name='completedjob_type_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0020_weeklyrollup_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
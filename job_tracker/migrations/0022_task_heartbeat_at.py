@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeats(apps, schema_editor):
+    Task = apps.get_model("job_tracker", "Task")
+    # Tasks running during the upgrade last beat when they started
+    Task.objects.filter(status="running").update(heartbeat_at=F("started_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job_tracker', '0021_jobtype_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeats, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.contrib.postgres.fields import ArrayField
+from django.core.validators import MaxValueValidator
 
 # Create your models here.
 
@@ -8,9 +8,13 @@ from django.contrib.postgres.fields import ArrayField
 class JobType(models.Model):
     """
     Stores a single job type.
+
+    ``updated_at`` versions the cached job type names, see
+    :func:`job_tracker.metrics_cache.job_type_version`.
     """
     name = models.CharField(max_length=100, unique=True)
     credits = models.DecimalField(max_digits=4, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name}"
@@ -20,13 +24,68 @@ class CompletedJob(models.Model):
     """
     Stores a single completed job type entry from :model: `Jobtype`
     related to :model:`auth.User`.
+
+    ``credits`` is a snapshot of the job type's credits taken when the
+    job is saved, so later changes to :model:`JobType` don't rewrite
+    history and credit totals don't need the job type join.
+
+    ``client_key`` is the id a device gave the job when it was logged
+    offline, see :mod:`job_tracker.sync`, and ``updated_at`` the time
+    of its latest change.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    job_type = models.ForeignKey(JobType, on_delete=models.CASCADE)
+    # Indexed by completedjob_type_date_idx
+    job_type = models.ForeignKey(JobType, on_delete=models.CASCADE, db_index=False)
     completed_on = models.DateField()
+    credits = models.DecimalField(max_digits=4, decimal_places=2, editable=False)
+    client_key = models.UUIDField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-completed_on"]
+        indexes = [
+            # Serves every (user, date range) lookup and covers the
+            # grouped credit aggregates without touching the table.
+            models.Index(
+                fields=["user", "completed_on", "credits"],
+                name="completedjob_user_date_idx",
+            ),
+            models.Index(
+                fields=["user", "updated_at"], name="completedjob_user_sync_idx"),
+            # Order the admin changelist, also when filtered by job type,
+            # and serve its date hierarchy
+            models.Index(
+                fields=["completed_on", "id"], name="completedjob_date_idx"),
+            models.Index(
+                fields=["job_type", "completed_on", "id"],
+                name="completedjob_type_date_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "client_key"], name="unique_completedjob_client_key"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._credited_job_type_id = instance.job_type_id
+        return instance
+
+    def snapshot_credits(self):
+        """
+        Copies the credits of the job type onto the job.
+        """
+        self.credits = self.job_type.credits
+        self._credited_job_type_id = self.job_type_id
+
+    def save(self, *args, **kwargs):
+        # Only new jobs and jobs moved to another job type are re-credited
+        if self.credits is None or self.job_type_id != getattr(
+            self, "_credited_job_type_id", None
+        ):
+            self.snapshot_credits()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.job_type}, completed by {self.user}"
@@ -35,13 +94,32 @@ class CompletedJob(models.Model):
 class Absence(models.Model):
     """
     Stores a single absence entry related to :model:`auth.User`.
+    ``client_key`` and ``updated_at`` are kept for offline sync like
+    those of :model:`CompletedJob`.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField()
     duration = models.DecimalField(max_digits=4, decimal_places=2)
+    client_key = models.UUIDField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-date"]
+        indexes = [
+            # Serves every (user, date range) lookup and covers the
+            # grouped absence duration aggregates.
+            models.Index(
+                fields=["user", "date", "duration"],
+                name="absence_user_date_idx",
+            ),
+            models.Index(
+                fields=["user", "updated_at"], name="absence_user_sync_idx"),
+            models.Index(fields=["date", "id"], name="absence_date_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "client_key"], name="unique_absence_client_key"),
+        ]
 
     def __str__(self):
         return f"{self.user} absent for {self.duration} hours on {self.date}"
@@ -51,6 +129,11 @@ class ProfileTarget(models.Model):
     """
     Stores daily target, hours and rostered days off
     related to :model:`auth.User`.
+
+    ``last_write_at`` is the time of the user's latest change to their
+    targets, jobs or absences, or of the latest change to a job type,
+    and versions their cached metrics. ``balance``
+    is the running balance of their latest :model:`WeeklyRollup`.
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     daily_target = models.DecimalField(
@@ -58,7 +141,7 @@ class ProfileTarget(models.Model):
     daily_hours = models.DecimalField(
         max_digits=4, decimal_places=2, default=8.00)
 
-    # PostgreSQL specific model field, ArrayField.
+    # Rostered days off, as a 7 bit mask with bit 0 for Monday.
     DAYS_OF_WEEK = [
         ("Mon", "Monday"),
         ("Tue", "Tuesday"),
@@ -68,8 +151,189 @@ class ProfileTarget(models.Model):
         ("Sat", "Saturday"),
         ("Sun", "Sunday"),
     ]
-    days_off = ArrayField(
-        models.CharField(max_length=3, choices=DAYS_OF_WEEK), default=list)
+    days_off = models.PositiveSmallIntegerField(
+        default=0, validators=[MaxValueValidator(0b1111111)])
+    last_write_at = models.DateTimeField(auto_now=True)
+    balance = models.DecimalField(
+        max_digits=11, decimal_places=2, default=0, editable=False)
 
     def __str__(self):
         return f"Engineer:{self.user}, Target:{self.daily_target}"
+
+    @classmethod
+    def days_off_mask(cls, days):
+        """
+        Turns a list of weekday codes, e.g. ``["Sat", "Sun"]``, into a
+        ``days_off`` mask.
+        """
+        codes = [code for code, _ in cls.DAYS_OF_WEEK]
+        return sum(1 << codes.index(day) for day in set(days))
+
+    @property
+    def days_off_list(self):
+        """
+        Returns the weekday codes of the rostered days off, Monday first.
+        """
+        return [
+            code for bit, (code, _) in enumerate(self.DAYS_OF_WEEK)
+            if self.days_off >> bit & 1
+        ]
+
+
+class DailyRollup(models.Model):
+    """
+    Stores the pre-aggregated credits and absence hours of a single day
+    related to :model:`auth.User`.
+    Kept up to date from :model:`CompletedJob` and :model:`Absence`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    credits = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    job_count = models.PositiveIntegerField(default=0)
+    absence_hours = models.DecimalField(
+        max_digits=6, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day"], name="unique_daily_rollup"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} on {self.day}: {self.credits} credits"
+
+
+class WeeklyRollup(models.Model):
+    """
+    Stores the pre-aggregated credits and absence hours of a single week
+    related to :model:`auth.User`.
+    Kept up to date from :model:`DailyRollup`.
+
+    ``surplus`` is the week's credits over its target, 0 for weeks
+    without jobs, and ``balance`` the running total of the surpluses of
+    the user's weeks up to and including this one. ``updated_at`` moves
+    whenever the week is refreshed from its days.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    week_start = models.DateField()
+    credits = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    job_count = models.PositiveIntegerField(default=0)
+    absence_hours = models.DecimalField(
+        max_digits=7, decimal_places=2, default=0)
+    surplus = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=11, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-week_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "week_start"], name="unique_weekly_rollup"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} week of {self.week_start}: {self.credits} credits"
+
+
+class MonthlyRollup(models.Model):
+    """
+    Stores the pre-aggregated credits and absence hours of a single
+    calendar month related to :model:`auth.User`.
+    Kept up to date from :model:`DailyRollup`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month_start = models.DateField()
+    credits = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    job_count = models.PositiveIntegerField(default=0)
+    absence_hours = models.DecimalField(
+        max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["-month_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "month_start"], name="unique_monthly_rollup"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} month of {self.month_start}: {self.credits} credits"
+
+
+class SyncTombstone(models.Model):
+    """
+    Records a deleted :model:`CompletedJob` or :model:`Absence` of
+    :model:`auth.User`, so devices syncing later drop their copy.
+    """
+    KINDS = [
+        ("job", "Completed job"),
+        ("absence", "Absence"),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    record_id = models.BigIntegerField()
+    client_key = models.UUIDField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-deleted_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "deleted_at"], name="synctombstone_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.record_id} of {self.user} deleted"
+
+
+class Task(models.Model):
+    """
+    Stores a unit of background work queued by :mod:`job_tracker.tasks`,
+    optionally on behalf of :model:`auth.User`, and run by the
+    ``run_tasks`` worker.
+
+    ``key`` identifies what the task would do, so the same work is only
+    queued once while it is pending. ``progress`` runs from 0 to 100.
+    ``heartbeat_at`` is the last time the worker running the task showed
+    it was alive, by claiming it or reporting progress.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    progress = models.PositiveSmallIntegerField(
+        default=0, validators=[MaxValueValidator(100)])
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="task_queue_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"], condition=models.Q(status="pending"),
+                name="unique_pending_task"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
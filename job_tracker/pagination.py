@@ -0,0 +1,164 @@
+import json
+from datetime import date
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Query parameter carrying the opaque page token
+CURSOR_PARAM = "cursor"
+
+
+def encode_cursor(direction, key):
+    """
+    Turns a ``(date, id)`` key and a direction (``"next"`` or
+    ``"prev"``) into an opaque, URL safe token.
+    """
+    day, pk = key
+    payload = json.dumps([direction, day.isoformat(), pk]).encode()
+    return urlsafe_base64_encode(payload)
+
+
+def decode_cursor(token):
+    """
+    Reverses :func:`encode_cursor`, raising ``ValueError`` for tokens
+    that weren't made by it.
+    """
+    try:
+        direction, day, pk = json.loads(urlsafe_base64_decode(token))
+        if direction not in ("next", "prev") or not isinstance(pk, int):
+            raise ValueError
+        return direction, (date.fromisoformat(day), pk)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor {token!r}") from error
+
+
+class KeysetPage:
+    """
+    A page of objects read by keyset pagination. Unlike Django's
+    ``Page`` it knows nothing about the total number of objects,
+    only whether there are more before or after it.
+    """
+
+    def __init__(self, object_list, key, has_previous, has_next):
+        self.object_list = object_list
+        self.previous_token = self.next_token = None
+        # An empty page, e.g. after its rows were deleted, links nowhere
+        if object_list and has_previous:
+            self.previous_token = encode_cursor("prev", key(object_list[0]))
+        if object_list and has_next:
+            self.next_token = encode_cursor("next", key(object_list[-1]))
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+def keyset_page(queryset, date_field, page_size, token=None):
+    """
+    Returns the :class:`KeysetPage` of ``queryset`` that ``token``
+    points at, newest ``(date_field, id)`` first.
+
+    Pages are found by seeking past the last key of the previous
+    page instead of counting and offsetting, so every page costs a
+    single ``LIMIT`` query however deep into the history it is.
+    """
+    def key(obj):
+        return getattr(obj, date_field), obj.pk
+
+    if token is None:
+        rows = list(queryset.order_by(f"-{date_field}", "-pk")[:page_size + 1])
+        return KeysetPage(rows[:page_size], key, False, len(rows) > page_size)
+
+    direction, (day, pk) = decode_cursor(token)
+    if direction == "next":
+        # The outer bound on the date alone lets the database seek the index
+        seek = Q(**{f"{date_field}__lte": day}) & (
+            Q(**{f"{date_field}__lt": day}) | Q(pk__lt=pk))
+        rows = list(
+            queryset.filter(seek).order_by(f"-{date_field}", "-pk")[:page_size + 1])
+        return KeysetPage(rows[:page_size], key, True, len(rows) > page_size)
+
+    seek = Q(**{f"{date_field}__gte": day}) & (
+        Q(**{f"{date_field}__gt": day}) | Q(pk__gt=pk))
+    rows = list(queryset.filter(seek).order_by(date_field, "pk")[:page_size + 1])
+    return KeysetPage(rows[:page_size][::-1], key, len(rows) > page_size, True)
+
+
+class KeysetPaginationMixin:
+    """
+    Replaces the offset pagination of a ``ListView`` with keyset
+    pagination on ``(cursor_field, id)``, newest first. The page is
+    picked by the opaque ``cursor`` query parameter and exposed as
+    ``page_obj`` with ``next_token`` and ``previous_token``.
+    """
+
+    cursor_field = None
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = keyset_page(
+                queryset, self.cursor_field, page_size,
+                self.request.GET.get(CURSOR_PARAM))
+        except ValueError:
+            raise Http404("Invalid page.")
+        return None, page, page.object_list, page.has_other_pages()
+
+
+def estimated_count(model, using="default"):
+    """
+    Returns the number of rows in a model's table according to the
+    database's statistics, without reading the table, or None when
+    there are no statistics yet. PostgreSQL keeps them up to date in
+    ``pg_class``, SQLite only after ``ANALYZE``.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)"
+    elif connection.vendor == "sqlite":
+        # The first number of each index's stat is the table's row count
+        sql = "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    else:
+        return None
+    try:
+        # A savepoint, so a missing sqlite_stat1 can't break the transaction
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    # PostgreSQL reports -1 for tables that were never analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables. An unfiltered
+    changelist takes its count from the table statistics instead of a
+    ``COUNT(*)`` over every row, once they say there are more than
+    ``estimate_above`` rows. Filtered changelists are counted exactly.
+    """
+
+    estimate_above = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        return super().count
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear
+from .models import DailyRollup, MonthlyRollup
+from .rollups import TOTAL_FIELDS, _empty_totals, month_end_of, month_start_of
+from .targets import TargetEngine
+
+# Truncation and length in months of every report granularity
+GRANULARITIES = {
+    "month": (TruncMonth, 1),
+    "quarter": (TruncQuarter, 3),
+    "year": (TruncYear, 12),
+}
+# Ranges longer than this are read from the monthly rollups
+DAILY_RANGE_LIMIT = timedelta(days=366)
+
+
+def add_months(day, months):
+    """
+    Returns the first of the month ``months`` months after ``day``'s.
+    """
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def period_start_of(day, granularity):
+    """
+    Returns the first day of the month, quarter or year ``day`` falls in.
+    """
+    _, length = GRANULARITIES[granularity]
+    return date(day.year, (day.month - 1) // length * length + 1, 1)
+
+
+def _grouped(queryset, date_field, trunc):
+    return (
+        queryset.annotate(period=trunc(date_field))
+        .values("period")
+        .annotate(**{field: Sum(field) for field in TOTAL_FIELDS})
+        .order_by()
+    )
+
+
+def _sources(user, start, end, trunc):
+    """
+    Returns the grouped querysets covering ``start`` to ``end``.
+
+    Ranges up to :data:`DAILY_RANGE_LIMIT` are grouped from the
+    :model:`job_tracker.DailyRollup` rows. Longer ones read their whole
+    months from :model:`job_tracker.MonthlyRollup` and only the days of
+    the partial months at either end from the daily rows, so the rows
+    read grow with the number of months rather than days or jobs.
+    """
+    days = DailyRollup.objects.filter(user=user)
+    if end - start < DAILY_RANGE_LIMIT:
+        return [_grouped(days.filter(day__range=(start, end)), "day", trunc)]
+
+    first_month = start if start.day == 1 else add_months(start, 1)
+    last_month = month_start_of(end)
+    if end != month_end_of(end):
+        last_month = add_months(end, -1)
+    edges = Q()
+    if start < first_month:
+        edges |= Q(day__range=(start, first_month - timedelta(days=1)))
+    if end > month_end_of(last_month):
+        edges |= Q(day__range=(month_end_of(last_month) + timedelta(days=1), end))
+    months = MonthlyRollup.objects.filter(
+        user=user, month_start__range=(first_month, last_month))
+    sources = [_grouped(months, "month_start", trunc)]
+    if edges:
+        sources.append(_grouped(days.filter(edges), "day", trunc))
+    return sources
+
+
+def build_report(user, start, end, granularity):
+    """
+    Returns the users credits, absence hours, target and variance for
+    every month, quarter or year from ``start`` to ``end``, plus a
+    ``total`` row for the whole range.
+
+    Totals are grouped in the database from the rollups, never from the
+    individual jobs, with at most two queries. Targets count the working
+    days of each period clipped to the range and take absences off pro
+    rata, like the daily targets of the tracker.
+    """
+    trunc, length = GRANULARITIES[granularity]
+    engine = TargetEngine.for_profile(user.profiletarget)
+
+    totals = defaultdict(_empty_totals)
+    for source in _sources(user, start, end, trunc):
+        for row in source:
+            period = totals[row["period"]]
+            for field in TOTAL_FIELDS:
+                period[field] += row[field] or 0
+
+    periods = []
+    period_start = period_start_of(start, granularity)
+    while period_start <= end:
+        next_start = add_months(period_start, length)
+        first = max(period_start, start)
+        last = min(next_start - timedelta(days=1), end)
+        periods.append(_row(engine, first, last, totals[period_start]))
+        period_start = next_start
+
+    total = {
+        field: sum(period[field] for period in periods)
+        for field in TOTAL_FIELDS
+    }
+    return {
+        "periods": periods,
+        "total": _row(engine, start, end, total),
+    }
+
+
+def _row(engine, first, last, totals):
+    target = engine.range_target(first, last, totals["absence_hours"])
+    return {
+        "start": first,
+        "end": last,
+        "credits": totals["credits"],
+        "job_count": totals["job_count"],
+        "absence_hours": totals["absence_hours"],
+        "target": target,
+        "variance": round(float(totals["credits"]) - target, 2),
+    }
@@ -0,0 +1,397 @@
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, F, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import (
+    CompletedJob, Absence, DailyRollup, WeeklyRollup, MonthlyRollup, ProfileTarget)
+from .targets import TargetEngine
+
+ZERO = Decimal("0.00")
+TOTAL_FIELDS = ("credits", "job_count", "absence_hours")
+BALANCE_FIELDS = ("surplus", "balance")
+# Rewritten weekly rollups get a new ``updated_at``, which versions the
+# cached week cards
+WEEK_FIELDS = TOTAL_FIELDS + BALANCE_FIELDS + ("updated_at",)
+# Date field of each fact model that feeds the rollups
+DATE_FIELDS = {CompletedJob: "completed_on", Absence: "date"}
+
+
+def week_start_of(day):
+    """
+    Returns the Monday of the week ``day`` falls in.
+    """
+    return day - timedelta(days=day.weekday())
+
+
+def month_start_of(day):
+    """
+    Returns the first day of the month ``day`` falls in.
+    """
+    return day.replace(day=1)
+
+
+def month_end_of(day):
+    """
+    Returns the last day of the month ``day`` falls in.
+    """
+    next_month = (month_start_of(day) + timedelta(days=32)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def _empty_totals():
+    return {"credits": ZERO, "job_count": 0, "absence_hours": ZERO}
+
+
+def _daily_totals(jobs, absences):
+    """
+    Groups the given job and absence querysets into
+    ``{day: totals}`` dicts with one database query each.
+    """
+    totals = defaultdict(_empty_totals)
+    job_rows = (
+        jobs.values("completed_on")
+        .annotate(credits=Sum("credits"), job_count=Count("id"))
+        .order_by()
+    )
+    for row in job_rows:
+        day = totals[row["completed_on"]]
+        day["credits"] = row["credits"] or ZERO
+        day["job_count"] = row["job_count"]
+    absence_rows = (
+        absences.values("date")
+        .annotate(absence_hours=Sum("duration"))
+        .order_by()
+    )
+    for row in absence_rows:
+        totals[row["date"]]["absence_hours"] = row["absence_hours"] or ZERO
+    return dict(totals)
+
+
+def _fold(daily_totals, period_start):
+    """
+    Folds ``{day: totals}`` into ``{period_start(day): totals}``.
+    """
+    totals = defaultdict(_empty_totals)
+    for day, day_totals in daily_totals.items():
+        period = totals[period_start(day)]
+        for field in TOTAL_FIELDS:
+            period[field] += day_totals[field]
+    return dict(totals)
+
+
+def _weekly_totals(daily_totals):
+    return _fold(daily_totals, week_start_of)
+
+
+def _monthly_totals(daily_totals):
+    return _fold(daily_totals, month_start_of)
+
+
+def _upsert(model, date_field, user_id, totals, fields=TOTAL_FIELDS):
+    """
+    Inserts or updates one rollup row per entry of ``totals``.
+    """
+    model.objects.bulk_create(
+        [
+            model(user_id=user_id, **{date_field: key}, **values)
+            for key, values in totals.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["user", date_field],
+        update_fields=list(fields),
+    )
+
+
+def _touch(user_id, balance_change=ZERO):
+    changes = {"last_write_at": timezone.now()}
+    if balance_change:
+        changes["balance"] = F("balance") + balance_change
+    ProfileTarget.objects.filter(user_id=user_id).update(**changes)
+
+
+def touch_all():
+    """
+    Moves every user's ``ProfileTarget.last_write_at`` to now, so all
+    cached metrics are rebuilt, e.g. after a job type changed.
+    """
+    ProfileTarget.objects.update(last_write_at=timezone.now())
+
+
+def week_target(profile):
+    """
+    Returns the target of a whole week without absence as a
+    ``Decimal``, so surpluses add up exactly in and out of the database.
+    """
+    return Decimal(str(TargetEngine.for_profile(profile).week_target()))
+
+
+def week_surplus(totals, target):
+    """
+    Returns a week's credits over ``target`` with its absence hours
+    taken off the target, or 0 for weeks without jobs.
+    """
+    if not totals["job_count"]:
+        return ZERO
+    return totals["credits"] + totals["absence_hours"] - target
+
+
+def _carry_balances(user_id, weeks, week_totals, target):
+    """
+    Sets the ``surplus`` and ``balance`` of the refreshed ``week_totals``
+    and moves the running balance of every later week by the change.
+
+    Only the stored weeks from the one before the first refreshed week
+    to the last refreshed week are read. Weeks after them are shifted by
+    a single ``UPDATE``. Returns the change of the latest balance.
+    """
+    first, last = min(weeks), max(weeks)
+    rows = WeeklyRollup.objects.filter(user_id=user_id)
+    previous = rows.filter(week_start__lt=first).order_by("-week_start")
+    span = rows.filter(
+        week_start__gte=Coalesce(
+            Subquery(previous.values("week_start")[:1]), Value(first)),
+        week_start__lte=last,
+    ).order_by("week_start").values("id", "week_start", "surplus", "balance")
+
+    old = new = ZERO
+    stored = {}
+    for row in span:
+        if row["week_start"] < first:
+            old = new = row["balance"]
+        else:
+            stored[row["week_start"]] = row
+
+    shifted = []
+    for week in sorted(stored.keys() | weeks):
+        row = stored.get(week)
+        if row:
+            old = row["balance"]
+        if week not in weeks:
+            new += row["surplus"]
+            if new != row["balance"]:
+                shifted.append(WeeklyRollup(id=row["id"], balance=new))
+        elif week in week_totals:
+            totals = week_totals[week]
+            totals["surplus"] = week_surplus(totals, target)
+            new += totals["surplus"]
+            totals["balance"] = new
+
+    if shifted:
+        WeeklyRollup.objects.bulk_update(shifted, ["balance"], batch_size=500)
+    change = new - old
+    if change:
+        rows.filter(week_start__gt=last).update(balance=F("balance") + change)
+    return change
+
+
+def rebuild_balances(user_id, profile=None):
+    """
+    Recomputes every weekly surplus of a user and the running balances
+    with :meth:`TargetEngine.balances` from one read of their weekly
+    rollups, e.g. after their targets changed. Moves
+    ``ProfileTarget.balance`` to the latest balance and ``last_write_at``
+    to now.
+    """
+    if profile is None:
+        profile = ProfileTarget.objects.filter(user_id=user_id).first()
+    engine = TargetEngine.for_profile(profile or ProfileTarget(user_id=user_id))
+    weeks = list(
+        WeeklyRollup.objects.filter(user_id=user_id).order_by("week_start")
+        .values_list("id", "job_count", "credits", "absence_hours"))
+    credits = array("d", (float(row[2]) for row in weeks))
+    # Weeks without jobs have no surplus
+    targets = array("d", (
+        engine.week_target(absence_hours) if job_count else 0.0
+        for _, job_count, _, absence_hours in weeks))
+    surplus, balance = engine.balances(credits, targets)
+    WeeklyRollup.objects.bulk_update(
+        [
+            WeeklyRollup(
+                id=row[0], surplus=_amount(surplus[index]),
+                balance=_amount(balance[index]))
+            for index, row in enumerate(weeks)
+        ],
+        BALANCE_FIELDS, batch_size=500,
+    )
+    ProfileTarget.objects.filter(user_id=user_id).update(
+        balance=_amount(balance[-1]) if weeks else ZERO,
+        last_write_at=timezone.now())
+
+
+def _amount(value):
+    # Sums of two decimal place amounts, rounded back to them
+    return Decimal(f"{value:.2f}")
+
+
+def _replace(model, date_field, user_id, keys, totals, fields=TOTAL_FIELDS):
+    """
+    Stores the ``totals`` of the given rollup ``keys``, deleting the
+    rows of keys left without any totals.
+    """
+    emptied = set(keys) - totals.keys()
+    if emptied:
+        model.objects.filter(
+            user_id=user_id, **{f"{date_field}__in": emptied}).delete()
+    _upsert(model, date_field, user_id, totals, fields)
+
+
+def refresh_days(user_id, days):
+    """
+    Recomputes the daily rollups of the given days for a single user
+    and the weekly and monthly rollups of the periods those days fall in.
+
+    Only the touched days are re-aggregated from the fact tables, and
+    the weeks and months are folded from one read of the already stored
+    daily rollups. The user's ``ProfileTarget.last_write_at`` is moved
+    to now.
+    """
+    days = {day for day in days if day is not None}
+    if not days:
+        return
+
+    with transaction.atomic():
+        # Locked first, so writes of the user and the rebuild_balances
+        # task take their turns
+        profile = ProfileTarget.objects.select_for_update().filter(
+            user_id=user_id).first()
+        totals = _daily_totals(
+            CompletedJob.objects.filter(user_id=user_id, completed_on__in=days),
+            Absence.objects.filter(user_id=user_id, date__in=days),
+        )
+        _replace(DailyRollup, "day", user_id, days, totals)
+
+        weeks = {week_start_of(day) for day in days}
+        months = {month_start_of(day) for day in days}
+        period_days = Q(day__in=[
+            week + timedelta(days=i) for week in weeks for i in range(7)])
+        for month in months:
+            period_days |= Q(day__range=(month, month_end_of(month)))
+        daily = {
+            row["day"]: row
+            for row in DailyRollup.objects.filter(user_id=user_id)
+            .filter(period_days).values("day", *TOTAL_FIELDS)
+        }
+        # The read also covers days of neighbouring, untouched periods
+        week_totals = {
+            week: totals for week, totals in _weekly_totals(daily).items()
+            if week in weeks
+        }
+        month_totals = {
+            month: totals for month, totals in _monthly_totals(daily).items()
+            if month in months
+        }
+        balance_change = _carry_balances(
+            user_id, weeks, week_totals,
+            week_target(profile or ProfileTarget(user_id=user_id)))
+        _replace(
+            WeeklyRollup, "week_start", user_id, weeks, week_totals, WEEK_FIELDS)
+        _replace(MonthlyRollup, "month_start", user_id, months, month_totals)
+        _touch(user_id, balance_change)
+
+
+def touched_days(model, objects, days_by_user=None):
+    """
+    Collects the days the given job or absence objects fall on
+    into a ``{user id: set of days}`` dict.
+    """
+    date_field = DATE_FIELDS[model]
+    if days_by_user is None:
+        days_by_user = defaultdict(set)
+    for obj in objects:
+        days_by_user[obj.user_id].add(getattr(obj, date_field))
+    return days_by_user
+
+
+def refresh_many(days_by_user, chunk_size=500):
+    """
+    Refreshes the rollups of a ``{user id: days}`` dict, a chunk of
+    days at a time so large imports don't build huge ``IN`` lists.
+    """
+    for user_id, days in days_by_user.items():
+        days = sorted(days)
+        for start in range(0, len(days), chunk_size):
+            refresh_days(user_id, days[start:start + chunk_size])
+
+
+def expected_rollups(user_id):
+    """
+    Aggregates the daily, weekly and monthly totals of a user from scratch.
+    """
+    daily = _daily_totals(
+        CompletedJob.objects.filter(user_id=user_id),
+        Absence.objects.filter(user_id=user_id),
+    )
+    return daily, _weekly_totals(daily), _monthly_totals(daily)
+
+
+def rollup_user_ids():
+    """
+    Returns the ids of every user with facts or rollups.
+    """
+    return sorted(
+        set(CompletedJob.objects.values_list("user_id", flat=True).distinct())
+        | set(Absence.objects.values_list("user_id", flat=True).distinct())
+        | set(DailyRollup.objects.values_list("user_id", flat=True).distinct())
+    )
+
+
+def rebuild(user_ids=None, progress=None):
+    """
+    Rebuilds the rollups of the given users, or of everyone, from the
+    fact tables. Users are processed one at a time to bound memory, and
+    ``progress(users rebuilt, total users)`` is called after each.
+    Returns the number of users rebuilt.
+    """
+    if user_ids is None:
+        user_ids = rollup_user_ids()
+    for done, user_id in enumerate(user_ids, 1):
+        daily, weekly, monthly = expected_rollups(user_id)
+        with transaction.atomic():
+            DailyRollup.objects.filter(user_id=user_id).delete()
+            WeeklyRollup.objects.filter(user_id=user_id).delete()
+            MonthlyRollup.objects.filter(user_id=user_id).delete()
+            _upsert(DailyRollup, "day", user_id, daily)
+            _upsert(WeeklyRollup, "week_start", user_id, weekly)
+            _upsert(MonthlyRollup, "month_start", user_id, monthly)
+            rebuild_balances(user_id)
+        if progress:
+            progress(done, len(user_ids))
+    return len(user_ids)
+
+
+def _stored(model, date_field, user_id):
+    return {
+        row[date_field]: {field: row[field] for field in TOTAL_FIELDS}
+        for row in model.objects.filter(user_id=user_id).values(
+            date_field, *TOTAL_FIELDS)
+    }
+
+
+def find_drift(user_ids=None):
+    """
+    Compares the stored rollups with freshly aggregated totals.
+    Returns a list of ``(model name, user id, date, expected, stored)``
+    tuples, one for every row that differs.
+    """
+    if user_ids is None:
+        user_ids = rollup_user_ids()
+    drift = []
+    for user_id in user_ids:
+        daily, weekly, monthly = expected_rollups(user_id)
+        for model, date_field, expected in (
+            (DailyRollup, "day", daily),
+            (WeeklyRollup, "week_start", weekly),
+            (MonthlyRollup, "month_start", monthly),
+        ):
+            stored = _stored(model, date_field, user_id)
+            for key in sorted(expected.keys() | stored.keys()):
+                if expected.get(key) != stored.get(key):
+                    drift.append((
+                        model.__name__, user_id, key,
+                        expected.get(key), stored.get(key),
+                    ))
+    return drift
@@ -0,0 +1,121 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from .models import JobType, CompletedJob, Absence, ProfileTarget
+from . import rollups
+
+BATCH_SIZE = 2000
+
+
+def seed_job_types(count, rng):
+    """
+    Creates ``count`` job types, reusing any that already exist.
+    """
+    JobType.objects.bulk_create(
+        [
+            JobType(
+                name=f"Seeded job {number}",
+                credits=Decimal(rng.randrange(25, 400)) / 100,
+            )
+            for number in range(1, count + 1)
+        ],
+        ignore_conflicts=True,
+    )
+    # bulk_create skips the signal moving every user's metrics version
+    rollups.touch_all()
+    return list(
+        JobType.objects.filter(name__startswith="Seeded job ").order_by("id")
+    )
+
+
+def seed_users(count, prefix):
+    """
+    Creates ``count`` users with a profile target each.
+    Every user's password is ``prefix``.
+    """
+    password = make_password(prefix)
+    usernames = [f"{prefix}{number}" for number in range(1, count + 1)]
+    existing = set(
+        User.objects.filter(username__in=usernames)
+        .values_list("username", flat=True)
+    )
+    User.objects.bulk_create(
+        [
+            User(username=name, email=f"{name}@example.com", password=password)
+            for name in usernames if name not in existing
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    users = list(User.objects.filter(username__in=usernames).order_by("id"))
+    # bulk_create skips the create_profile_target signal
+    weekends = ProfileTarget.days_off_mask(["Sat", "Sun"])
+    ProfileTarget.objects.bulk_create(
+        [ProfileTarget(user=user, days_off=weekends) for user in users],
+        ignore_conflicts=True,
+    )
+    return users
+
+
+def _history(user, job_types, start, end, rng, jobs_per_day, absence_rate):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            for _ in range(rng.randint(0, jobs_per_day * 2)):
+                job_type = rng.choice(job_types)
+                yield CompletedJob(
+                    user=user, job_type=job_type, completed_on=day,
+                    credits=job_type.credits)
+            if rng.random() < absence_rate:
+                yield Absence(
+                    user=user, date=day,
+                    duration=Decimal(rng.choice((1, 2, 4, 8))))
+        day += timedelta(days=1)
+
+
+def _flush(objects):
+    jobs = [obj for obj in objects if isinstance(obj, CompletedJob)]
+    absences = [obj for obj in objects if isinstance(obj, Absence)]
+    CompletedJob.objects.bulk_create(jobs, batch_size=BATCH_SIZE)
+    Absence.objects.bulk_create(absences, batch_size=BATCH_SIZE)
+    return len(jobs), len(absences)
+
+
+def seed(users=10, job_types=12, years=5, jobs_per_day=3,
+         absence_rate=0.05, prefix="engineer", random_seed=0):
+    """
+    Seeds users, job types and ``years`` of job and absence history
+    ending today with ``bulk_create``, then rebuilds their rollups.
+    The same arguments always produce the same dataset.
+    Returns the number of rows created per model.
+    """
+    rng = random.Random(random_seed)
+    end = date.today()
+    start = end - timedelta(days=round(365.25 * years))
+    counts = {"users": 0, "job_types": 0, "jobs": 0, "absences": 0}
+
+    with transaction.atomic():
+        types = seed_job_types(job_types, rng)
+        seeded_users = seed_users(users, prefix)
+        counts["users"] = len(seeded_users)
+        counts["job_types"] = len(types)
+
+        pending = []
+        for user in seeded_users:
+            for obj in _history(
+                user, types, start, end, rng, jobs_per_day, absence_rate
+            ):
+                pending.append(obj)
+                if len(pending) >= BATCH_SIZE:
+                    jobs, absences = _flush(pending)
+                    counts["jobs"] += jobs
+                    counts["absences"] += absences
+                    pending = []
+        jobs, absences = _flush(pending)
+        counts["jobs"] += jobs
+        counts["absences"] += absences
+
+        rollups.rebuild([user.id for user in seeded_users])
+    return counts
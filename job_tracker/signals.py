@@ -1,7 +1,11 @@
+from collections import defaultdict
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
-from .models import ProfileTarget
+from .models import ProfileTarget, CompletedJob, Absence, JobType, SyncTombstone
+from . import rollups, tasks
 
 
 # Signal to automatically create a profile target when a user is created
@@ -9,3 +13,85 @@ from .models import ProfileTarget
 def create_profile_target(sender, instance, created, **kwargs):
     if created:
         ProfileTarget.objects.create(user=instance)
+
+
+# Remember where an edited job or absence used to be, so the rollups of
+# the day it moved away from are refreshed too.
+@receiver(pre_save, sender=CompletedJob)
+@receiver(pre_save, sender=Absence)
+def remember_rollup_origin(sender, instance, **kwargs):
+    instance._rollup_origin = None
+    if instance.pk:
+        date_field = rollups.DATE_FIELDS[sender]
+        instance._rollup_origin = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("user_id", date_field)
+            .first()
+        )
+
+
+def _refresh_pending_days():
+    connection = transaction.get_connection()
+    days_by_user = connection.pending_rollup_days
+    connection.pending_rollup_days = defaultdict(set)
+    rollups.refresh_many(days_by_user)
+
+
+# The days touched in a transaction are refreshed once it commits, so
+# a cascade delete or a loop of saves refreshes each user once instead
+# of once per row. Outside a transaction they are refreshed right away.
+@receiver(post_save, sender=CompletedJob)
+@receiver(post_save, sender=Absence)
+@receiver(post_delete, sender=CompletedJob)
+@receiver(post_delete, sender=Absence)
+def refresh_rollups(sender, instance, **kwargs):
+    connection = transaction.get_connection()
+    if not hasattr(connection, "pending_rollup_days"):
+        connection.pending_rollup_days = defaultdict(set)
+    pending = connection.pending_rollup_days
+    # One refresh per transaction. A savepoint rolling back drops the
+    # callback it registered, and the next write registers it again
+    registered = bool(pending) and any(
+        callback[1] is _refresh_pending_days
+        for callback in connection.run_on_commit
+    )
+    pending[instance.user_id].add(getattr(instance, rollups.DATE_FIELDS[sender]))
+    origin = getattr(instance, "_rollup_origin", None)
+    if origin:
+        pending[origin[0]].add(origin[1])
+    if not registered:
+        transaction.on_commit(_refresh_pending_days)
+
+
+# Deleted jobs and absences are remembered for the devices that still
+# hold them, unless their user is deleted along with them.
+@receiver(post_delete, sender=CompletedJob)
+@receiver(post_delete, sender=Absence)
+def record_sync_tombstone(sender, instance, origin=None, **kwargs):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is User:
+        return
+    SyncTombstone.objects.create(
+        user_id=instance.user_id,
+        kind="job" if sender is CompletedJob else "absence",
+        record_id=instance.pk,
+        client_key=instance.client_key,
+    )
+
+
+# Weekly surpluses are measured against the profile's targets. Every
+# week of the user is rewritten, so the worker does it.
+@receiver(post_save, sender=ProfileTarget)
+def rebuild_profile_balances(sender, instance, created, **kwargs):
+    if not created:
+        tasks.enqueue("rebuild_balances", user_id=instance.user_id)
+
+
+# Completed jobs keep the credits they were saved with, so editing a
+# job type leaves the rollups alone. Renames still show up in the week
+# cards cached for every user, and in their ETags. The job type names
+# themselves follow ``JobType.updated_at``.
+@receiver(post_save, sender=JobType)
+@receiver(post_delete, sender=JobType)
+def invalidate_job_type_metrics(sender, instance, **kwargs):
+    rollups.touch_all()
@@ -0,0 +1,321 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .bulk import refresh_touched, snapshot_credits
+from .forms import AbsenceForm, BulkCompletedJobForm
+from .job_types import job_type_lookup
+from .models import CompletedJob, Absence, SyncTombstone
+from . import rollups
+
+# Models a device can sync and the forms validating them, by the
+# ``type`` of their operations
+KINDS = {"job": CompletedJob, "absence": Absence}
+FORMS = {"job": BulkCompletedJobForm, "absence": AbsenceForm}
+# Creates and updates are both upserts on the client key, so a batch
+# that is sent again after a dropped response leaves the same state.
+OPERATIONS = ("create", "update", "delete")
+MAX_OPERATIONS = 500
+# Changes made this long before a cursor was issued are sent again, so
+# writes still in flight when it was issued aren't missed.
+CURSOR_OVERLAP = timedelta(seconds=5)
+# At most this many changed jobs, absences and deletions each are sent
+# per sync. The rest follow with the continuation cursor.
+CHANGES_LIMIT = 1000
+# Deletions are remembered this long. A device whose last sync is older
+# may have missed some, so it gets every record again.
+TOMBSTONE_RETENTION = timedelta(days=90)
+# The change streams of a continuation cursor, in order
+STREAMS = ("job", "absence", "deleted")
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SyncError(ValueError):
+    """
+    Raised for a batch that can't be applied, with the errors of its
+    operations as ``[{"index": ..., "errors": ...}]``.
+    """
+
+    def __init__(self, errors):
+        super().__init__("Invalid sync batch")
+        self.errors = errors
+
+
+def _micros(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _moment(micros):
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+def parse_cursor(cursor):
+    """
+    Returns the time the device last synced, or None for a first sync,
+    and where a continuation cursor from :func:`changes_since` left off
+    in each stream of changes as ``{stream: (time, pk)}``.
+    """
+    if cursor in (None, ""):
+        return None, {}
+    try:
+        since, *positions = str(cursor).split(":")
+        if positions and len(positions) != len(STREAMS):
+            raise ValueError(cursor)
+        after = {}
+        for stream, position in zip(STREAMS, positions):
+            if position:
+                micros, pk = position.split(".")
+                after[stream] = (_moment(micros), int(pk))
+        return (_moment(since) if since else None), after
+    except (TypeError, ValueError, OverflowError):
+        raise SyncError([{"index": None, "errors": {"cursor": ["Invalid cursor."]}}])
+
+
+def _form(kind, operation, job_types):
+    data = {field: operation.get(field, "") for field in FORMS[kind].Meta.fields}
+    if kind == "job":
+        return BulkCompletedJobForm(data=data, job_types=job_types)
+    return AbsenceForm(data=data)
+
+
+def _validate(user, operations):
+    """
+    Checks every operation and returns the last one of each record as
+    ``{(kind, key): (op, form)}`` in the order they were sent. Raises
+    :class:`SyncError` listing every invalid operation.
+    """
+    if not isinstance(operations, list) or len(operations) > MAX_OPERATIONS:
+        raise SyncError([{"index": None, "errors": {
+            "operations": [f"Expected a list of up to {MAX_OPERATIONS} operations."]}}])
+
+    job_types = None
+    final = {}
+    errors = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            errors.append({"index": index, "errors": {"__all__": ["Expected an object."]}})
+            continue
+        op, kind = operation.get("op"), operation.get("type")
+        problems = {}
+        if op not in OPERATIONS:
+            problems["op"] = [f"Expected one of {', '.join(OPERATIONS)}."]
+        if kind not in KINDS:
+            problems["type"] = [f"Expected one of {', '.join(KINDS)}."]
+        try:
+            key = uuid.UUID(str(operation.get("key")))
+        except ValueError:
+            problems["key"] = ["Expected a UUID."]
+        form = None
+        if not problems and op != "delete":
+            if kind == "job" and job_types is None:
+                job_types = job_type_lookup()
+            form = _form(kind, operation, job_types)
+            if not form.is_valid():
+                problems = {
+                    field: list(messages) for field, messages in form.errors.items()}
+        if problems:
+            errors.append({"index": index, "errors": problems})
+            continue
+        # A later operation on the same record supersedes earlier ones
+        final.pop((kind, key), None)
+        final[(kind, key)] = (op, form)
+    if errors:
+        raise SyncError(errors)
+    return final
+
+
+def _deleted_keys(user, final, since):
+    # Creates and updates of records deleted on the server since the
+    # device's last sync are skipped, so a batch the device sent before
+    # hearing of the delete doesn't bring them back
+    keys = [key for (_, key), (op, _) in final.items() if op != "delete"]
+    if not keys:
+        return set()
+    tombstones = SyncTombstone.objects.filter(user=user, client_key__in=keys)
+    if since is not None:
+        tombstones = tombstones.filter(deleted_at__gt=since)
+    return set(tombstones.values_list("kind", "client_key"))
+
+
+def _apply(user, kind, operations, days, deleted=frozenset()):
+    """
+    Applies the ``{key: (op, form)}`` operations of one kind of record
+    and adds the days they touch to ``days``. Returns ``{key: status}``.
+    Creates and updates of the ``(kind, key)`` pairs in ``deleted`` are
+    skipped unless the record exists again.
+    """
+    model = KINDS[kind]
+    date_field = rollups.DATE_FIELDS[model]
+    existing = {
+        row.client_key: row
+        for row in model.objects.filter(user=user, client_key__in=operations)
+    }
+
+    statuses = {}
+    upserts = []
+    deletes = []
+    for key, (op, form) in operations.items():
+        row = existing.get(key)
+        if row:
+            days.add(getattr(row, date_field))
+        if op == "delete":
+            statuses[key] = "deleted" if row else "missing"
+            if row:
+                deletes.append(row.pk)
+            continue
+        if not row and (kind, key) in deleted:
+            statuses[key] = "skipped"
+            continue
+        obj = form.save(commit=False)
+        obj.user = user
+        obj.client_key = key
+        if model is CompletedJob:
+            obj.credits = None
+            if row and row.job_type_id == obj.job_type_id:
+                obj.credits = row.credits
+        days.add(getattr(obj, date_field))
+        upserts.append(obj)
+        statuses[key] = "updated" if row else "created"
+
+    if upserts:
+        if model is CompletedJob:
+            snapshot_credits([obj for obj in upserts if obj.credits is None])
+        upsert_fields = ["updated_at", *FORMS[kind].Meta.fields]
+        if model is CompletedJob:
+            upsert_fields.append("credits")
+        model.objects.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=["user", "client_key"],
+            update_fields=upsert_fields,
+        )
+    if deletes:
+        # The delete signals refresh the rollups and leave tombstones
+        model.objects.filter(pk__in=deletes).delete()
+    return statuses
+
+
+def apply_batch(user, operations, since=None):
+    """
+    Applies a batch of offline ``operations`` of a user in one
+    transaction and returns the outcome of each as ``[{"type", "key",
+    "status"}]``, where the status is ``created``, ``updated``,
+    ``deleted``, ``missing`` for a delete of an unknown key or
+    ``skipped`` for a create or update of a record deleted on the
+    server after ``since``, the device's last sync.
+
+    Each operation is ``{"op", "type", "key"}`` plus the fields of the
+    :model:`job_tracker.CompletedJob` or :model:`job_tracker.Absence`
+    form for creates and updates. ``key`` is the UUID the device gave
+    the record. Nothing is applied unless every operation is valid.
+    """
+    final = _validate(user, operations)
+    by_model = defaultdict(dict)
+    for (kind, key), operation in final.items():
+        by_model[kind][key] = operation
+
+    days = set()
+    statuses = {}
+    with transaction.atomic():
+        deleted = _deleted_keys(user, final, since)
+        for kind, model_operations in by_model.items():
+            applied = _apply(user, kind, model_operations, days, deleted)
+            for key, status in applied.items():
+                statuses[(kind, key)] = status
+        if days:
+            refresh_touched({user.id: days})
+    return [
+        {"type": kind, "key": str(key), "status": statuses[(kind, key)]}
+        for kind, key in final
+    ]
+
+
+def _page(rows, field, since, after, limit):
+    """
+    Returns up to ``limit`` rows changed after ``since`` and
+    after the ``(time, pk)`` position ``after``, oldest change first,
+    and whether more are left.
+    """
+    if since is not None:
+        rows = rows.filter(**{f"{field}__gt": since})
+    if after:
+        moment, pk = after
+        rows = rows.filter(
+            Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "pk__gt": pk}))
+    page = list(rows.order_by(field, "pk")[:limit + 1])
+    return page[:limit], len(page) > limit
+
+
+def changes_since(user, since=None, after=None, limit=CHANGES_LIMIT):
+    """
+    Returns the user's jobs and absences changed since ``since``, the
+    ones deleted since then, and the cursor of the next sync. Without
+    ``since`` every job and absence is returned.
+
+    Each stream of changes is sent ``limit`` rows at a time,
+    oldest first. While rows are left ``more`` is true and the cursor
+    continues each stream after the ``(time, pk)`` position in
+    ``after``. A ``since`` older than ``TOMBSTONE_RETENTION`` may have
+    missed purged deletions, so ``reset`` is true and every record is
+    sent for the device to replace its copy.
+    """
+    now = timezone.now()
+    after = after or {}
+    reset = since is not None and since < now - TOMBSTONE_RETENTION
+    if reset:
+        since = None
+    base = since and since - CURSOR_OVERLAP
+    streams = {
+        "job": (
+            CompletedJob.objects.filter(user=user), "updated_at",
+            ("id", "client_key", "job_type", "completed_on", "credits")),
+        "absence": (
+            Absence.objects.filter(user=user), "updated_at",
+            ("id", "client_key", "date", "duration")),
+        "deleted": (
+            SyncTombstone.objects.filter(user=user)
+            if since is not None else SyncTombstone.objects.none(),
+            "deleted_at", ("id", "kind", "record_id", "client_key")),
+    }
+
+    pages = {}
+    positions = []
+    more = False
+    for stream in STREAMS:
+        rows, field, fields = streams[stream]
+        page, left = _page(
+            rows.values(*fields, field), field, base, after.get(stream), limit)
+        more = more or left
+        position = (page[-1][field], page[-1]["id"]) if page else after.get(stream)
+        positions.append(
+            f"{_micros(position[0])}.{position[1]}" if position else "")
+        for row in page:
+            del row[field]
+        pages[stream] = page
+
+    deleted = {kind: [] for kind in KINDS}
+    for tombstone in pages["deleted"]:
+        deleted[tombstone["kind"]].append(
+            {"id": tombstone["record_id"], "key": tombstone["client_key"]})
+    if more:
+        cursor = ":".join([str(_micros(since)) if since else "", *positions])
+    else:
+        cursor = str(_micros(now))
+    return {
+        "cursor": cursor,
+        "more": more,
+        "reset": reset,
+        "changes": {"job": pages["job"], "absence": pages["absence"]},
+        "deleted": deleted,
+    }
+
+
+def purge_tombstones():
+    """
+    Deletes the tombstones older than ``TOMBSTONE_RETENTION``, and
+    returns how many were deleted.
+    """
+    cutoff = timezone.now() - TOMBSTONE_RETENTION
+    return SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
@@ -0,0 +1,150 @@
+from array import array
+from datetime import timedelta
+from itertools import accumulate, compress
+from operator import sub
+from django.db.models import Value
+from django.db.models.functions import ExtractIsoWeekDay
+from django.db.models.lookups import Exact
+from .models import ProfileTarget
+
+# Weekday names indexed by ``date.weekday()``, so working days are
+# found without formatting each date.
+WEEKDAY_NAMES = tuple(name for _, name in ProfileTarget.DAYS_OF_WEEK)
+# Length of the standard shift the daily target is set for.
+STANDARD_SHIFT_HOURS = 8
+
+
+def day_off(date_field, days_off):
+    """
+    Returns a database expression that is 1 when ``date_field`` falls
+    on a day of the ``days_off`` mask and 0 otherwise. ``days_off`` is
+    a mask or an expression such as ``F("user__profiletarget__days_off")``.
+    """
+    if not hasattr(days_off, "resolve_expression"):
+        days_off = Value(days_off)
+    return days_off.bitrightshift(ExtractIsoWeekDay(date_field) - 1).bitand(1)
+
+
+def on_working_days(queryset, date_field, days_off):
+    """
+    Filters ``queryset`` down to the rows whose ``date_field`` is a
+    working day of the ``days_off`` mask, in the database.
+    """
+    return queryset.filter(Exact(day_off(date_field, days_off), 0))
+
+
+def series(start, days, values_by_day):
+    """
+    Lays ``{date: value}`` out as an ``array("d")`` of ``days`` floats
+    indexed from ``start``. Dates outside the range are ignored and
+    missing ones are 0.
+    """
+    values = array("d", bytes(8 * days))
+    for day, value in values_by_day.items():
+        index = (day - start).days
+        if 0 <= index < days:
+            values[index] = float(value or 0)
+    return values
+
+
+class TargetEngine:
+    """
+    Computes the targets of a :model:`job_tracker.ProfileTarget` for
+    any range of days in batch.
+
+    Ranges are given as a start date and date indexed arrays, so a day
+    is an offset rather than a date object. The weekly pattern of
+    working days is built once and tiled over the range, and only the
+    days with an absence are computed one by one.
+    """
+
+    def __init__(self, daily_target, daily_hours, days_off):
+        self.shift_hours = float(daily_hours)
+        # Scales the daily target for users not on a standard 8h shift
+        self.daily_target = (
+            self.shift_hours * float(daily_target)) / STANDARD_SHIFT_HOURS
+        self.days_off = days_off
+        self.working_week = [
+            0 if self.days_off >> weekday & 1 else 1 for weekday in range(7)]
+        self.working_days_per_week = sum(self.working_week)
+
+    @classmethod
+    def for_profile(cls, profile):
+        return cls(profile.daily_target, profile.daily_hours, profile.days_off)
+
+    def working_mask(self, start, days):
+        """
+        Returns an ``array("b")`` holding 1 for every working day of
+        the ``days`` days from ``start`` and 0 for days off.
+        """
+        offset = start.weekday()
+        week = self.working_week[offset:] + self.working_week[:offset]
+        return (array("b", week) * (days // 7 + 1))[:days]
+
+    def working_days(self, start, days=7):
+        """
+        Returns the dates of the working days among ``days`` days
+        from ``start``.
+        """
+        dates = (start + timedelta(days=i) for i in range(days))
+        return list(compress(dates, self.working_mask(start, days)))
+
+    def working_day_count(self, start, end):
+        """
+        Returns the number of working days from ``start`` to ``end``
+        inclusive, counting whole weeks without visiting their days.
+        """
+        weeks, rest = divmod((end - start).days + 1, 7)
+        # The leftover days start on the same weekday as ``start``
+        return (
+            weeks * self.working_days_per_week + sum(self.working_mask(start, rest)))
+
+    def range_target(self, start, end, absence=0):
+        """
+        Returns the target of the days from ``start`` to ``end`` once
+        ``absence`` hours are taken off pro rata, which is the sum of
+        :meth:`day_target` over the range before rounding.
+        """
+        working_days = self.working_day_count(start, end)
+        return round(
+            self.daily_target * (working_days - float(absence) / self.shift_hours), 2)
+
+    def day_target(self, absence=0):
+        """
+        Returns the target of one working day once ``absence`` hours
+        are taken off, pro rata to the shift.
+        """
+        return round(
+            ((self.shift_hours - absence) * self.daily_target) / self.shift_hours, 2)
+
+    def daily_targets(self, start, absences):
+        """
+        Returns an ``array("d")`` of the target of each day in
+        ``absences``, the array of absence hours from ``start``.
+        Days off have a target of 0.
+        """
+        days = len(absences)
+        working = self.working_mask(start, days)
+        full_day = self.day_target()
+        week = array("d", (full_day if day else 0.0 for day in working[:7]))
+        targets = (week * (days // 7 + 1))[:days]
+        for index in compress(range(days), absences):
+            if working[index]:
+                targets[index] = self.day_target(absences[index])
+        return targets
+
+    def balances(self, credits, targets):
+        """
+        Returns the surplus of ``credits`` over ``targets`` for each day
+        or week and its running total, as two ``array("d")``.
+        """
+        surplus = array("d", map(sub, credits, targets))
+        return surplus, array("d", accumulate(surplus))
+
+    def week_target(self, absence=0):
+        """
+        Returns the target of a whole week once ``absence`` hours,
+        counted as credits, are taken off.
+        """
+        return round(
+            self.daily_target * self.working_days_per_week - float(absence), 2)
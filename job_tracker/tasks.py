@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+import time
+import traceback
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ProfileTarget, Task
+from . import exports, rollups, sync
+
+logger = logging.getLogger("job_tracker.tasks")
+
+# Task functions by name, filled by the @task decorator
+REGISTRY = {}
+# A failed attempt is retried after this delay, doubled for every
+# further attempt
+RETRY_DELAY = timedelta(seconds=30)
+# A running task whose heartbeat is older than this belongs to a worker
+# that died, and counts as a failed attempt. Tasks that report no
+# progress have this long to finish
+STALE_AFTER = timedelta(minutes=30)
+# Progress reports beat a running task's heartbeat at least this often,
+# even while its percentage stays the same
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+# Pending tasks a worker considers per claim, so workers racing for
+# the oldest task fall back to the next ones
+CLAIM_CANDIDATES = 10
+# Finished exports can be downloaded for this long before their file is
+# deleted
+EXPORT_RETENTION = timedelta(days=1)
+# How often a worker runs its housekeeping
+HOUSEKEEPING_INTERVAL = timedelta(minutes=5)
+
+
+def task(name=None, max_attempts=3):
+    """
+    Registers a function as a task. It is called with the running
+    :model:`job_tracker.Task` and the keyword arguments it was queued
+    with, and returns a JSON serializable result.
+    """
+    def register(func):
+        func.task_name = name or func.__name__
+        func.max_attempts = max_attempts
+        REGISTRY[func.task_name] = func
+        return func
+    return register
+
+
+def task_key(name, user=None, **kwargs):
+    """
+    Returns the key of the work a task would do, the same for identical
+    tasks whatever order their arguments are given in.
+    """
+    identity = json.dumps(
+        [name, user.pk if user else None, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def enqueue(name, user=None, **kwargs):
+    """
+    Queues the task ``name`` with JSON serializable ``kwargs`` and
+    returns it. An identical task that is still pending is returned
+    instead of queuing the same work twice.
+
+    Queued inside a transaction, the task only becomes visible to the
+    workers once the changes that called for it are committed.
+    """
+    func = REGISTRY[name]
+    key = task_key(name, user, **kwargs)
+    pending = Task.objects.filter(key=key, status=Task.PENDING).first()
+    if pending:
+        return pending
+    try:
+        with transaction.atomic():
+            return Task.objects.create(
+                user=user, name=name, key=key, kwargs=kwargs,
+                max_attempts=func.max_attempts, run_after=timezone.now())
+    except IntegrityError:
+        # Queued by a concurrent request since the check above
+        return Task.objects.filter(key=key).order_by("-created_at").first()
+
+
+def report_progress(task, done, total):
+    """
+    Stores how far a running task has got and beats its heartbeat,
+    writing only when the percentage changes or the last beat is older
+    than ``HEARTBEAT_INTERVAL``.
+    """
+    percent = min(100, done * 100 // total) if total else 100
+    now = timezone.now()
+    beat_due = (
+        task.heartbeat_at is None or now - task.heartbeat_at >= HEARTBEAT_INTERVAL)
+    if percent != task.progress or beat_due:
+        task.progress, task.heartbeat_at = percent, now
+        Task.objects.filter(pk=task.pk).update(progress=percent, heartbeat_at=now)
+
+
+def _retry_or_fail(task, error):
+    now = timezone.now()
+    if task.attempts < task.max_attempts:
+        delay = RETRY_DELAY * 2 ** max(task.attempts - 1, 0)
+        try:
+            with transaction.atomic():
+                Task.objects.filter(pk=task.pk).update(
+                    status=Task.PENDING, run_after=now + delay, error=error)
+            return
+        except IntegrityError:
+            # An identical task was queued meanwhile and does the work
+            error += "\nSuperseded by an identical pending task."
+    Task.objects.filter(pk=task.pk).update(
+        status=Task.FAILED, finished_at=now, error=error)
+
+
+def recover_stale():
+    """
+    Retries or fails the running tasks whose heartbeat stopped, as the
+    worker running them died. Returns the number of tasks recovered.
+    """
+    stale = Task.objects.filter(
+        status=Task.RUNNING, heartbeat_at__lt=timezone.now() - STALE_AFTER)
+    recovered = 0
+    for stale_task in stale:
+        _retry_or_fail(stale_task, "The worker running the task stopped.")
+        recovered += 1
+    return recovered
+
+
+def purge_exports():
+    """
+    Deletes the export files stored longer than ``EXPORT_RETENTION``
+    ago, including ones whose task never finished. Returns the number
+    of files deleted.
+    """
+    cutoff = timezone.now() - EXPORT_RETENTION
+    purged = 0
+    user_dirs, _ = default_storage.listdir("exports")
+    for user_dir in user_dirs:
+        _, names = default_storage.listdir(f"exports/{user_dir}")
+        for name in names:
+            path = f"exports/{user_dir}/{name}"
+            if default_storage.get_modified_time(path) < cutoff:
+                default_storage.delete(path)
+                purged += 1
+    return purged
+
+
+def housekeeping():
+    """
+    Recovers the stale tasks and deletes the expired exports and sync
+    tombstones. Returns the number of each as ``{"recovered",
+    "exports", "tombstones"}``.
+    """
+    done = {
+        "recovered": recover_stale(),
+        "exports": 0,
+        "tombstones": sync.purge_tombstones(),
+    }
+    try:
+        done["exports"] = purge_exports()
+    except FileNotFoundError:
+        # Nothing was exported yet
+        pass
+    if done["recovered"]:
+        logger.warning("Recovered %s stale tasks", done["recovered"])
+    return done
+
+
+def claim():
+    """
+    Marks the oldest due pending task as running and returns it, or
+    returns None when there is nothing to do. The conditional
+    ``UPDATE`` makes sure only one worker claims each task.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.PENDING, run_after__lte=now
+    ).order_by("run_after", "pk").values_list("pk", flat=True)
+    for pk in candidates[:CLAIM_CANDIDATES]:
+        claimed = Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING, started_at=now, heartbeat_at=now, progress=0,
+            attempts=F("attempts") + 1)
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def run(task):
+    """
+    Runs a claimed task and stores its result, or retries it later if
+    it raises and has attempts left. Returns the task as stored.
+    """
+    func = REGISTRY.get(task.name)
+    if func is None:
+        task.max_attempts = task.attempts
+        _retry_or_fail(task, f"Unknown task {task.name!r}.")
+        return Task.objects.get(pk=task.pk)
+    try:
+        result = func(task, **task.kwargs)
+    except Exception:
+        logger.exception("Task %s %s failed", task.pk, task.name)
+        _retry_or_fail(task, traceback.format_exc())
+    else:
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.DONE, progress=100, result=result, error="",
+            finished_at=timezone.now())
+    return Task.objects.get(pk=task.pk)
+
+
+def run_pending():
+    """
+    Runs every due task in this thread until the queue is empty, e.g.
+    from tests or a cron job. Returns the tasks that were run.
+    """
+    ran = []
+    while (claimed := claim()) is not None:
+        ran.append(run(claimed))
+    return ran
+
+
+def work(stop, once=False, poll_interval=1.0, housekeeper=True):
+    """
+    Claims and runs tasks until the ``stop`` event is set, or until the
+    queue is empty with ``once``. Meant for a worker thread, which owns
+    its own database connection. A ``housekeeper`` also runs
+    :func:`housekeeping` every ``HOUSEKEEPING_INTERVAL``. Returns the
+    number of tasks run.
+    """
+    ran = 0
+    next_housekeeping = time.monotonic()
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            if housekeeper and time.monotonic() >= next_housekeeping:
+                housekeeping()
+                next_housekeeping = (
+                    time.monotonic() + HOUSEKEEPING_INTERVAL.total_seconds())
+            claimed = claim()
+            if claimed is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run(claimed)
+            ran += 1
+    finally:
+        connection.close()
+    return ran
+
+
+@task()
+def rebuild_rollups(task, user_ids=None):
+    count = rollups.rebuild(
+        user_ids, progress=lambda done, total: report_progress(task, done, total))
+    return {"users": count}
+
+
+@task()
+def rebuild_balances(task, user_id):
+    # Job writes lock the profile too, so they wait for the rewrite
+    # instead of carrying a change into half rebuilt balances
+    with transaction.atomic():
+        profile = ProfileTarget.objects.select_for_update().filter(
+            user_id=user_id).first()
+        rollups.rebuild_balances(user_id, profile)
+    return {"user_id": user_id}
+
+
+@task(max_attempts=2)
+def export(task, kind, file_format, start=None, end=None):
+    user = User.objects.get(pk=task.user_id)
+    name = exports.save_export(
+        kind, user, file_format,
+        start and date.fromisoformat(start), end and date.fromisoformat(end),
+        progress=lambda done, total: report_progress(task, done, total))
+    return {
+        "name": name,
+        "filename": name.rsplit("/", 1)[-1],
+        "expires_at": (timezone.now() + EXPORT_RETENTION).isoformat(),
+    }
@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import CompletedJob, Absence
+from . import rollups
+
+
+def seed_history(user, job_types, days=730, jobs_per_day=3):
+    """
+    Bulk inserts ``days`` of weekday jobs and a weekly absence for a
+    user, ending today, and rebuilds the user's rollups.
+    """
+    start = date.today() - timedelta(days=days)
+    jobs = []
+    absences = []
+    for offset in range(days + 1):
+        day = start + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for number in range(jobs_per_day):
+            job_type = job_types[(offset + number) % len(job_types)]
+            jobs.append(
+                CompletedJob(
+                    user=user, job_type=job_type, completed_on=day,
+                    credits=job_type.credits))
+        if day.weekday() == 2:
+            absences.append(
+                Absence(user=user, date=day, duration=Decimal("1.50")))
+    CompletedJob.objects.bulk_create(jobs, batch_size=500)
+    Absence.objects.bulk_create(absences, batch_size=500)
+    rollups.rebuild([user.id])
+
+
+class QueryBudgetMixin:
+    """
+    Test case mixin that pins the maximum number of queries a block
+    of code may run, listing every query when the budget is exceeded.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label="Block"):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = "\n".join(
+                f"{number}. {query['sql']}"
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(
+                f"{label} ran {executed} queries, "
+                f"its budget is {budget}:\n{queries}"
+            )
+
+    def assertViewsBudgeted(self, urlpatterns, budgets):
+        """
+        Fails when a named view of ``urlpatterns`` has no pinned budget.
+        """
+        names = {pattern.name for pattern in urlpatterns if pattern.name}
+        self.assertEqual(
+            names - budgets.keys(), set(),
+            "Every view needs a pinned query budget",
+        )
@@ -1,3 +1,1273 @@
-from django.test import TestCase
+import gc
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from array import array
+from datetime import date, timedelta
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY, authenticate
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Max, Min, Sum
+from django.http import HttpResponse
+from django.template.base import Template
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from ctrack.profiling import ProfilingMiddleware
+from ctrack.warmup import warm_up
+from . import benchmarks, metrics_cache, urls, rollups, seeding, sync, tasks, views
+from .forms import formset_data
+from .job_types import job_type_choices, job_type_lookup, job_type_names
+from .admin import IndexedDatesQuerySet
+from .backends import ProfileTargetBackend
+from .pagination import EstimatedCountPaginator
+from .models import (
+    JobType, CompletedJob, Absence, DailyRollup, WeeklyRollup, ProfileTarget,
+    SyncTombstone, Task)
+from .targets import TargetEngine, on_working_days, series
+from .testing import QueryBudgetMixin, seed_history
 
 # Create your tests here.
+
+
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Pins the maximum number of queries of every view in
+    :mod:`job_tracker.urls` against two years of seeded history.
+    """
+
+    QUERY_BUDGETS = {
+        "tracker": 5,
+        "absences": 3,
+        "absence-post": 15,
+        "absence-edit": 17,
+        "absence-delete": 18,
+        "absence-export": 3,
+        "job-history": 4,
+        "job-export": 3,
+        "update-completed-job": 19,
+        "delete-completed-job": 18,
+        "job-post": 17,
+        "job-bulk-post": 20,
+        "import": 17,
+        "report": 4,
+        "api-week": 4,
+        "api-week-detail": 4,
+        "api-sync": 30,
+        "api-task": 3,
+        "export-download": 3,
+        "profile": 2,
+        "profile-edit": 8,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 5)
+        ]
+        seed_history(cls.user, cls.job_types)
+        cls.job = CompletedJob.objects.filter(user=cls.user).first()
+        cls.absence = Absence.objects.filter(user=cls.user).first()
+        cls.job_count = CompletedJob.objects.filter(user=cls.user).count()
+        tasks.enqueue("export", user=cls.user, kind="absence", file_format="csv")
+        cls.export_task, = tasks.run_pending()
+
+    def setUp(self):
+        caches["metrics"].clear()
+        self.client.force_login(self.user)
+
+    def request_view(self, name):
+        today = date.today().isoformat()
+        job_data = {"job_type": self.job_types[0].pk, "completed_on": today}
+        requests = {
+            "tracker": ("get", (), {}),
+            "absences": ("get", (), {}),
+            "absence-post": ("post", (), {"duration": "2.00", "date": today}),
+            "absence-edit": ("post", (self.absence.pk,), {
+                "edit-duration": "3.00", "edit-date": today}),
+            "absence-delete": ("get", (self.absence.pk,), {}),
+            "absence-export": ("get", (), {"format": "jsonl"}),
+            "job-history": ("get", (), {}),
+            "job-export": ("get", (), {}),
+            "update-completed-job": ("post", (self.job.pk,), job_data),
+            "delete-completed-job": ("get", (self.job.pk,), {}),
+            "job-post": ("post", (), job_data),
+            "job-bulk-post": ("post", (), formset_data(
+                [job_data] * 10, "jobs", ("job_type", "completed_on"))),
+            "import": ("post", (), {
+                "kind": "jobs", "file_format": "csv",
+                "file": SimpleUploadedFile("jobs.csv", jobs_csv(self.job_types))}),
+            "report": ("get", (), {
+                "start": "2020-02-11", "end": today, "granularity": "quarter"}),
+            "api-week": ("get", (), {}),
+            "api-week-detail": ("get", ("2024-01-03",), {}),
+            "api-sync": ("post", (), {"operations": [
+                {"op": "create", "type": "job", "key": str(uuid.uuid4()), **job_data},
+                {"op": "create", "type": "absence", "key": str(uuid.uuid4()),
+                 "duration": "2.00", "date": today},
+            ]}, "application/json"),
+            "api-task": ("get", (self.export_task.pk,), {}),
+            "export-download": ("get", (self.export_task.pk,), {}),
+            "profile": ("get", (), {}),
+            "profile-edit": ("post", (self.user.profiletarget.pk,), {
+                "daily_target": "4.25", "daily_hours": "8.00",
+                "days_off": ["Sat", "Sun"]}),
+        }
+        method, args, data, *content_type = requests[name]
+        return getattr(self.client, method)(
+            reverse(name, args=args), data, *content_type)
+
+    def test_every_view_has_a_budget(self):
+        self.assertViewsBudgeted(urls.urlpatterns, self.QUERY_BUDGETS)
+
+    def test_views_stay_within_budget(self):
+        for name, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                # Budgets include the rollup refresh run on commit
+                with self.assertMaxQueries(budget, name), \
+                        self.captureOnCommitCallbacks(execute=True):
+                    response = self.request_view(name)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertLess(response.status_code, 400)
+
+    def test_bulk_json_submission(self):
+        today = date.today().isoformat()
+        entries = [
+            {"job_type": job_type.pk, "completed_on": today}
+            for job_type in self.job_types
+        ]
+        with self.assertMaxQueries(self.QUERY_BUDGETS["job-bulk-post"]), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("job-bulk-post"), {"jobs": entries},
+                content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": len(entries)})
+
+        entries.append({"job_type": 0, "completed_on": today})
+        response = self.client.post(
+            reverse("job-bulk-post"), {"jobs": entries},
+            content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_submission_needs_a_login(self):
+        self.client.logout()
+        job_data = {
+            "job_type": self.job_types[0].pk, "completed_on": date.today().isoformat()}
+        response = self.client.post(
+            reverse("job-bulk-post"), {"jobs": [job_data]},
+            content_type="application/json")
+        self.assertRedirects(
+            response, f"{reverse('account_login')}?next={reverse('job-bulk-post')}",
+            fetch_redirect_response=False)
+        self.assertEqual(CompletedJob.objects.count(), self.job_count)
+
+    def test_deep_pages_stay_within_budget(self):
+        for name, model in (("job-history", CompletedJob), ("absences", Absence)):
+            with self.subTest(view=name):
+                seen = []
+                params = {}
+                while True:
+                    with self.assertMaxQueries(
+                        self.QUERY_BUDGETS[name], name
+                    ) as queries:
+                        response = self.client.get(reverse(name), params)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(any(
+                        "COUNT(" in query["sql"]
+                        for query in queries.captured_queries))
+                    page = response.context["page_obj"]
+                    seen.extend(obj.pk for obj in page)
+                    if not page.has_next():
+                        break
+                    params = {"cursor": page.next_token}
+                expected = model.objects.filter(user=self.user).order_by(
+                    f"-{response.context['view'].cursor_field}", "-pk")
+                self.assertEqual(seen, list(expected.values_list("pk", flat=True)))
+
+                response = self.client.get(
+                    reverse(name), {"cursor": page.previous_token})
+                self.assertTrue(response.context["page_obj"].has_next())
+                self.assertEqual(
+                    self.client.get(reverse(name), {"cursor": "junk"}).status_code,
+                    404)
+
+    def test_export_streams_the_date_range(self):
+        start = date.today().replace(day=1)
+        with self.assertMaxQueries(self.QUERY_BUDGETS["job-export"]):
+            response = self.client.get(
+                reverse("job-export"), {"start": start.isoformat()})
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(lines[0], "completed_on,job_type,credits")
+        self.assertEqual(
+            len(lines) - 1,
+            CompletedJob.objects.filter(
+                user=self.user, completed_on__gte=start).count())
+
+        response = self.client.get(reverse("job-export"), {
+            "start": start.isoformat(), "end": "2000-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_exports_need_a_login(self):
+        self.client.logout()
+        for name in ("job-export", "absence-export"):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name))
+                self.assertRedirects(
+                    response, f"{reverse('account_login')}?next={reverse(name)}",
+                    fetch_redirect_response=False)
+
+    def test_reports_add_up_to_the_jobs(self):
+        today = date.today()
+        for start, end, granularity in (
+            (today - timedelta(days=200), today, "month"),
+            (today - timedelta(days=700), today - timedelta(days=3), "quarter"),
+            (date(2020, 1, 1), today, "year"),
+        ):
+            with self.subTest(start=start, granularity=granularity):
+                with self.assertMaxQueries(self.QUERY_BUDGETS["report"]):
+                    response = self.client.get(reverse("report"), {
+                        "start": start, "end": end, "granularity": granularity})
+                report = response.context["report"]
+                jobs = CompletedJob.objects.filter(
+                    user=self.user, completed_on__range=(start, end))
+                absences = Absence.objects.filter(
+                    user=self.user, date__range=(start, end))
+                self.assertEqual(
+                    report["total"]["credits"],
+                    jobs.aggregate(total=Sum("credits"))["total"])
+                self.assertEqual(report["total"]["job_count"], jobs.count())
+                self.assertEqual(
+                    report["total"]["absence_hours"],
+                    absences.aggregate(total=Sum("duration"))["total"])
+                self.assertEqual(
+                    sum(period["credits"] for period in report["periods"]),
+                    report["total"]["credits"])
+                self.assertEqual(report["periods"][0]["start"], start)
+                self.assertEqual(report["periods"][-1]["end"], end)
+
+    def balances(self):
+        return list(WeeklyRollup.objects.filter(user=self.user).order_by(
+            "week_start").values_list("week_start", "surplus", "balance"))
+
+    def test_balances_carry_past_week_changes_forward(self):
+        weeks = self.balances()
+        running = Decimal("0")
+        for _, surplus, balance in weeks:
+            running += surplus
+            self.assertEqual(balance, running)
+
+        past_week = weeks[10][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("job-post"), {
+                "job_type": self.job_types[3].pk, "completed_on": past_week})
+        with self.captureOnCommitCallbacks(execute=True):
+            Absence.objects.filter(
+                user=self.user, date__gte=weeks[40][0]).first().delete()
+        changed = self.balances()
+        self.assertEqual(changed[:10], weeks[:10])
+        self.assertEqual(changed[10][1], weeks[10][1] + Decimal("3.00"))
+
+        rollups.rebuild_balances(self.user.id)
+        self.assertEqual(self.balances(), changed)
+        self.assertEqual(
+            ProfileTarget.objects.get(user=self.user).balance, changed[-1][2])
+
+    def test_deletes_in_one_transaction_refresh_once(self):
+        month = date.today().replace(day=1) - timedelta(days=200)
+        jobs = CompletedJob.objects.filter(
+            user=self.user, completed_on__gte=month,
+            completed_on__lt=month + timedelta(days=60))
+        self.assertGreater(jobs.count(), 10)
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            jobs.delete()
+        self.assertEqual(len(callbacks), 1)
+        touches = [
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "job_tracker_profiletarget"')]
+        self.assertEqual(len(touches), 1)
+        self.assertEqual(rollups.find_drift([self.user.id]), [])
+
+    def test_rebuild_rollups_command(self):
+        day = DailyRollup.objects.filter(user=self.user).first()
+        DailyRollup.objects.filter(pk=day.pk).update(credits=Decimal("99.00"))
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "1 rollup rows have drifted."):
+            call_command("rebuild_rollups", "--check", stdout=out)
+        self.assertIn(f"DailyRollup user={self.user.id} {day.day}", out.getvalue())
+
+        call_command("rebuild_rollups", "--background", stdout=out)
+        self.assertIn("Queued task", out.getvalue())
+        task = Task.objects.get(name="rebuild_rollups", status=Task.PENDING)
+        self.assertEqual(task.kwargs, {"user_ids": None})
+
+        call_command("rebuild_rollups", "--user", str(self.user.id), stdout=out)
+        self.assertIn("Rebuilt rollups for 1 users.", out.getvalue())
+        call_command("rebuild_rollups", "--check", stdout=out)
+        self.assertIn("Rollups are up to date.", out.getvalue())
+
+    def test_days_off_mask_filters_in_the_database(self):
+        self.client.post(
+            reverse("profile-edit", args=(self.user.profiletarget.pk,)), {
+            "daily_target": "4.25", "daily_hours": "8.00",
+            "days_off": ["Wed", "Sun"]})
+        profile = ProfileTarget.objects.get(user=self.user)
+        self.assertEqual(profile.days_off, 0b1000100)
+        self.assertEqual(profile.days_off_list, ["Wed", "Sun"])
+
+        days = DailyRollup.objects.filter(user=self.user)
+        working = on_working_days(days, "day", profile.days_off)
+        self.assertEqual(
+            sorted(working.values_list("day", flat=True)),
+            sorted(
+                day for day in days.values_list("day", flat=True)
+                if day.weekday() not in (2, 6)))
+
+    def test_pages_are_compressed(self):
+        response = self.client.get(
+            reverse("tracker"), headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertNotIn("Content-Encoding", self.client.get(reverse("tracker")))
+
+    def test_users_without_a_profile_get_one(self):
+        user = User.objects.create_user("legacy", password="password")
+        ProfileTarget.objects.filter(user=user).delete()
+        self.client.force_login(user)
+        response = self.client.get(reverse("profile"))
+        self.assertEqual(response.context["profile_obj"].user_id, user.id)
+        with self.assertMaxQueries(self.QUERY_BUDGETS["profile"]):
+            self.client.get(reverse("profile"))
+
+    def test_unchanged_polls_get_not_modified(self):
+        url = reverse("api-week")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["week_start"],
+            rollups.week_start_of(date.today()).isoformat())
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        with self.assertMaxQueries(2, "conditional poll") as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any(
+            "rollup" in query["sql"] for query in queries.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CompletedJob.objects.create(
+                user=self.user, job_type=self.job_types[0],
+                completed_on=date.today())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_compressed_polls_get_not_modified(self):
+        url = reverse("api-week")
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        # Weakened by GZipMiddleware, and still matched
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        for accept_encoding in ("gzip", "identity"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(url, headers={
+                    "Accept-Encoding": accept_encoding, "If-None-Match": etag})
+                self.assertEqual(response.status_code, 304)
+
+
+def jobs_csv(job_types, rows=100):
+    """
+    Returns an import file of ``rows`` jobs done today, cycling through
+    ``job_types``.
+    """
+    lines = ["job_type,completed_on"] + [
+        f"{job_types[n % len(job_types)].name},{date.today().isoformat()}"
+        for n in range(rows)
+    ]
+    return "\n".join(lines).encode()
+
+
+class ImportTests(TestCase):
+    """
+    Checks imported and otherwise bulk created jobs are validated and
+    credited like jobs logged one at a time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 3)
+        ]
+        seed_history(cls.user, cls.job_types, days=14)
+        cls.job_count = CompletedJob.objects.filter(user=cls.user).count()
+
+    def setUp(self):
+        caches["metrics"].clear()
+        self.client.force_login(self.user)
+
+    def test_import_reports_rejected_rows(self):
+        rows = jobs_csv(self.job_types, rows=3)
+        upload = SimpleUploadedFile(
+            "jobs.csv", rows + b"\nUnknown,2024-01-01\nJob 1,yesterday\n")
+        response = self.client.post(reverse("import"), {
+            "kind": "jobs", "file_format": "csv", "file": upload,
+            "dry_run": True})
+        report = response.context["report"]
+        self.assertEqual((report.rows, report.imported, report.rejected), (5, 3, 2))
+        self.assertEqual([line for line, _ in report.rejects], [5, 6])
+        self.assertEqual(
+            CompletedJob.objects.filter(user=self.user).count(),
+            self.job_count)
+
+    def test_import_needs_a_login(self):
+        self.client.logout()
+        response = self.client.post(reverse("import"), {
+            "kind": "jobs", "file_format": "csv",
+            "file": SimpleUploadedFile(
+                "jobs.csv", jobs_csv(self.job_types, rows=1))})
+        self.assertRedirects(
+            response, f"{reverse('account_login')}?next={reverse('import')}",
+            fetch_redirect_response=False)
+        self.assertEqual(CompletedJob.objects.count(), self.job_count)
+
+    def test_import_command_reads_the_users_from_a_column(self):
+        other = User.objects.create_user("apprentice", password="password")
+        today = date.today().isoformat()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, "jobs.csv")
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.write(
+                f"username,job_type,completed_on\n"
+                f"engineer,Job 1,{today}\napprentice,job 2,{today}\n"
+                f"nobody,Job 1,{today}\n")
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "import_records", path, "--kind", "jobs", stdout=out, stderr=err)
+        self.assertEqual(json.loads(out.getvalue())["imported"], 2)
+        self.assertIn("line 4", err.getvalue())
+        self.assertEqual(
+            CompletedJob.objects.filter(user=self.user).count(), self.job_count + 1)
+        self.assertEqual(
+            list(CompletedJob.objects.filter(user=other).values_list(
+                "job_type", "credits")),
+            [(self.job_types[1].pk, self.job_types[1].credits)])
+        self.assertEqual(rollups.find_drift([self.user.id, other.id]), [])
+
+    def test_bulk_jobs_are_credited_from_the_database(self):
+        job_type = self.job_types[0]
+        self.client.get(reverse("tracker"))
+        existing = list(CompletedJob.objects.values_list("pk", flat=True))
+        # Changed by an UPDATE, which moves no cache version
+        JobType.objects.filter(pk=job_type.pk).update(credits=Decimal("2.00"))
+        today = date.today().isoformat()
+        self.client.post(
+            reverse("job-bulk-post"),
+            {"jobs": [{"job_type": job_type.pk, "completed_on": today}]},
+            content_type="application/json")
+        self.client.post(reverse("import"), {
+            "kind": "jobs", "file_format": "csv",
+            "file": SimpleUploadedFile(
+                "jobs.csv", f"job_type,completed_on\nJob 1,{today}".encode())})
+        self.client.post(
+            reverse("api-sync"), {"operations": [{
+                "op": "create", "type": "job", "key": str(uuid.uuid4()),
+                "job_type": job_type.pk, "completed_on": today}]},
+            content_type="application/json")
+        self.assertEqual(
+            list(CompletedJob.objects.exclude(pk__in=existing).values_list(
+                "credits", flat=True)),
+            [Decimal("2.00")] * 3)
+
+    def test_job_credits_survive_job_type_changes(self):
+        job_type = self.job_types[0]
+        job = CompletedJob.objects.filter(job_type=job_type).first()
+        day = DailyRollup.objects.get(user=self.user, day=job.completed_on)
+        job_type.credits = Decimal("9.99")
+        job_type.save()
+        job.refresh_from_db()
+        self.assertEqual(job.credits, Decimal("0.75"))
+        self.assertEqual(DailyRollup.objects.get(pk=day.pk).credits, day.credits)
+
+        job.job_type = self.job_types[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            job.save()
+        self.assertEqual(job.credits, self.job_types[1].credits)
+        self.assertEqual(rollups.find_drift([self.user.id]), [])
+
+
+class SyncTests(QueryBudgetMixin, TestCase):
+    """
+    Checks offline sync batches are applied once and the changes since
+    a cursor are sent back page by page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 5)
+        ]
+        seed_history(cls.user, cls.job_types, days=60)
+        cls.job_count = CompletedJob.objects.filter(user=cls.user).count()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sync_batches_are_idempotent(self):
+        today = date.today().isoformat()
+        job_key, absence_key = str(uuid.uuid4()), str(uuid.uuid4())
+        batch = [
+            {"op": "create", "type": "job", "key": job_key,
+             "job_type": self.job_types[0].pk, "completed_on": today},
+            {"op": "create", "type": "absence", "key": absence_key,
+             "duration": "2.00", "date": today},
+            {"op": "update", "type": "job", "key": job_key,
+             "job_type": self.job_types[3].pk, "completed_on": today},
+        ]
+
+        def sync(operations, cursor=None):
+            return self.client.post(
+                reverse("api-sync"), {"operations": operations, "cursor": cursor},
+                content_type="application/json")
+
+        with self.assertMaxQueries(ViewQueryBudgetTests.QUERY_BUDGETS["api-sync"]):
+            first = sync(batch, "0").json()
+        self.assertEqual(
+            [result["status"] for result in first["results"]], ["created", "created"])
+        # Sent again, e.g. after the response was lost on the way back
+        again = sync(batch, first["cursor"]).json()
+        self.assertEqual(
+            [result["status"] for result in again["results"]], ["updated", "updated"])
+        jobs = CompletedJob.objects.filter(user=self.user, client_key=job_key)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].credits, self.job_types[3].credits)
+        # setUp's jobs fall within the cursor's overlap too
+        self.assertIn(
+            job_key,
+            [job["client_key"] for job in again["changes"]["job"]])
+        self.assertEqual(self.job_count + 1, CompletedJob.objects.filter(
+            user=self.user).count())
+
+        deleted = sync(
+            [{"op": "delete", "type": "job", "key": job_key}], again["cursor"]).json()
+        self.assertEqual(deleted["results"][0]["status"], "deleted")
+        self.assertEqual(
+            deleted["deleted"]["job"], [{"id": jobs[0].pk, "key": job_key}])
+        self.assertEqual(rollups.find_drift([self.user.id]), [])
+
+        response = sync([
+            {"op": "delete", "type": "absence", "key": absence_key},
+            {"op": "create", "type": "job", "key": job_key, "job_type": 0},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [1])
+        self.assertTrue(Absence.objects.filter(client_key=absence_key).exists())
+
+    def test_sync_keeps_server_deletes(self):
+        key = str(uuid.uuid4())
+        create = [{"op": "create", "type": "absence", "key": key,
+                   "duration": "2.00", "date": date.today().isoformat()}]
+        sync.apply_batch(self.user, create)
+        last_sync = timezone.now()
+        Absence.objects.get(client_key=key).delete()
+
+        # Sent again by a device that hadn't heard of the delete
+        for since in (None, last_sync):
+            with self.subTest(since=since):
+                results = sync.apply_batch(self.user, create, since)
+                self.assertEqual(results[0]["status"], "skipped")
+                self.assertFalse(Absence.objects.filter(client_key=key).exists())
+        changes = sync.changes_since(self.user, last_sync)
+        self.assertEqual(changes["deleted"]["absence"][0]["key"], uuid.UUID(key))
+        while changes["more"]:
+            changes = sync.changes_since(
+                self.user, *sync.parse_cursor(changes["cursor"]))
+        # Created again after the device got the delete
+        since, _ = sync.parse_cursor(changes["cursor"])
+        self.assertEqual(
+            sync.apply_batch(self.user, create, since)[0]["status"], "created")
+
+    def test_sync_pages_large_histories(self):
+        CompletedJob.objects.filter(pk__in=list(
+            CompletedJob.objects.filter(user=self.user).values_list("pk", flat=True)[:3]
+        )).delete()
+        since, after = sync.parse_cursor(None)
+        pages, jobs, deleted = 0, [], []
+        while True:
+            changes = sync.changes_since(self.user, since, after, limit=100)
+            pages += 1
+            jobs += [job["id"] for job in changes["changes"]["job"]]
+            deleted += changes["deleted"]["job"]
+            if not changes["more"]:
+                break
+            since, after = sync.parse_cursor(changes["cursor"])
+        self.assertEqual(pages, -(-self.job_count // 100))
+        self.assertEqual(sorted(jobs), sorted(
+            CompletedJob.objects.filter(user=self.user).values_list("pk", flat=True)))
+        # A first sync has no copy to delete from
+        self.assertEqual(deleted, [])
+        self.assertEqual(sync.parse_cursor(changes["cursor"])[1], {})
+
+        # Cursors from before the oldest tombstones start over
+        stale = sync.changes_since(
+            self.user, timezone.now() - sync.TOMBSTONE_RETENTION - timedelta(days=1))
+        self.assertTrue(stale["reset"])
+        self.assertEqual(
+            len(stale["changes"]["job"]),
+            min(self.job_count - 3, sync.CHANGES_LIMIT))
+
+
+class TaskQueueTests(TestCase):
+    """
+    Checks heavy work is queued, run, retried and cleaned up by
+    :mod:`job_tracker.tasks`.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 3)
+        ]
+        seed_history(cls.user, cls.job_types, days=60)
+        cls.job_count = CompletedJob.objects.filter(user=cls.user).count()
+        tasks.enqueue("export", user=cls.user, kind="absence", file_format="csv")
+        cls.export_task, = tasks.run_pending()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def balances(self):
+        return list(WeeklyRollup.objects.filter(user=self.user).order_by(
+            "week_start").values_list("week_start", "surplus", "balance"))
+
+    def test_heavy_work_runs_in_the_background(self):
+        edit = reverse("profile-edit", args=(self.user.profiletarget.pk,))
+        weeks = self.balances()
+        for _ in range(2):
+            self.client.post(edit, {
+                "daily_target": "5.00", "daily_hours": "8.00",
+                "days_off": ["Sat", "Sun"]})
+        queued = Task.objects.get(name="rebuild_balances", status=Task.PENDING)
+        self.assertEqual(self.balances(), weeks)
+
+        response = self.client.get(
+            reverse("job-export"), {"background": "1", "format": "jsonl"})
+        self.assertEqual(response.status_code, 202)
+        again = self.client.get(
+            reverse("job-export"), {"format": "jsonl", "background": "1"})
+        self.assertEqual(again.json()["id"], response.json()["id"])
+
+        self.assertEqual(
+            [task.status for task in tasks.run_pending()], [Task.DONE, Task.DONE])
+        changed = self.balances()
+        self.assertNotEqual(changed, weeks)
+        rollups.rebuild_balances(self.user.id)
+        self.assertEqual(self.balances(), changed)
+        self.assertEqual(Task.objects.get(pk=queued.pk).progress, 100)
+
+        state = self.client.get(response["Location"]).json()
+        self.assertEqual((state["status"], state["progress"]), (Task.DONE, 100))
+        download = self.client.get(state["download"])
+        lines = b"".join(download.streaming_content).splitlines()
+        download.close()
+        self.assertEqual(len(lines), self.job_count)
+        self.assertEqual(
+            self.client.get(reverse("api-task", args=(queued.pk,))).status_code, 404)
+
+    def test_background_exports_need_a_login(self):
+        self.client.logout()
+        response = self.client.get(
+            reverse("job-export"), {"background": "1", "format": "jsonl"})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Task.objects.filter(name="export", user=None).exists())
+
+    def test_housekeeping_retries_stale_tasks_and_deletes_old_exports(self):
+        long_ago = timezone.now() - tasks.STALE_AFTER - timedelta(minutes=1)
+        stale = tasks.enqueue("rebuild_balances", user_id=self.user.pk)
+        Task.objects.filter(pk=stale.pk).update(
+            status=Task.RUNNING, attempts=1, started_at=long_ago,
+            heartbeat_at=long_ago)
+        # Started as long ago, and still reporting progress
+        alive = tasks.enqueue("rebuild_rollups", user_ids=[self.user.pk])
+        Task.objects.filter(pk=alive.pk).update(
+            status=Task.RUNNING, attempts=1, started_at=long_ago,
+            heartbeat_at=long_ago)
+        alive.refresh_from_db()
+        tasks.report_progress(alive, 0, 10)
+        # Beaten again only once the interval has passed
+        with self.assertNumQueries(0):
+            tasks.report_progress(alive, 0, 10)
+        tasks.enqueue("export", user=self.user, kind="job", file_format="csv")
+        export, = tasks.run_pending()
+        expired = time.time() - tasks.EXPORT_RETENTION.total_seconds() - 60
+        os.utime(default_storage.path(export.result["name"]), (expired, expired))
+
+        old, recent = (
+            SyncTombstone.objects.create(user=self.user, kind="job", record_id=n)
+            for n in (1, 2))
+        SyncTombstone.objects.filter(pk=old.pk).update(
+            deleted_at=timezone.now() - sync.TOMBSTONE_RETENTION)
+
+        self.assertEqual(
+            tasks.housekeeping(), {"recovered": 1, "exports": 1, "tombstones": 1})
+        self.assertEqual(list(SyncTombstone.objects.all()), [recent])
+        self.assertEqual(Task.objects.get(pk=stale.pk).status, Task.PENDING)
+        self.assertEqual(Task.objects.get(pk=alive.pk).status, Task.RUNNING)
+        response = self.client.get(reverse("export-download", args=(export.pk,)))
+        self.assertEqual(response.status_code, 404)
+        # The recent export is kept
+        response = self.client.get(
+            reverse("export-download", args=(self.export_task.pk,)))
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_tasks_are_retried(self):
+        attempts = []
+
+        @tasks.task(name="flaky", max_attempts=2)
+        def flaky(task):
+            attempts.append(task.attempts)
+            raise RuntimeError("Database went away")
+        self.addCleanup(tasks.REGISTRY.pop, "flaky")
+
+        tasks.enqueue("flaky")
+        with self.assertLogs("job_tracker.tasks", "ERROR"):
+            task, = tasks.run_pending()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_after, task.created_at)
+
+        Task.objects.filter(pk=task.pk).update(run_after=task.created_at)
+        with self.assertLogs("job_tracker.tasks", "ERROR"):
+            task, = tasks.run_pending()
+        self.assertEqual((task.status, attempts), (Task.FAILED, [1, 2]))
+        self.assertIn("Database went away", task.error)
+
+
+class AdminTests(QueryBudgetMixin, TestCase):
+    """
+    Checks the admin changelists and actions of the tracker models.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        cls.admin_user = User.objects.create_superuser("admin", password="password")
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 5)
+        ]
+        # Spans two years, so the date hierarchy has years and months
+        seed_history(cls.user, cls.job_types, days=400, jobs_per_day=1)
+        cls.job_count = CompletedJob.objects.filter(user=cls.user).count()
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def test_admin_changelists_stay_within_budget(self):
+        for model, params in (
+            ("completedjob", {}),
+            ("completedjob", {"job_type__id__exact": self.job_types[0].pk}),
+            ("completedjob", {"completed_on__year": date.today().year}),
+            ("completedjob", {"q": "engineer"}),
+            ("absence", {}),
+            ("profiletarget", {}),
+        ):
+            with self.subTest(model=model, params=params):
+                # The date hierarchy reads one row per year or month
+                with self.assertMaxQueries(20, model):
+                    response = self.client.get(
+                        reverse(f"admin:job_tracker_{model}_changelist"), params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_date_hierarchy_reads_the_dates_from_the_index(self):
+        jobs = CompletedJob.objects.filter(user=self.user)
+        indexed = IndexedDatesQuerySet(CompletedJob, jobs.query)
+        for kind in ("year", "month", "day"):
+            self.assertEqual(
+                list(indexed.dates("completed_on", kind, "DESC")),
+                list(jobs.dates("completed_on", kind, "DESC")))
+        date_range = {"first": Min("completed_on"), "last": Max("completed_on")}
+        self.assertEqual(
+            indexed.aggregate(**date_range), jobs.aggregate(**date_range))
+
+    def test_changelist_counts_are_estimated(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        jobs = CompletedJob.objects.order_by("-completed_on", "-pk")
+        paginator = EstimatedCountPaginator(jobs, 100)
+        paginator.estimate_above = 0
+        with self.assertMaxQueries(3) as queries:
+            self.assertEqual(paginator.count, self.job_count)
+        self.assertFalse(any(
+            "COUNT(" in query["sql"] for query in queries.captured_queries))
+        filtered = EstimatedCountPaginator(jobs.filter(user=self.admin_user), 100)
+        filtered.estimate_above = 0
+        self.assertEqual(filtered.count, 0)
+
+    def test_admin_moves_jobs_to_another_job_type(self):
+        week = CompletedJob.objects.filter(
+            user=self.user, completed_on__gte=date.today() - timedelta(days=7))
+        selected = list(week.values_list("pk", flat=True))
+        response = self.client.post(
+            reverse("admin:job_tracker_completedjob_changelist"), {
+                "action": "reassign_job_type", "_selected_action": selected,
+                "job_type": self.job_types[3].pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(week.values_list("job_type", "credits")),
+            {(self.job_types[3].pk, self.job_types[3].credits)})
+        self.assertEqual(rollups.find_drift([self.user.id]), [])
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SLOW_REQUEST_MS=0)
+class ProfilingMiddlewareTests(TestCase):
+    """
+    Checks the timings ProfilingMiddleware reports for a sampled request.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sampled_requests_report_timings(self):
+        with self.assertLogs("ctrack.profiling") as logs:
+            response = self.client.get(reverse("profile"))
+        timings = {
+            metric.split(";")[0]: metric
+            for metric in response["Server-Timing"].split(", ")
+        }
+        self.assertEqual(set(timings), {"db", "view", "tpl", "total"})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], reverse("profile"))
+        self.assertGreater(record["queries"], 0)
+        self.assertIn(f'desc="{record["queries"]} queries"', timings["db"])
+        self.assertGreater(record["template_ms"], 0)
+        self.assertLessEqual(len(record["slow_queries"]), 5)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_left_alone(self):
+        response = self.client.get(reverse("profile"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_async_requests_are_profiled_in_the_event_loop(self):
+        async def get_response(request):
+            await User.objects.filter(pk=self.user.pk).aexists()
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs("ctrack.profiling"):
+            response = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    def test_templates_are_only_wrapped_while_profiling(self):
+        # Drops the middleware of earlier tests' clients
+        gc.collect()
+        self.assertFalse(hasattr(Template.render, "profiled"))
+        with override_settings(PROFILING_ENABLED=False), \
+                self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(HttpResponse)
+        self.assertFalse(hasattr(Template.render, "profiled"))
+
+        middleware = ProfilingMiddleware(HttpResponse)
+        other = ProfilingMiddleware(HttpResponse)
+        self.assertTrue(Template.render.profiled)
+        del middleware
+        self.assertTrue(Template.render.profiled)
+        del other
+        self.assertFalse(hasattr(Template.render, "profiled"))
+
+
+class ProfileTargetBackendTests(TestCase):
+    """
+    Checks logins and the user each request loads with its profile.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+
+    def test_logins_go_through_the_profile_backend(self):
+        self.assertIsNone(authenticate(username="engineer", password="wrong"))
+        response = self.client.post(
+            reverse("account_login"), {"login": "engineer", "password": "wrong"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+        self.assertTrue(self.client.login(username="engineer", password="password"))
+        self.assertEqual(
+            self.client.session[BACKEND_SESSION_KEY],
+            "job_tracker.backends.ProfileTargetBackend")
+        backend = ProfileTargetBackend()
+        with self.assertNumQueries(1):
+            user = backend.get_user(self.user.pk)
+            self.assertEqual(user.profiletarget.user_id, self.user.pk)
+
+
+class AutocommitRollupTests(TransactionTestCase):
+    """
+    Checks writes made outside a transaction refresh their rollups
+    straight away.
+    """
+
+    def test_saves_refresh_their_own_days(self):
+        user = User.objects.create_user("engineer", password="password")
+        job_type = JobType.objects.create(name="Job 1", credits=Decimal("0.75"))
+        for day in (date(2024, 1, 1), date(2024, 1, 2)):
+            CompletedJob.objects.create(
+                user=user, job_type=job_type, completed_on=day)
+            self.assertEqual(
+                DailyRollup.objects.get(user=user, day=day).credits,
+                Decimal("0.75"))
+        self.assertEqual(rollups.find_drift([user.id]), [])
+
+
+class WarmUpTests(TransactionTestCase):
+    """
+    Checks what the server warm-up leaves ready for the first request.
+    Warming up closes the connections, so it can't run in a transaction.
+    """
+
+    def test_warm_up_compiles_the_templates(self):
+        report = warm_up()
+        self.assertGreater(report["templates"], 0)
+
+    def test_warm_up_primes_the_job_type_names(self):
+        JobType.objects.create(name="Job 1", credits=Decimal("0.75"))
+        caches["metrics"].clear()
+        self.assertEqual(warm_up()["job_types"], 1)
+        # Only the version is read
+        with self.assertNumQueries(1):
+            job_types = job_type_lookup()
+        self.assertEqual([str(job_type) for job_type in job_types.values()], ["Job 1"])
+
+        # Another process changes the job types, so the primed copy is dropped
+        with metrics_cache_settings(
+            BACKEND="django.core.cache.backends.locmem.LocMemCache",
+            LOCATION="another-process",
+        ):
+            JobType.objects.create(name="Job 2", credits=Decimal("1.50"))
+        self.assertEqual(len(job_type_lookup()), 2)
+
+
+def metrics_cache_settings(**metrics):
+    """
+    Settings giving the "metrics" cache another backend, e.g. to stand
+    in for another process with a cache of its own.
+    """
+    return override_settings(CACHES={**settings.CACHES, "metrics": metrics})
+
+
+class MetricsCacheTests(TestCase):
+    """
+    Checks the cached metrics follow every write, whether it was made
+    by this process or by another one with its own cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 3)
+        ]
+        seed_history(cls.user, cls.job_types, days=30)
+        today = date.today()
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.job = CompletedJob.objects.create(
+                user=cls.user, job_type=cls.job_types[0], completed_on=today)
+            cls.absence = Absence.objects.create(
+                user=cls.user, duration=Decimal("2.00"), date=today)
+
+    def setUp(self):
+        caches["metrics"].clear()
+        self.client.force_login(self.user)
+
+    def request_user(self):
+        # Loaded like the authentication backend does for each request
+        return User.objects.select_related("profiletarget").get(pk=self.user.pk)
+
+    def metrics(self):
+        """
+        Returns this week's cached and freshly built metrics.
+        """
+        user = self.request_user()
+        start = rollups.week_start_of(date.today())
+        return (
+            views.cached_weekly_metrics(user, start),
+            views.weekly_metrics(user, start),
+        )
+
+    def writes(self):
+        today = date.today().isoformat()
+        job_data = {"job_type": self.job_types[0].pk, "completed_on": today}
+        post = self.client.post
+        return {
+            "job-post": lambda: post(reverse("job-post"), job_data),
+            "update-completed-job": lambda: post(
+                reverse("update-completed-job", args=(self.job.pk,)),
+                {**job_data, "job_type": self.job_types[1].pk}),
+            "delete-completed-job": lambda: self.client.get(
+                reverse("delete-completed-job", args=(self.job.pk,))),
+            "absence-post": lambda: post(
+                reverse("absence-post"), {"duration": "1.00", "date": today}),
+            "absence-edit": lambda: post(
+                reverse("absence-edit", args=(self.absence.pk,)),
+                {"edit-duration": "3.00", "edit-date": today}),
+            "absence-delete": lambda: self.client.get(
+                reverse("absence-delete", args=(self.absence.pk,))),
+            "job-bulk-post": lambda: post(
+                reverse("job-bulk-post"), {"jobs": [job_data] * 2},
+                content_type="application/json"),
+            "import": lambda: post(reverse("import"), {
+                "kind": "jobs", "file_format": "csv",
+                "file": SimpleUploadedFile(
+                    "jobs.csv", f"job_type,completed_on\nJob 2,{today}".encode())}),
+            "api-sync": lambda: post(reverse("api-sync"), {"operations": [
+                {"op": "create", "type": "job", "key": str(uuid.uuid4()),
+                 **job_data}]}, content_type="application/json"),
+            "profile-edit": lambda: post(
+                reverse("profile-edit", args=(self.user.profiletarget.pk,)),
+                {"daily_target": "5.00", "daily_hours": "8.00", "days_off": ["Sat"]}),
+        }
+
+    def test_writes_reach_every_process(self):
+        for name, write in self.writes().items():
+            with self.subTest(write=name):
+                cached, _ = self.metrics()
+                with metrics_cache_settings(
+                    BACKEND="django.core.cache.backends.locmem.LocMemCache",
+                    LOCATION="another-process",
+                ), self.captureOnCommitCallbacks(execute=True):
+                    write()
+                after, fresh = self.metrics()
+                self.assertEqual(after, fresh)
+                self.assertNotEqual(after, cached)
+
+    def test_file_cache_is_shared_and_follows_writes(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(metrics_cache_settings(
+            BACKEND="django.core.cache.backends.filebased.FileBasedCache",
+            LOCATION=directory,
+        ))
+        cached, _ = self.metrics()
+        # Another process reads the entry from the shared directory
+        user, start = self.request_user(), rollups.week_start_of(date.today())
+        with metrics_cache_settings(
+            BACKEND="django.core.cache.backends.filebased.FileBasedCache",
+            LOCATION=directory,
+        ), self.assertNumQueries(0):
+            self.assertEqual(views.cached_weekly_metrics(user, start), cached)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writes()["job-post"]()
+        after, fresh = self.metrics()
+        self.assertEqual(after, fresh)
+        self.assertNotEqual(after, cached)
+
+    def test_job_type_changes_reach_every_process(self):
+        self.assertIn((self.job_types[0].pk, "Job 1"), job_type_choices())
+        with metrics_cache_settings(
+            BACKEND="django.core.cache.backends.locmem.LocMemCache",
+            LOCATION="another-process",
+        ):
+            self.job_types[0].name = "Renamed job"
+            self.job_types[0].save()
+        self.assertIn((self.job_types[0].pk, "Renamed job"), job_type_choices())
+
+    def test_job_type_names_are_cached_once_for_every_user(self):
+        job_type_names()
+        # Writes of any user, and their versions, leave the names be
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writes()["job-post"]()
+        rollups.touch_all()
+        with self.assertNumQueries(1):
+            self.assertEqual(job_type_names()[self.job_types[0].pk], "Job 1")
+
+    def test_cache_stats_count_hits_and_misses(self):
+        metrics_cache.reset_cache_stats()
+        self.metrics()
+        self.metrics()
+        self.assertEqual(
+            metrics_cache.cache_stats(),
+            {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+        user, start = self.request_user(), rollups.week_start_of(date.today())
+        async_to_sync(views.acached_weekly_metrics)(user, start)
+        job_type_names()
+        job_type_names()
+        metrics_cache.get_or_compute_team("profiles", lambda: 1)
+        metrics_cache.get_or_compute_team("profiles", lambda: 1)
+        self.assertEqual(
+            metrics_cache.cache_stats(),
+            {"hits": 4, "misses": 3, "hit_ratio": 0.5714})
+        metrics_cache.reset_cache_stats()
+        self.assertEqual(metrics_cache.cache_stats()["hit_ratio"], 0.0)
+
+    def test_balance_rebuilds_move_the_version(self):
+        before = ProfileTarget.objects.get(user=self.user).last_write_at
+        tasks.enqueue("rebuild_balances", user_id=self.user.pk)
+        tasks.run_pending()
+        self.assertGreater(
+            ProfileTarget.objects.get(user=self.user).last_write_at, before)
+
+
+class BenchmarkTests(TestCase):
+    """
+    Checks the seeded dataset and what the view benchmark requests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = seeding.seed(users=2, job_types=3, years=0.2)
+        cls.user = User.objects.get(username="engineer1")
+        cls.staff = User.objects.create_superuser("benchmark-admin")
+
+    def test_seeded_history_has_its_rollups(self):
+        self.assertEqual(self.counts["users"], 2)
+        self.assertEqual(self.counts["job_types"], 3)
+        self.assertEqual(
+            self.counts["jobs"],
+            CompletedJob.objects.filter(user__username__startswith="engineer").count())
+        self.assertEqual(rollups.find_drift(), [])
+
+    def test_admin_is_benchmarked_as_staff_and_writes_are_posted(self):
+        results = {
+            (result["name"], result["method"]): result
+            for result in benchmarks.run(
+                self.user, iterations=1, warmup=0, staff=self.staff)
+        }
+        for name in (
+            "job_tracker_completedjob_changelist", "team-dashboard", "tracker"
+        ):
+            self.assertEqual(results[(name, "GET")]["status"], 200, name)
+        for name in benchmarks.POST_ONLY:
+            self.assertNotIn((name, "GET"), results)
+            self.assertLess(results[(name, "POST")]["status"], 400, name)
+        self.assertEqual(results[("job-bulk-post", "POST")]["status"], 201)
+        self.assertFalse([
+            key for key, result in results.items() if result["status"] >= 500])
+
+    def test_admin_is_skipped_without_a_staff_user(self):
+        results = benchmarks.run(
+            self.user, paths=[reverse("admin:index"), reverse("tracker")],
+            iterations=1, warmup=0, writes=False)
+        self.assertEqual([result["name"] for result in results], ["tracker"])
+
+    def test_command_reports_json(self):
+        out = StringIO()
+        call_command(
+            "benchmark_views", "--existing-db", "--path", reverse("job-post"),
+            "--iterations", "2", "--warmup", "0", "--writes", stdout=out)
+        report = json.loads(out.getvalue())
+        result, = report["results"]
+        self.assertEqual(
+            (result["name"], result["method"], result["status"]),
+            ("job-post", "POST", 302))
+        self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+
+class AsyncViewTests(QueryBudgetMixin, TestCase):
+    """
+    Checks the async tracker view renders what the sync view does.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 5)
+        ]
+        seed_history(cls.user, job_types, days=60)
+
+    def render(self, view):
+        request = RequestFactory().get(reverse("tracker"))
+        request.user = User.objects.get(pk=self.user.pk)
+        response = async_to_sync(view)(request) if view is views.ajob_tracker \
+            else view(request)
+        # CSRF tokens differ between any two requests
+        return re.sub(r'value="[^"]{64}"', "", response.content.decode())
+
+    def test_async_tracker_matches_sync_tracker(self):
+        caches["metrics"].clear()
+        with self.assertMaxQueries(
+            ViewQueryBudgetTests.QUERY_BUDGETS["tracker"], "ajob_tracker"
+        ):
+            async_content = self.render(views.ajob_tracker)
+        caches["metrics"].clear()
+        self.assertEqual(async_content, self.render(views.job_tracker))
+        self.assertIn("Job 4", async_content)
+
+
+class TargetEngineTests(SimpleTestCase):
+    """
+    Checks the batch targets against the day by day formula.
+    """
+
+    def test_a_year_matches_the_daily_formula(self):
+        start = date(2024, 1, 3)
+        days_off = ["Sat", "Sun", "Wed"]
+        engine = TargetEngine(
+            Decimal("6.50"), Decimal("7.50"), ProfileTarget.days_off_mask(days_off))
+        absences = series(start, 366, {
+            start + timedelta(days=n): n % 8 for n in range(0, 366, 5)})
+        targets = engine.daily_targets(start, absences)
+
+        adjusted = (7.5 * 6.5) / 8
+        for index, absence in enumerate(absences):
+            day = start + timedelta(days=index)
+            expected = 0.0
+            if day.strftime("%a") not in days_off:
+                expected = round(((7.5 - absence) * adjusted) / 7.5, 2)
+            self.assertEqual(targets[index], expected, day)
+
+        credits = array("d", [5.0] * 366)
+        surplus, balance = engine.balances(credits, targets)
+        self.assertEqual(surplus[1], 5.0 - targets[1])
+        self.assertAlmostEqual(balance[-1], sum(credits) - sum(targets))
+        self.assertEqual(
+            engine.working_days(start),
+            [start + timedelta(days=n) for n in (1, 2, 5, 6)])
+        self.assertEqual(engine.week_target(2), round(adjusted * 4 - 2, 2))
@@ -1,19 +1,31 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.job_tracker, name='tracker'),
+    path('', views.ajob_tracker if settings.ASYNC_VIEWS else views.job_tracker,
+         name='tracker'),
     path('absences', views.AbsencesList.as_view(), name='absences'),
     path('absence/delete/<int:pk>',
          views.absence_delete, name='absence-delete'),
     path('absence/edit/<int:pk>', views.absence_edit, name='absence-edit'),
     path('absences/post', views.absence_post, name='absence-post'),
+    path('absences/export', views.absence_export, name='absence-export'),
     path('history', views.CompletedJobList.as_view(), name='job-history'),
+    path('history/export', views.job_export, name='job-export'),
     path('history/update/<int:pk>',
          views.job_edit, name='update-completed-job'),
     path('history/delete/<int:pk>',
          views.job_delete, name='delete-completed-job'),
     path('job/post', views.job_post, name='job-post'),
+    path('job/bulk', views.job_bulk_post, name='job-bulk-post'),
+    path('import', views.import_upload, name='import'),
+    path('report', views.report, name='report'),
+    path('api/week', views.api_week, name='api-week'),
+    path('api/week/<str:week_start>', views.api_week, name='api-week-detail'),
+    path('api/sync', views.api_sync, name='api-sync'),
+    path('api/task/<int:pk>', views.api_task, name='api-task'),
+    path('export/<int:pk>', views.export_download, name='export-download'),
     path('profile', views.profile, name='profile'),
     path('profile/edit/<int:pk>', views.profile_edit, name='profile-edit'),
 ]
@@ -1,90 +1,176 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Sum
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
 from django.views import generic
+from django.views.decorators.http import require_GET, require_POST
 from datetime import date, timedelta
-from .forms import CompletedJobForm, AbsenceForm, ProfileForm
-from .models import CompletedJob, Absence, ProfileTarget
+from itertools import compress
+from .forms import (
+    CompletedJobForm, CompletedJobFormSet, AbsenceForm, ProfileForm,
+    ImportForm, ExportForm, ReportForm, formset_data)
+from .models import CompletedJob, Absence, ProfileTarget, DailyRollup, Task
+from .job_types import job_type_choices
+from .bulk import bulk_insert
+from .importers import Importer, read_rows, text_stream
+from .exports import (
+    ABSENCE_FIELDS, JOB_FIELDS, export_response, job_rows, absence_rows)
+from .pagination import KeysetPaginationMixin
+from .reports import build_report
+from .sync import SyncError, apply_batch, changes_since, parse_cursor
+from .api import metrics_conditional
+from .backends import arequest_user, ensure_profile_target
+from .rollups import week_start_of
+from .targets import TargetEngine, on_working_days, series
+from . import metrics_cache, tasks
 
 # Create your views here.
 
 
+def _week_rollups(user, start_of_week):
+    # Reads the pre-aggregated credits and absences of the week's working days
+    days = DailyRollup.objects.filter(
+        user=user, day__range=(start_of_week, start_of_week + timedelta(days=6)))
+    return on_working_days(days, "day", user.profiletarget.days_off).values(
+        "day", "credits", "absence_hours")
+
+
+def _combine_weekly(profile, start_of_week, rollups):
+    engine = TargetEngine.for_profile(profile)
+    credits, absences = {}, {}
+    for entry in rollups:
+        credits[entry["day"]] = entry["credits"]
+        absences[entry["day"]] = entry["absence_hours"]
+    credits = series(start_of_week, 7, credits)
+    targets = engine.daily_targets(start_of_week, series(start_of_week, 7, absences))
+
+    # Store all of the combined metrics for the working days of the week
+    weekly_data = []
+    for index in compress(range(7), engine.working_mask(start_of_week, 7)):
+        current_day = start_of_week + timedelta(days=index)
+        weekly_data.append(
+            {
+                "day": current_day,
+                "date": current_day.strftime("%a %d. %b"),
+                "target": targets[index],
+                "credits": credits[index],
+            }
+        )
+    return weekly_data
+
+
+def weekly_metrics(user, start_of_week):
+    """
+    Builds the daily targets and credits of the working days in the
+    week starting on ``start_of_week`` from :model:`DailyRollup`
+    and :model:`ProfileTarget`.
+    """
+    return _combine_weekly(
+        user.profiletarget, start_of_week, _week_rollups(user, start_of_week))
+
+
+async def aweekly_metrics(user, start_of_week):
+    """
+    Async version of :func:`weekly_metrics` using the async ORM.
+    """
+    rollups = [row async for row in _week_rollups(user, start_of_week)]
+    return _combine_weekly(user.profiletarget, start_of_week, rollups)
+
+
+def cached_weekly_metrics(user, start_of_week):
+    """
+    Returns :func:`weekly_metrics`, cached until the user's data changes.
+    """
+    return metrics_cache.get_or_compute(
+        user,
+        "weekly_metrics",
+        lambda: weekly_metrics(user, start_of_week),
+        start_of_week.isoformat(),
+    )
+
+
+async def acached_weekly_metrics(user, start_of_week):
+    """
+    Async version of :func:`cached_weekly_metrics`, sharing its entries.
+    """
+    return await metrics_cache.aget_or_compute(
+        user,
+        "weekly_metrics",
+        lambda: aweekly_metrics(user, start_of_week),
+        start_of_week.isoformat(),
+    )
+
+
 def job_tracker(request):
     """
     Renders the users performance metrics for the current week.
-    Displays an agregated data from :model:`CompletedJob`,
-    :model:`ProfileTarget and :model:`Absence`.
+    Displays an agregated data from :model:`DailyRollup`
+    and :model:`ProfileTarget`, cached until the user's data changes.
 
     **Context**
 
     `weekly_data`
         an instance of all the agragated data from
-        :model:`ProfileTarget`, :model:`CompletedJob` and
-        :model:`Absence`.
+        :model:`ProfileTarget` and :model:`DailyRollup`.
     `job_form`
         an instance of :form:`.forms.CompletedJobForm`
+    `balance`
+        the users running balance from :model:`ProfileTarget`.
 
     **Template**
     :template:`job_tracker/job-tracker.html`
     """
-    user = request.user
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
+    start_of_week = week_start_of(date.today())
     job_form = CompletedJobForm()
+    job_form.fields["job_type"].choices = job_type_choices()
+    weekly_data = cached_weekly_metrics(request.user, start_of_week)
 
-    # Dynamic rostered days
-    current_week = [start_of_week + timedelta(days=i) for i in range(7)]
-    rostered_days_off = user.profiletarget.days_off
-    working_days_raw = [
-        d for d in current_week if d.strftime("%a") not in rostered_days_off
-    ]
-    working_days = []
-    for d in working_days_raw:
-        working_days.append(d.strftime("%a"))
-
-    # Creates dict with the completed jobs of the current week {date:credits}
-    jobs = (
-        CompletedJob.objects.filter(user=user, completed_on__in=working_days_raw)
-        .values("completed_on")
-        .annotate(total_credits=Sum("job_type__credits"))
-    )
-    credits_by_day = {d: 0.00 for d in working_days_raw}
-    for entry in jobs:
-        if entry["completed_on"] in credits_by_day:
-            credits_by_day[entry["completed_on"]] = float(entry["total_credits"])
-
-    # Gets users absences for current week and creates dict with day & duration
-    absences = Absence.objects.filter(
-        user=user, date__range=(start_of_week, end_of_week)
+    return render(
+        request,
+        "job_tracker/job-tracker.html",
+        {
+            "weekly_data": weekly_data,
+            "job_form": job_form,
+            "balance": request.user.profiletarget.balance,
+        },
     )
-    absences_by_day = {
-        a.date: float(a.duration) for a in absences if a.date in working_days_raw
-    }
 
-    # Calculates target and creates dict with day and the target
-    daily_target = float(user.profiletarget.daily_target)
-    shift_hours = float(user.profiletarget.daily_hours)
-    # Adjusts daily target for users that are not on a standard 8h shift.
-    adjusted_daily_target = (shift_hours * daily_target) / 8
-    adjusted_targets = {}
-    for current_day in working_days_raw:
-        absence = absences_by_day.get(current_day, 0)
-        adjusted = round(
-            ((shift_hours - absence) * adjusted_daily_target) / shift_hours, 2
-        )
-        adjusted_targets[current_day] = adjusted
 
-    # Store all of the combined metrics for the week
-    weekly_data = []
-    for current_day in working_days_raw:
-        weekly_data.append(
-            {
-                "date": current_day.strftime("%a %d. %b"),
-                "target": adjusted_targets[current_day],
-                "credits": credits_by_day[current_day],
-            }
-        )
+async def ajob_tracker(request):
+    """
+    Async version of :view:`job_tracker.views.job_tracker`, routed
+    instead of it under ASGI. The week's metrics and the job type
+    choices of the form are looked up concurrently.
+
+    **Context**
+
+    `weekly_data`
+        an instance of all the agragated data from
+        :model:`ProfileTarget` and :model:`DailyRollup`.
+    `job_form`
+        an instance of :form:`.forms.CompletedJobForm`
+    `balance`
+        the users running balance from :model:`ProfileTarget`.
+
+    **Template**
+    :template:`job_tracker/job-tracker.html`
+    """
+    user = await arequest_user(request)
+    start_of_week = week_start_of(date.today())
+
+    weekly_data, choices = await asyncio.gather(
+        acached_weekly_metrics(user, start_of_week),
+        sync_to_async(job_type_choices)(),
+    )
+    job_form = CompletedJobForm()
+    # Preloaded so rendering the form doesn't query from the event loop
+    job_form.fields["job_type"].choices = choices
 
     return render(
         request,
@@ -92,6 +178,177 @@ def job_tracker(request):
         {
             "weekly_data": weekly_data,
             "job_form": job_form,
+            "balance": user.profiletarget.balance,
+        },
+    )
+
+
+@login_required
+@require_GET
+@metrics_conditional
+def api_week(request, week_start=None):
+    """
+    Returns the users daily targets and credits of the current week, or
+    of the week containing ``week_start``, as JSON. Built from the same
+    cached metrics as :view:`job_tracker.views.job_tracker`.
+    Polls that send back the ETag get a ``304`` while nothing changed.
+    """
+    if week_start is None:
+        start_of_week = week_start_of(date.today())
+    else:
+        try:
+            start_of_week = week_start_of(date.fromisoformat(week_start))
+        except ValueError:
+            raise Http404("Invalid week.")
+    days = cached_weekly_metrics(request.user, start_of_week)
+    return JsonResponse(
+        {
+            "week_start": start_of_week,
+            "days": [
+                {"day": day["day"], "target": day["target"], "credits": day["credits"]}
+                for day in days
+            ],
+            "total_target": round(sum(day["target"] for day in days), 2),
+            "total_credits": round(sum(day["credits"] for day in days), 2),
+        }
+    )
+
+
+@login_required
+@require_POST
+def api_sync(request):
+    """
+    Applies a batch of changes a device queued offline to the users
+    :model:`CompletedJob` and :model:`Absence` entries, in one
+    transaction, and returns what changed on the server since the
+    device's last sync.
+
+    Takes a JSON body of ``{"cursor": ..., "operations": [...]}``, see
+    :func:`job_tracker.sync.apply_batch`. Operations are idempotent
+    upserts and deletes keyed on the device's UUIDs, so a batch can be
+    sent again after a dropped response, and entries deleted on the
+    server since the device's last sync stay deleted. The response holds
+    the outcome of each operation, the changed and deleted entries and
+    the cursor to send with the next sync. With ``more`` set the device
+    syncs again straight away for the rest of the changes, and with
+    ``reset`` set it replaces its copy, see
+    :func:`job_tracker.sync.changes_since`.
+    """
+    try:
+        body = json.loads(request.body)
+        since, after = parse_cursor(body.get("cursor"))
+        results = apply_batch(request.user, body.get("operations", []), since)
+    except SyncError as error:
+        return JsonResponse({"errors": error.errors}, status=400)
+    except (ValueError, AttributeError):
+        return JsonResponse(
+            {"errors": "Expected a JSON object with an operations list"},
+            status=400,
+        )
+    return JsonResponse(
+        {"results": results, **changes_since(request.user, since, after)})
+
+
+def _task_state(task):
+    state = {
+        "id": task.pk,
+        "name": task.name,
+        "status": task.status,
+        "progress": task.progress,
+        "url": reverse("api-task", args=(task.pk,)),
+    }
+    if task.name == "export" and task.status == Task.DONE:
+        state["download"] = reverse("export-download", args=(task.pk,))
+    return state
+
+
+@login_required
+@require_GET
+def api_task(request, pk):
+    """
+    Returns the status and progress of one of the users
+    :model:`Task` entries as JSON, with a download link once an export
+    is done.
+    """
+    task = get_object_or_404(Task, pk=pk, user=request.user)
+    return JsonResponse(_task_state(task))
+
+
+@login_required
+@require_GET
+def export_download(request, pk):
+    """
+    Sends the file written by one of the users finished export
+    :model:`Task` entries.
+    """
+    task = get_object_or_404(
+        Task, pk=pk, user=request.user, name="export", status=Task.DONE)
+    try:
+        export_file = default_storage.open(task.result["name"], "rb")
+    except FileNotFoundError:
+        raise Http404("The export is no longer available.")
+    return FileResponse(
+        export_file, as_attachment=True, filename=task.result["filename"])
+
+
+@login_required
+def report(request):
+    """
+    Renders the users credits, absence hours, target and variance per
+    month, quarter or year of any date range, defaulting to the months
+    of the current year. Staff can pass ``user`` to see an engineer's.
+    Built from the rollups by :func:`job_tracker.reports.build_report`
+    and cached until the user's data changes.
+
+    **Context**
+
+    `report_form`
+        an instance of :form:`ReportForm`
+    `engineer`
+        the :model:`auth.User` the report is for.
+    `report`
+        the report's ``periods`` and ``total`` rows, or ``None`` while
+        the form is invalid.
+
+    **Template**
+    :template:`job_tracker/report.html`
+    """
+    today = date.today()
+    data = {
+        "start": today.replace(month=1, day=1),
+        "end": today,
+        "granularity": "month",
+        **request.GET.dict(),
+    }
+    report_form = ReportForm(data)
+    engineer = request.user
+    user_id = request.GET.get("user", "")
+    if request.user.is_staff and user_id:
+        if not user_id.isdigit():
+            raise Http404("Invalid user.")
+        engineer = get_object_or_404(
+            User.objects.select_related("profiletarget"), pk=user_id)
+        ensure_profile_target(engineer)
+
+    report_data = None
+    if report_form.is_valid():
+        start = report_form.cleaned_data["start"]
+        end = report_form.cleaned_data["end"]
+        granularity = report_form.cleaned_data["granularity"]
+        report_data = metrics_cache.get_or_compute(
+            engineer,
+            "report",
+            lambda: build_report(engineer, start, end, granularity),
+            start.isoformat(), end.isoformat(), granularity,
+        )
+
+    return render(
+        request,
+        "job_tracker/report.html",
+        {
+            "report_form": report_form,
+            "engineer": engineer,
+            "report": report_data,
         },
     )
 
@@ -118,15 +375,77 @@ def job_post(request):
     return render(request, "jobs/job_form.html", {"job_form": job_form})
 
 
-class CompletedJobList(generic.ListView):
+@login_required
+def job_bulk_post(request):
+    """
+    Submits several :model:`CompletedJob` entries at once.
+    Accepts either the formset posted by the bulk entry page, or a JSON
+    body of ``{"jobs": [{"job_type": id, "completed_on": date}, ...]}``.
+    Every entry is validated before any of them is saved, and all of
+    them are inserted with a single ``bulk_create``.
+
+    **Context**
+    `job_formset`
+        an instance of :form:`CompletedJobFormSet`
+
+    **Template**
+    :template:`job_tracker/job-bulk.html`
+    """
+    is_json = request.content_type == "application/json"
+    if request.method == "POST":
+        if is_json:
+            try:
+                entries = json.loads(request.body)["jobs"]
+                data = formset_data(
+                    entries, "jobs", CompletedJobForm.Meta.fields)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return JsonResponse(
+                    {"errors": "Expected a JSON object with a jobs list"},
+                    status=400,
+                )
+        else:
+            data = request.POST
+        job_formset = CompletedJobFormSet(data, prefix="jobs")
+        if job_formset.is_valid():
+            jobs = []
+            for form in job_formset:
+                if form.has_changed():
+                    job = form.save(commit=False)
+                    job.user = request.user
+                    jobs.append(job)
+            bulk_insert(CompletedJob, jobs)
+            if is_json:
+                return JsonResponse({"created": len(jobs)}, status=201)
+            messages.add_message(
+                request, messages.SUCCESS, f"{len(jobs)} jobs submitted")
+            return redirect("tracker")
+        if is_json:
+            return JsonResponse(
+                {
+                    "errors": job_formset.errors,
+                    "non_form_errors": job_formset.non_form_errors(),
+                },
+                status=400,
+            )
+        messages.add_message(request, messages.ERROR, "Error submitting jobs")
+    else:
+        job_formset = CompletedJobFormSet(prefix="jobs")
+
+    return render(
+        request, "job_tracker/job-bulk.html", {"job_formset": job_formset})
+
+
+class CompletedJobList(KeysetPaginationMixin, generic.ListView):
     """
     Renders a list of the users completed jobs.
     Display instances of :model:`CompletedJob`,
-    related to the user.
+    related to the user, paged by ``(completed_on, id)`` cursors.
 
     **Context**
     `job_form`
         an instance of :form:`CompletedJobForm`
+    `page_obj`
+        the current :class:`KeysetPage` of jobs.
 
     **Template**
     :template:`job_tracker/job-history.html"
@@ -135,9 +454,11 @@ class CompletedJobList(generic.ListView):
     model = CompletedJob
     template_name = "job_tracker/job-history.html"
     paginate_by = 7
+    cursor_field = "completed_on"
 
     def get_queryset(self):
-        return CompletedJob.objects.filter(user=self.request.user)
+        return CompletedJob.objects.filter(
+            user=self.request.user).select_related("job_type")
 
     def get(self, request, *args, **kwargs):
         self.job_id = kwargs.get("job_id")
@@ -149,6 +470,35 @@ class CompletedJobList(generic.ListView):
         return context
 
 
+def _queue_export(request, kind):
+    # Large exports are written by the worker, the client polls the task
+    export_form = ExportForm(request.GET)
+    if not export_form.is_valid():
+        return HttpResponseBadRequest(export_form.errors.as_text())
+    data = export_form.cleaned_data
+    task = tasks.enqueue(
+        "export", user=request.user, kind=kind, file_format=data["format"],
+        start=data["start"] and data["start"].isoformat(),
+        end=data["end"] and data["end"].isoformat(),
+    )
+    response = JsonResponse(_task_state(task), status=202)
+    response["Location"] = reverse("api-task", args=(task.pk,))
+    return response
+
+
+@login_required
+def job_export(request):
+    """
+    Streams the users :model:`CompletedJob` history as CSV or JSON Lines.
+    Takes optional ``start``/``end`` dates and a ``format`` parameter.
+    With ``background`` set the export is queued as a :model:`Task`
+    instead, see :view:`job_tracker.views.api_task`.
+    """
+    if request.GET.get("background"):
+        return _queue_export(request, "job")
+    return export_response(request, job_rows, JOB_FIELDS, "completed-jobs")
+
+
 def job_edit(request, pk):
     """
     Display an individual job for edit.
@@ -192,14 +542,17 @@ def job_delete(request, pk):
     return redirect("job-history")
 
 
-class AbsencesList(generic.ListView):
+class AbsencesList(KeysetPaginationMixin, generic.ListView):
     """
     Renders a list of the users absences.
-    Displays instances of :model:`Absence` related to the user.
+    Displays instances of :model:`Absence` related to the user,
+    paged by ``(date, id)`` cursors.
 
     **Context**
     `absence_form`
         an instance of :form:`AbsenceForm`.
+    `page_obj`
+        the current :class:`KeysetPage` of absences.
 
     **Template**
     :template:`job_tracker/absences.html`.
@@ -208,6 +561,7 @@ class AbsencesList(generic.ListView):
     model = Absence
     template_name = "job_tracker/absences.html"
     paginate_by = 7
+    cursor_field = "date"
 
     def get_queryset(self):
         return Absence.objects.filter(user=self.request.user)
@@ -223,6 +577,18 @@ class AbsencesList(generic.ListView):
         return context
 
 
+@login_required
+def absence_export(request):
+    """
+    Streams the users :model:`Absence` history as CSV or JSON Lines.
+    Takes optional ``start``/``end`` dates and a ``format`` parameter,
+    and ``background`` to queue it like :view:`job_tracker.views.job_export`.
+    """
+    if request.GET.get("background"):
+        return _queue_export(request, "absence")
+    return export_response(request, absence_rows, ABSENCE_FIELDS, "absences")
+
+
 def absence_post(request):
     """
     Display an individual :model:`Absence`
@@ -306,10 +672,10 @@ def profile(request):
     **Template**
     :template:`job_tracker/profile.html`.
     """
-    target = float(request.user.profiletarget.daily_target)
-    daily_hours = float(request.user.profiletarget.daily_hours)
-    days_off = request.user.profiletarget.days_off
     profile_obj = request.user.profiletarget
+    target = float(profile_obj.daily_target)
+    daily_hours = float(profile_obj.daily_hours)
+    days_off = profile_obj.days_off_list
     profile_form = ProfileForm()
     return render(
         request,
@@ -346,3 +712,52 @@ def profile_edit(request, pk):
             messages.add_message(request, messages.SUCCESS, "Error updating settings")
 
     return redirect("profile")
+
+
+@login_required
+def import_upload(request):
+    """
+    Imports a CSV or JSON Lines file of the users :model:`CompletedJob`
+    or :model:`Absence` history. The file is streamed and inserted in
+    batches, and every rejected row is reported with its line number.
+
+    **Context**
+
+    `import_form`
+        an instance of :form:`ImportForm`.
+    `report`
+        the result of the last import, if any.
+
+    **Template**
+    :template:`job_tracker/import.html`.
+    """
+    report = None
+    if request.method == "POST":
+        import_form = ImportForm(request.POST, request.FILES)
+        if import_form.is_valid():
+            data = import_form.cleaned_data
+            importer = Importer(
+                data["kind"], user=request.user, dry_run=data["dry_run"])
+            report = importer.run(
+                read_rows(text_stream(data["file"]), data["file_format"]))
+            if report.rejected:
+                messages.add_message(
+                    request, messages.ERROR,
+                    f"{report.rejected} rows were rejected")
+            elif not report.dry_run:
+                messages.add_message(
+                    request, messages.SUCCESS,
+                    f"{report.imported} rows imported")
+        else:
+            messages.add_message(request, messages.ERROR, "Error importing file")
+    else:
+        import_form = ImportForm()
+
+    return render(
+        request,
+        "job_tracker/import.html",
+        {
+            "import_form": import_form,
+            "report": report,
+        },
+    )
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from decimal import Decimal
+from job_tracker.models import ProfileTarget, WeeklyRollup
+from job_tracker.targets import TargetEngine
+
+# Number of weeks shown on the team heatmap.
+HEATMAP_WEEKS = 52
+# Share of the target a week may fall short by and still count as close.
+SHORT_MARGIN = 0.1
+ZERO = Decimal("0.00")
+
+
+def team_profiles():
+    """
+    Returns the :model:`job_tracker.ProfileTarget` of every active
+    engineer, ordered by username, with one query.
+    """
+    return list(
+        ProfileTarget.objects.filter(user__is_active=True)
+        .select_related("user")
+        .only(
+            "user__username", "daily_target", "daily_hours", "days_off",
+        )
+        .order_by("user__username")
+    )
+
+
+def _summary(credits, absence, engine):
+    target = engine.week_target(absence)
+    return {
+        "credits": credits,
+        "absence": absence,
+        "target": target,
+        "surplus": round(float(credits) - target, 2),
+    }
+
+
+def team_week(week_start):
+    """
+    Returns every engineer's credits, absence, target and surplus for
+    the week starting ``week_start``.
+
+    Runs two queries whatever the size of the team: one for the
+    profiles and one for the week's :model:`job_tracker.WeeklyRollup`
+    rows of every engineer.
+    """
+    profiles = team_profiles()
+    totals = {
+        user_id: (credits, job_count, absence)
+        for user_id, credits, job_count, absence in WeeklyRollup.objects.filter(
+            week_start=week_start
+        ).values_list("user_id", "credits", "job_count", "absence_hours")
+    }
+    rows = []
+    for profile in profiles:
+        credits, job_count, absence = totals.get(profile.user_id, (ZERO, 0, ZERO))
+        row = _summary(credits, absence, TargetEngine.for_profile(profile))
+        row.update(
+            {
+                "user_id": profile.user_id,
+                "username": profile.user.username,
+                "job_count": job_count,
+                "level": heat_level(row["surplus"], row["target"]),
+            }
+        )
+        rows.append(row)
+    return rows
+
+
+def heatmap_weeks(last_week, weeks=HEATMAP_WEEKS):
+    """
+    Returns the Mondays of the ``weeks`` weeks ending with ``last_week``,
+    oldest first.
+    """
+    return [last_week - timedelta(weeks=n) for n in range(weeks - 1, -1, -1)]
+
+
+def heat_level(surplus, target):
+    """
+    Buckets a week's surplus for the heatmap colours.
+    """
+    if surplus is None:
+        return "none"
+    if surplus >= 0:
+        return "met"
+    if surplus >= -SHORT_MARGIN * target:
+        return "short"
+    return "deficit"
+
+
+def team_heatmap(week_starts):
+    """
+    Returns one row per engineer with a cell per week of ``week_starts``.
+    Cells hold the week's surplus and heat level, with a ``None``
+    surplus when the engineer logged nothing that week.
+
+    Runs two queries whatever the size of the team or the number of
+    weeks, reading only the :model:`job_tracker.WeeklyRollup` rows.
+    """
+    profiles = team_profiles()
+    columns = {week: index for index, week in enumerate(week_starts)}
+    empty = {"surplus": None, "level": heat_level(None, 0)}
+    cells = {profile.user_id: [empty] * len(week_starts) for profile in profiles}
+    engines = {
+        profile.user_id: TargetEngine.for_profile(profile) for profile in profiles}
+    rollups = WeeklyRollup.objects.filter(
+        user__is_active=True,
+        week_start__range=(week_starts[0], week_starts[-1]),
+    ).values_list("user_id", "week_start", "credits", "absence_hours")
+    for user_id, week_start, credits, absence in rollups:
+        if user_id not in cells:
+            continue
+        summary = _summary(credits, absence, engines[user_id])
+        cells[user_id][columns[week_start]] = {
+            "surplus": summary["surplus"],
+            "level": heat_level(summary["surplus"], summary["target"]),
+        }
+    return [
+        {"username": profile.user.username, "cells": cells[profile.user_id]}
+        for profile in profiles
+    ]
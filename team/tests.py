@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from job_tracker.models import JobType, CompletedJob, WeeklyRollup
+from job_tracker.rollups import week_start_of
+from job_tracker.testing import QueryBudgetMixin, seed_history
+from . import urls
+
+# Create your tests here.
+
+
+class TeamDashboardTests(QueryBudgetMixin, TestCase):
+    """
+    Pins the query budgets of the team views, which must not grow
+    with the number of engineers.
+    """
+
+    QUERY_BUDGETS = {
+        "team-dashboard": 8,
+        "team-heatmap": 8,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = User.objects.create_user(
+            "supervisor", password="password", is_staff=True)
+        cls.job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 5)
+        ]
+        cls.engineers = [
+            User.objects.create_user(f"engineer{n}", password="password")
+            for n in range(1, 6)
+        ]
+        for engineer in cls.engineers:
+            seed_history(engineer, cls.job_types, days=400, jobs_per_day=2)
+
+    def setUp(self):
+        caches["metrics"].clear()
+        self.client.force_login(self.supervisor)
+
+    def test_every_view_has_a_budget(self):
+        self.assertViewsBudgeted(urls.urlpatterns, self.QUERY_BUDGETS)
+
+    def test_week_matches_each_engineers_rollup(self):
+        week = week_start_of(date.today()) - timedelta(weeks=1)
+        with self.assertMaxQueries(self.QUERY_BUDGETS["team-dashboard"]):
+            response = self.client.get(
+                reverse("team-dashboard"), {"week": week.isoformat()})
+        rows = {row["username"]: row for row in response.context["rows"]}
+        self.assertEqual(len(rows), len(self.engineers) + 1)
+        for engineer in self.engineers:
+            rollup = WeeklyRollup.objects.get(user=engineer, week_start=week)
+            row = rows[engineer.username]
+            self.assertEqual(row["credits"], rollup.credits)
+            self.assertEqual(
+                row["surplus"], round(float(rollup.credits) - row["target"], 2))
+
+    def test_queries_dont_grow_with_the_team(self):
+        budget = self.QUERY_BUDGETS["team-heatmap"]
+        with self.assertMaxQueries(budget) as before:
+            self.client.get(reverse("team-heatmap"))
+        for n in range(10):
+            User.objects.create_user(f"late{n}", password="password")
+        caches["metrics"].clear()
+        with self.assertMaxQueries(budget) as after:
+            response = self.client.get(reverse("team-heatmap"))
+        self.assertEqual(
+            len(after.captured_queries), len(before.captured_queries))
+        self.assertEqual(len(response.context["weeks"]), 52)
+        self.assertEqual(len(response.context["rows"]), len(self.engineers) + 11)
+
+    def test_weeks_are_cached_until_they_change(self):
+        week = week_start_of(date.today())
+        self.client.get(reverse("team-dashboard"))
+        # The session, the supervisor and the team version
+        with self.assertMaxQueries(3, "cached team-dashboard"):
+            self.client.get(reverse("team-dashboard"))
+
+        CompletedJob.objects.create(
+            user=self.engineers[0], job_type=self.job_types[3], completed_on=week)
+        response = self.client.get(reverse("team-dashboard"))
+        row = next(
+            row for row in response.context["rows"]
+            if row["user_id"] == self.engineers[0].id)
+        self.assertEqual(
+            row["credits"],
+            WeeklyRollup.objects.get(user=self.engineers[0], week_start=week).credits)
+
+    def test_engineers_are_turned_away(self):
+        self.client.force_login(self.engineers[0])
+        response = self.client.get(reverse("team-dashboard"))
+        self.assertEqual(response.status_code, 302)
+
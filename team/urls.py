@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+
+urlpatterns = [
+    path("", views.team_dashboard, name="team-dashboard"),
+    path("heatmap", views.team_heatmap, name="team-heatmap"),
+]
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404
+from django.shortcuts import render
+from job_tracker import metrics_cache
+from job_tracker.rollups import week_start_of
+from .dashboard import team_week, team_heatmap as build_heatmap, heatmap_weeks
+
+# Create your views here.
+
+
+def _requested_week(request):
+    """
+    Returns the Monday of the ``week`` query parameter, or of this week.
+    """
+    requested = request.GET.get("week")
+    if not requested:
+        return week_start_of(date.today())
+    try:
+        return week_start_of(date.fromisoformat(requested))
+    except ValueError:
+        raise Http404("Invalid week.")
+
+
+@staff_member_required
+def team_dashboard(request):
+    """
+    Renders every engineer's credits, target and surplus for one week.
+    Built from :model:`job_tracker.WeeklyRollup` and
+    :model:`job_tracker.ProfileTarget` with a fixed number of queries,
+    and cached until any engineer writes, see
+    :func:`job_tracker.metrics_cache.team_version`.
+
+    **Context**
+
+    `rows`
+        one summary per engineer.
+    `week_start`
+        the Monday of the week shown.
+    `previous_week`, `next_week`
+        the Mondays of the neighbouring weeks.
+
+    **Template**
+    :template:`team/dashboard.html`
+    """
+    week_start = _requested_week(request)
+    rows = metrics_cache.get_or_compute_team(
+        "week", lambda: team_week(week_start), week_start)
+    return render(
+        request,
+        "team/dashboard.html",
+        {
+            "rows": rows,
+            "week_start": week_start,
+            "week_end": week_start + timedelta(days=6),
+            "previous_week": week_start - timedelta(weeks=1),
+            "next_week": week_start + timedelta(weeks=1),
+        },
+    )
+
+
+@staff_member_required
+def team_heatmap(request):
+    """
+    Renders a heatmap of every engineer's weekly surplus over the
+    52 weeks up to the requested week, cached like the dashboard.
+
+    **Context**
+
+    `weeks`
+        the Mondays of the columns, oldest first.
+    `rows`
+        one row of cells per engineer.
+
+    **Template**
+    :template:`team/heatmap.html`
+    """
+    weeks = heatmap_weeks(_requested_week(request))
+    rows = metrics_cache.get_or_compute_team(
+        "heatmap", lambda: build_heatmap(weeks), weeks[-1])
+    return render(request, "team/heatmap.html", {"weeks": weeks, "rows": rows})
@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from job_tracker import metrics_cache
+from job_tracker.exports import CHUNK_SIZE
+from job_tracker.models import CompletedJob, WeeklyRollup
+from job_tracker.targets import WEEKDAY_NAMES, TargetEngine
+
+# Number of week cards shown on each page of the week history.
+WEEKS_PER_PAGE = 4
+# Template of a single week card, cached as a rendered fragment.
+WEEK_CARD_TEMPLATE = "week_history/snippets/week_card.html"
+
+
+def weeks_queryset(user):
+    """
+    Returns one row per week the user has logged jobs in,
+    newest first, with the week's total credits and absence.
+
+    The rows are read from :model:`job_tracker.WeeklyRollup` so the
+    paginator can count and slice them with ``COUNT``/``LIMIT``
+    instead of aggregating every week of history.
+    """
+    return (
+        WeeklyRollup.objects.filter(user=user, job_count__gt=0)
+        .values(
+            "week_start",
+            "balance",
+            "updated_at",
+            total_credits=F("credits"),
+            total_absence=F("absence_hours"),
+        )
+        .order_by("-week_start")
+    )
+
+
+def paginate_weeks(user, page_number, per_page=WEEKS_PER_PAGE):
+    """
+    Returns the requested page of weeks from :func:`weeks_queryset`.
+    """
+    paginator = Paginator(weeks_queryset(user), per_page)
+    return paginator.get_page(page_number)
+
+
+async def apaginate_weeks(user, page_number, per_page=WEEKS_PER_PAGE):
+    """
+    Async version of :func:`paginate_weeks`. The count and the rows of
+    the requested page are queried concurrently, and the last page is
+    only read separately when the requested one is out of range.
+    """
+    queryset = weeks_queryset(user)
+    try:
+        number = max(int(page_number), 1)
+    except (TypeError, ValueError):
+        number = 1
+
+    async def page_rows(number):
+        offset = (number - 1) * per_page
+        return [row async for row in queryset[offset:offset + per_page]]
+
+    count, rows = await asyncio.gather(queryset.acount(), page_rows(number))
+    paginator = Paginator(queryset, per_page)
+    paginator.count = count
+    if number > paginator.num_pages:
+        number = paginator.num_pages
+        rows = await page_rows(number)
+    return Page(rows, number, paginator)
+
+
+def _weeks_filter(field, week_starts):
+    """
+    Builds a filter matching ``field`` inside any of the given weeks.
+    """
+    condition = Q()
+    for week_start in week_starts:
+        condition |= Q(**{
+            f"{field}__range": (week_start, week_start + timedelta(days=6))
+        })
+    return condition
+
+
+def summary_rows(user, start=None, end=None):
+    """
+    Yields the users weekly summaries oldest first for an export,
+    reading :model:`job_tracker.WeeklyRollup` ``CHUNK_SIZE`` rows at
+    a time. ``start`` and ``end`` filter on the week's Monday.
+    """
+    engine = TargetEngine.for_profile(user.profiletarget)
+    weeks = WeeklyRollup.objects.filter(user=user, job_count__gt=0)
+    if start:
+        weeks = weeks.filter(week_start__gte=start)
+    if end:
+        weeks = weeks.filter(week_start__lte=end)
+    weeks = weeks.order_by("week_start").values_list(
+        "week_start", "credits", "job_count", "absence_hours", "balance")
+    for week_start, credits, job_count, absence, balance in weeks.iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        target = engine.week_target(absence)
+        yield {
+            "week_start": week_start,
+            "job_count": job_count,
+            "credits": credits,
+            "absence_hours": absence,
+            "target": target,
+            "update": format(round(float(credits) - target, 2), ".2f"),
+            "balance": balance,
+        }
+
+
+def _week_jobs(user, week_rows):
+    week_starts = [row["week_start"] for row in week_rows]
+    return (
+        CompletedJob.objects.filter(user=user)
+        .filter(_weeks_filter("completed_on", week_starts))
+        .values("completed_on", "job_type__name")
+        .order_by("completed_on")
+    )
+
+
+def build_week_cards(user, week_rows):
+    """
+    Builds the week cards for the given page of week rows.
+
+    The job details of every visible week are fetched with a
+    single query, so the cost of a page does not depend on how
+    much history the user has.
+    """
+    week_rows = list(week_rows)
+    if not week_rows:
+        return []
+    return _assemble_cards(user.profiletarget, week_rows, _week_jobs(user, week_rows))
+
+
+async def abuild_week_cards(user, week_rows):
+    """
+    Async version of :func:`build_week_cards` using the async ORM.
+    """
+    week_rows = list(week_rows)
+    if not week_rows:
+        return []
+    week_jobs = [job async for job in _week_jobs(user, week_rows)]
+    return _assemble_cards(user.profiletarget, week_rows, week_jobs)
+
+
+def _assemble_cards(profile, week_rows, week_jobs):
+    engine = TargetEngine.for_profile(profile)
+
+    # Group the visible weeks' jobs by week and weekday name
+    jobs_by_week = defaultdict(lambda: defaultdict(list))
+    for job in week_jobs:
+        day = job["completed_on"]
+        week_start = day - timedelta(days=day.weekday())
+        weekday = WEEKDAY_NAMES[day.weekday()]
+        jobs_by_week[week_start][weekday].append(job["job_type__name"])
+
+    weeks = []
+    for row in week_rows:
+        week_start = row["week_start"]
+        credits = row["total_credits"] or 0
+        absence = row["total_absence"] or 0
+        rostered_days = engine.working_days(week_start)
+        target = engine.week_target(absence)
+        update = round(float(credits) - target, 2)
+
+        jobs_by_day = jobs_by_week[week_start]
+        jobs_by_day_complete = {
+            name: jobs_by_day.get(name, [])
+            for name in (WEEKDAY_NAMES[d.weekday()] for d in rostered_days)
+        }
+
+        weeks.append(
+            {
+                "monday": week_start,
+                "sunday": week_start + timedelta(days=6),
+                "current_week": [
+                    week_start + timedelta(days=i) for i in range(7)],
+                "total_credits": round(credits, 2),
+                "total_absence": round(absence, 2),
+                "target": target,
+                "update": format(update, ".2f"),
+                "balance": row["balance"],
+                "rostered_days": rostered_days,
+                "jobs_by_day": jobs_by_day_complete,
+            }
+        )
+    return weeks
+
+
+def _fragment_keys(user, week_rows):
+    # A card changes with the user's targets and the job types,
+    # and with its own week's rollup, which moves ``updated_at``. The
+    # running balance moves with every earlier week, so it keys the
+    # fragment too, and a change to the latest week leaves older ones be
+    profile = user.profiletarget
+    shared = hashlib.md5(repr((
+        profile.daily_target, profile.daily_hours, profile.days_off,
+        metrics_cache.job_type_version(),
+    )).encode()).hexdigest()
+    return [
+        ":".join(str(part) for part in (
+            "fragment", "week_card", user.id, row["week_start"], shared,
+            metrics_cache.stamp(row["updated_at"]), row["balance"]))
+        for row in week_rows
+    ]
+
+
+def _cached_fragments(user, week_rows):
+    keys = _fragment_keys(user, week_rows)
+    fragments = metrics_cache.metrics_cache().get_many(keys)
+    missing = [row for row, key in zip(week_rows, keys) if key not in fragments]
+    metrics_cache.count_lookups(len(fragments), len(missing))
+    return keys, fragments, missing
+
+
+def _render_fragments(week_rows, keys, fragments, cards):
+    cards = {card["monday"]: card for card in cards}
+    rendered = {
+        key: render_to_string(WEEK_CARD_TEMPLATE, {"week": cards[row["week_start"]]})
+        for row, key in zip(week_rows, keys) if key not in fragments
+    }
+    if rendered:
+        metrics_cache.metrics_cache().set_many(
+            rendered, metrics_cache._timeout(None))
+    fragments = {**fragments, **rendered}
+    return [
+        {"monday": row["week_start"], "fragment": mark_safe(fragments[key])}
+        for row, key in zip(week_rows, keys)
+    ]
+
+
+def render_week_cards(user, week_rows):
+    """
+    Returns the rendered card of every week row as ``{"monday",
+    "fragment"}``.
+
+    Cards are cached as HTML fragments per user, week and the
+    ``updated_at`` of its :model:`job_tracker.WeeklyRollup`, so a change
+    only re-renders its own week. Only the jobs of the weeks missing from the
+    cache are read, with a single query.
+    """
+    week_rows = list(week_rows)
+    keys, fragments, missing = _cached_fragments(user, week_rows)
+    return _render_fragments(
+        week_rows, keys, fragments, build_week_cards(user, missing))
+
+
+async def arender_week_cards(user, week_rows):
+    """
+    Async version of :func:`render_week_cards` sharing its fragments.
+    """
+    week_rows = list(week_rows)
+    keys, fragments, missing = await sync_to_async(_cached_fragments)(
+        user, week_rows)
+    cards = await abuild_week_cards(user, missing)
+    return await sync_to_async(_render_fragments)(week_rows, keys, fragments, cards)
@@ -1,3 +1,158 @@
-from django.test import TestCase
+import json
+from asgiref.sync import async_to_sync
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from job_tracker.models import CompletedJob, JobType, WeeklyRollup
+from job_tracker.testing import QueryBudgetMixin, seed_history
+from . import history, urls, views
 
 # Create your tests here.
+
+
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Pins the maximum number of queries of every view in
+    :mod:`week_history.urls` against five years of seeded history.
+    """
+
+    QUERY_BUDGETS = {
+        "week-history": 6,
+        "week-history-export": 4,
+        "week-history-api": 5,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("engineer", password="password")
+        job_types = [
+            JobType.objects.create(name=f"Job {n}", credits=Decimal("0.75") * n)
+            for n in range(1, 5)
+        ]
+        seed_history(cls.user, job_types, days=5 * 365)
+
+    def setUp(self):
+        caches["metrics"].clear()
+        self.client.force_login(self.user)
+
+    def test_every_view_has_a_budget(self):
+        self.assertViewsBudgeted(urls.urlpatterns, self.QUERY_BUDGETS)
+
+    def test_pages_stay_within_budget(self):
+        budget = self.QUERY_BUDGETS["week-history"]
+        for page in (1, 2, 60):
+            with self.subTest(page=page):
+                with self.assertMaxQueries(budget, f"week-history page {page}"):
+                    response = self.client.get(
+                        reverse("week-history"), {"page": page})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context["weeks"]), 4)
+
+    def test_cards_hold_the_jobs_of_their_own_weeks(self):
+        user = User.objects.select_related("profiletarget").get(pk=self.user.pk)
+        week_rows = list(history.paginate_weeks(user, 3).object_list)
+        # One query for the jobs of the four weeks, however long the history
+        with self.assertNumQueries(1):
+            cards = history.build_week_cards(user, week_rows)
+        self.assertEqual(
+            [card["monday"] for card in cards],
+            sorted((card["monday"] for card in cards), reverse=True))
+        for card in cards:
+            with self.subTest(week=card["monday"]):
+                jobs = CompletedJob.objects.filter(
+                    user=self.user,
+                    completed_on__range=(card["monday"], card["sunday"]))
+                self.assertEqual(
+                    card["total_credits"],
+                    round(jobs.aggregate(total=Sum("credits"))["total"], 2))
+                rostered = set(card["rostered_days"])
+                self.assertEqual(
+                    sum(len(names) for names in card["jobs_by_day"].values()),
+                    len([
+                        job for job in jobs if job.completed_on in rostered]))
+
+    def test_export_streams_every_week(self):
+        with self.assertMaxQueries(self.QUERY_BUDGETS["week-history-export"]):
+            response = self.client.get(
+                reverse("week-history-export"), {"format": "jsonl"})
+            rows = [
+                json.loads(line)
+                for line in b"".join(response.streaming_content).splitlines()
+            ]
+        self.assertEqual(
+            len(rows),
+            WeeklyRollup.objects.filter(user=self.user, job_count__gt=0).count())
+        self.assertEqual(rows, sorted(rows, key=lambda row: row["week_start"]))
+
+    def test_export_needs_a_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("week-history-export"))
+        self.assertRedirects(
+            response,
+            f"{reverse('account_login')}?next={reverse('week-history-export')}",
+            fetch_redirect_response=False)
+
+    def test_api_answers_unchanged_polls_with_not_modified(self):
+        with self.assertMaxQueries(self.QUERY_BUDGETS["week-history-api"]):
+            response = self.client.get(reverse("week-history-api"), {"page": 2})
+        self.assertEqual(response.json()["page"], 2)
+        self.assertEqual(len(response.json()["weeks"]), 4)
+        with self.assertMaxQueries(2, "conditional poll"):
+            response = self.client.get(
+                reverse("week-history-api"), {"page": 2},
+                HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_past_weeks_render_from_cached_fragments(self):
+        self.client.get(reverse("week-history"), {"page": 2})
+        with self.assertMaxQueries(
+            self.QUERY_BUDGETS["week-history"], "cached page"
+        ) as queries:
+            cached = self.client.get(reverse("week-history"), {"page": 2})
+        self.assertFalse(any(
+            "completedjob" in query["sql"] for query in queries.captured_queries))
+
+        # Jobs this week leave the older cards cached
+        job_type = JobType.objects.get(name="Job 1")
+        with self.captureOnCommitCallbacks(execute=True):
+            CompletedJob.objects.create(
+                user=self.user, job_type=job_type, completed_on=date.today())
+        with self.assertMaxQueries(self.QUERY_BUDGETS["week-history"]) as queries:
+            response = self.client.get(reverse("week-history"), {"page": 2})
+        self.assertFalse(any(
+            "completedjob" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(response.content, cached.content)
+
+        # A job in the page's newest week only re-renders that week, as
+        # the balances of the older ones don't depend on it
+        newest = response.context["weeks"][0]["monday"]
+        late_job = JobType.objects.create(name="Late job", credits=Decimal("1.00"))
+        self.client.get(reverse("week-history"), {"page": 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            CompletedJob.objects.create(
+                user=self.user, job_type=late_job, completed_on=newest)
+        with self.assertMaxQueries(self.QUERY_BUDGETS["week-history"]) as queries:
+            response = self.client.get(reverse("week-history"), {"page": 2})
+        job_queries = [
+            query["sql"] for query in queries.captured_queries
+            if "completedjob" in query["sql"]]
+        self.assertEqual(len(job_queries), 1)
+        self.assertEqual(job_queries[0].count("BETWEEN"), 1)
+        self.assertIn("Late job", response.content.decode())
+
+    def test_async_view_pages_like_the_sync_view(self):
+        for page in ("2", "60", "9999", "junk"):
+            with self.subTest(page=page):
+                request = RequestFactory().get(
+                    reverse("week-history"), {"page": page})
+                request.user = self.user
+                caches["metrics"].clear()
+                with self.assertMaxQueries(self.QUERY_BUDGETS["week-history"]):
+                    async_content = async_to_sync(views.aweek_history)(
+                        request).content
+                caches["metrics"].clear()
+                self.assertEqual(async_content, views.week_history(request).content)
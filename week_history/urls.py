@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 
 urlpatterns = [
-    path("", views.week_history, name="week-history"),
+    path(
+        "",
+        views.aweek_history if settings.ASYNC_VIEWS else views.week_history,
+        name="week-history",
+    ),
+    path("export", views.week_export, name="week-history-export"),
+    path("api", views.week_history_api, name="week-history-api"),
 ]
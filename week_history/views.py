@@ -1,121 +1,140 @@
-from django.core.paginator import Paginator
-from django.db.models import Sum, DecimalField
-from django.db.models.functions import TruncWeek, TruncDate
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render
-from datetime import timedelta
-from job_tracker.models import CompletedJob, Absence
-from collections import defaultdict
+from django.views.decorators.http import require_GET
+from job_tracker import metrics_cache
+from job_tracker.api import metrics_conditional
+from job_tracker.backends import arequest_user
+from job_tracker.exports import export_response
+from .history import (
+    paginate_weeks, apaginate_weeks, build_week_cards, render_week_cards,
+    arender_week_cards, summary_rows)
 
 # Create your views here.
 
 
-def week_history(request):
-    user = request.user
-    daily_target = float(user.profiletarget.daily_target)
-    shift_hours = float(user.profiletarget.daily_hours)
-    adjusted_target = float((shift_hours * daily_target) / 8)
-    rostered_days_off = user.profiletarget.days_off
-
-    jobs_by_week = (
-        CompletedJob.objects.filter(user=user)
-        .annotate(week_start=TruncWeek("completed_on"))
-        .values("week_start")
-        .annotate(total_credits=Sum("job_type__credits", output_field=DecimalField()))
-        .order_by("-week_start")
+def _week_cards(user, page_number):
+    """
+    Returns the requested page of weeks and its cached week cards.
+    """
+    page_obj = paginate_weeks(user, page_number)
+    # The page's rows are only read when its cards are not cached
+    weeks = metrics_cache.get_or_compute(
+        user,
+        "week_cards",
+        lambda: build_week_cards(user, page_obj.object_list),
+        page_obj.number,
     )
+    return page_obj, weeks
 
-    absences_by_week = (
-        Absence.objects.filter(user=user)
-        .annotate(week_start=TruncWeek("date"))
-        .values("week_start")
-        .annotate(total_absence=Sum("duration", output_field=DecimalField()))
-        .order_by("-week_start")
-    )
-    absence_dict = {
-        item["week_start"]: item["total_absence"] for item in absences_by_week
-    }
-
-    jobs_by_day = (
-        CompletedJob.objects.filter(user=user)
-        .annotate(week_start=TruncWeek("completed_on"), day=TruncDate("completed_on"))
-        .values("week_start", "day", "job_type__name")
-        .order_by("-week_start", "day")
+
+def week_history(request):
+    """
+    Renders the users weekly performance history, four weeks per page.
+    Weeks are paged in the database from :model:`WeeklyRollup`. Each
+    week card is cached as a rendered fragment until a job or absence of
+    its week or the users profile changes, and only the jobs of the
+    visible weeks missing from the cache are read from
+    :model:`CompletedJob`.
+
+    **Context**
+
+    `weeks`
+        the rendered week cards of the current page.
+    `page_obj`
+        the current page of weeks.
+
+    **Template**
+    :template:`week_history/week_history.html`
+    """
+    page_obj = paginate_weeks(request.user, request.GET.get("page"))
+    weeks = render_week_cards(request.user, page_obj.object_list)
+
+    return render(
+        request,
+        "week_history/week_history.html",
+        {
+            "weeks": weeks,
+            "page_obj": page_obj,
+        },
     )
-    jobs_dict = defaultdict(list)
-
-    for job in jobs_by_day:
-        # Convert date to weekday name (e.g. "Monday")
-        day_name = job["day"].strftime("%A")
-        job_name = job["job_type__name"]
-        jobs_dict[day_name].append(job_name)
-
-    # Optionally, convert defaultdict to a regular dict
-    jobs_by_week_array = dict(jobs_dict)
-
-    # weeks dict
-    weeks = []
-    seen_weeks = set()
-    for job in jobs_by_week:
-        week_start = job["week_start"]
-        if week_start in seen_weeks:
-            continue
-        seen_weeks.add(week_start)
-
-        credits = job["total_credits"] or 0
-        absence = absence_dict.get(week_start, 0) or 0
-        current_week = [week_start + timedelta(days=i) for i in range(7)]
-        rostered_days = [
-            d for d in current_week if d.strftime("%a") not in rostered_days_off
-        ]
-        weekly_target = adjusted_target * len(rostered_days)
-        target = round(weekly_target - float(absence), 2)
-        update = round(float(credits) - target, 2)
-
-        week_jobs = (
-            CompletedJob.objects.filter(
-                user=user,
-                completed_on__gte=week_start,
-                completed_on__lte=week_start + timedelta(days=6),
-            )
-            .annotate(day=TruncDate("completed_on"))
-            .values("day", "job_type__name")
-            .order_by("day")
-        )
-
-        # Group jobs by weekday name
-        jobs_by_day = defaultdict(list)
-        for j in week_jobs:
-            jobs_by_day[j["day"].strftime("%A")].append(j["job_type__name"])
-
-        jobs_by_day_complete = {
-            d.strftime("%A"): jobs_by_day.get(d.strftime("%A"), [])
-            for d in rostered_days
-        }
 
-        weeks.append(
-            {
-                "monday": week_start,
-                "sunday": week_start + timedelta(days=6),
-                "current_week": current_week,
-                "total_credits": round(credits, 2),
-                "total_absence": round(absence, 2),
-                "target": target,
-                "update": format(update, ".2f"),
-                "rostered_days": rostered_days,
-                "jobs_by_day": jobs_by_day_complete,
-            }
-        )
-
-    paginator = Paginator(weeks, 4)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+
+async def aweek_history(request):
+    """
+    Async version of :view:`week_history.views.week_history`, routed
+    instead of it under ASGI. The page's rows and the week count are
+    queried concurrently, and the week card fragments are shared with
+    the sync view.
+
+    **Context**
+
+    `weeks`
+        the rendered week cards of the current page.
+    `page_obj`
+        the current page of weeks.
+
+    **Template**
+    :template:`week_history/week_history.html`
+    """
+    user = await arequest_user(request)
+    page_obj = await apaginate_weeks(user, request.GET.get("page"))
+    weeks = await arender_week_cards(user, page_obj.object_list)
 
     return render(
         request,
         "week_history/week_history.html",
         {
-            "weeks": page_obj.object_list,
-            "jobs_by_week_array": jobs_by_week_array,
+            "weeks": weeks,
             "page_obj": page_obj,
         },
     )
+
+
+@login_required
+def week_export(request):
+    """
+    Streams the users weekly summaries from :model:`WeeklyRollup` as CSV
+    or JSON Lines, with each week's target, update and running balance.
+    Takes optional ``start``/``end`` dates and a ``format`` parameter.
+    """
+    return export_response(
+        request,
+        summary_rows,
+        (
+            "week_start", "job_count", "credits", "absence_hours", "target",
+            "update", "balance",
+        ),
+        "weekly-summaries",
+    )
+
+
+@login_required
+@require_GET
+@metrics_conditional
+def week_history_api(request):
+    """
+    Returns a page of the users week summaries as JSON, paged like
+    :view:`week_history.views.week_history` and cached until the users
+    data changes. Polls that send back the ETag get a ``304`` while
+    nothing changed.
+    """
+    page_obj, weeks = _week_cards(request.user, request.GET.get("page"))
+    return JsonResponse(
+        {
+            "page": page_obj.number,
+            "num_pages": page_obj.paginator.num_pages,
+            "has_next": page_obj.has_next(),
+            "weeks": [
+                {
+                    "week_start": week["monday"],
+                    "total_credits": week["total_credits"],
+                    "total_absence": week["total_absence"],
+                    "target": week["target"],
+                    "update": week["update"],
+                    "jobs_by_day": week["jobs_by_day"],
+                }
+                for week in weeks
+            ],
+        }
+    )